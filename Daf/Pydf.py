@@ -273,19 +273,30 @@ import io
 import csv
 import copy
 import re
+import collections
+import operator
+import bisect
 import numpy as np
     
 sys.path.append('..')
 
 from Pydf.pydf_types import T_ls, T_lola, T_di, T_hllola, T_loda, T_da, T_li, T_dtype_dict, \
-                            T_dola, T_dodi, T_la, T_lota, T_doda, T_buff, T_ds, T_lb # , T_df
+                            T_dola, T_dodi, T_la, T_lota, T_doda, T_buff, T_ds, T_lb, T_ts # , T_df
                      
 import Pydf.pydf_utils as utils
 import Pydf.pydf_md    as md
 #import Pydf.pydf_indexing as indexing
 import Pydf.pydf_pandas   as pydf_pandas
+import Pydf.pydf_csv      as pydf_csv
+import Pydf.pydf_xlsx     as pydf_xlsx
+import Pydf.pydf_binfile  as pydf_binfile
+import Pydf.pydf_sqlite   as pydf_sqlite
 
-from typing import List, Dict, Any, Tuple, Optional, Union, cast, Type, Callable #
+from Pydf.pydf_columns import ColumnsLol, Categorical, col_to_la
+from Pydf.pydf_views   import ProjectedLol, SharedRowIds, row_projector
+from Pydf.pydf_indexes import SortedIndex, value_in_range
+
+from typing import List, Dict, Any, Tuple, Optional, Union, cast, Type, Callable, Iterator, Iterable #
 def fake_function(a: Optional[List[Dict[str, Tuple[int,Union[Any, str]]]]] = None) -> Optional[int]:
     return None or cast(int, 0)       # pragma: no cover
 
@@ -303,12 +314,14 @@ class Pydf:
             cols:       Optional[T_ls]          = None,     # Optional column names to use.
             dtypes:     Optional[T_dtype_dict]  = None,     # Optional dtype_dict describing the desired type of each column.
                                                             #   also used to define column names if provided and cols not provided.
-            keyfield:   str                     = '',       # A field of the columns to be used as a key.
+            keyfield:   Union[str, T_ts]        = '',       # A field of the columns to be used as a key.
                                                             # can be set even if columns not set yet.
+                                                            # a tuple of fields is a composite key, with tuple keys.
             name:       str                     = '',       # An optional name of the Pydf array.
             use_copy:   bool                    = False,    # If True, make a deep copy of the lol data.
             disp_cols:  Optional[T_ls]          = None,     # Optional list of strings to use for display, if initialized.
-            retmode:    str                     = 'obj'     # default return value
+            retmode:    str                     = 'obj',    # default return value
+            layout:     str                     = 'rows',   # 'rows' (lol) or 'columns' (arrays for numeric columns)
         ):
         if lol is None:
             lol = []
@@ -318,7 +331,7 @@ class Pydf:
             cols = []
             
         self.name           = name              # str
-        self.keyfield       = keyfield          # str
+        self.keyfield       = tuple(keyfield) if isinstance(keyfield, list) else keyfield  # str or tuple of str
         self.hd             = {}                # hd_di
         
         if use_copy:
@@ -326,8 +339,11 @@ class Pydf:
         else:
             self.lol        = lol
         
-        self.kd             = {}
+        self._kd: Optional[T_di] = None         # key dictionary, built when first used. See kd.
         self.dtypes         = dtypes
+        self._intern_ds     = {}                # intern table used by append(intern=...)
+        self._shared_row_ids: Optional[SharedRowIds] = None # rows shared with views. See select_irows().
+        self.indexes: Dict[str, Union[Dict[Any, T_li], SortedIndex, None]] = {}  # secondary indexes by colname. See create_index().
         
         self.md_max_rows    = 10    # default number of rows when used with __repr__ and __str__
         self.md_max_cols    = 10    # default number of cols when used with __repr__ and __str__
@@ -361,6 +377,9 @@ class Pydf:
         # rebuild kd if possible.
         self._rebuild_kd()
         
+        if layout != 'rows':
+            self.set_layout(layout)
+        
             
     #===========================
     # basic attributes and methods
@@ -389,6 +408,47 @@ class Pydf:
             self._iter_index = 0
             raise StopIteration
 
+    @property
+    def layout(self) -> str:
+        """ 'columns' if the data is stored by column in a ColumnsLol, otherwise 'rows'. """
+        return 'columns' if isinstance(self.lol, ColumnsLol) else 'rows'
+        
+        
+    def set_layout(self, layout: str) -> 'Pydf':
+        """ convert the storage of the data in place and return self.
+        
+            'rows':     lol is a list of row lists. This is the default and supports all operations.
+            'columns':  lol is a ColumnsLol, where columns with all int or all float values are arrays
+                            and other columns are lists. Column operations such as sum(), sum_np(), col(), 
+                            valuecounts_for_colname() and to_numpy() work directly on the columns. 
+                            Rows are assembled when accessed, and assigning to their items updates the 
+                            columns, but operations which change the length of rows require 'rows'.
+                            Columns with dtype Categorical are stored as codes and a code table, and 
+                            valuecounts_for_colname(), groupby() and select_by_dict() work on the codes.
+                            
+            Conversion in either direction is one transpose of the data.
+        """
+        if layout not in ('rows', 'columns'):
+            raise ValueError(f"layout must be 'rows' or 'columns', not '{layout}'")
+            
+        if layout == self.layout:
+            return self
+            
+        if layout == 'columns':
+            categorical_icols = [icol for col, icol in self.hd.items() if self.dtypes.get(col) == Categorical]
+            self.lol = ColumnsLol.from_lol(self.lol, max(self.num_cols(), len(self.hd)), categorical_icols)
+        else:
+            self.lol = self.lol.materialize()
+        return self
+        
+        
+    def _categorical_col(self, colname: str) -> Optional[Any]:
+        """ return the CategoricalColumn of colname if it is stored that way, otherwise None. """
+        if isinstance(self.lol, ColumnsLol) and colname in self.hd:
+            return self.lol.categorical_col(self.hd[colname])
+        return None
+        
+        
     def __bool__(self):
         """ test pydf for existance and not empty 
             test exists in test_pydf.py            
@@ -420,6 +480,16 @@ class Pydf:
         return (len(self.lol), self.num_cols()) 
         
         
+    def __enter__(self) -> 'Pydf':
+        return self
+        
+        
+    def __exit__(self, *exc_info) -> None:
+        """ release the file of a pydf opened by open_csv_mmap() at the end of a with block. """
+        if isinstance(self.lol, pydf_csv.CsvMmapLol):
+            self.lol.close()
+            
+            
     def __eq__(self, other):
         # test exists in test_pydf.py            
 
@@ -429,6 +499,37 @@ class Pydf:
         return (self.lol == other.lol and self.columns() == other.columns() and self.keyfield == other.keyfield)
 
     
+    def __reduce_ex__(self, protocol: int) -> Tuple[Callable, Tuple]:
+        """ pickle without kd or the secondary indexes, which are rebuilt when unpickled or next used. 
+            Equal str values in repetitive columns are pickled once, as references to the same object.
+            When lol is a ColumnsLol, numeric columns are NumPy arrays, which are pickled as
+            contiguous buffers, out-of-band with protocol 5 if the pickler has a buffer_callback.
+        """
+        state_da = {key: val for key, val in self.__dict__.items() if key not in ('lol', '_kd', '_intern_ds', '_shared_row_ids')}
+        state_da['indexes'] = self._out_of_date_indexes()
+        
+        if isinstance(self.lol, ColumnsLol):
+            lol = self.lol
+        else:
+            lol = utils.dedupe_strs_in_lol(self.lol)
+        
+        return self.__class__._from_pickle_state, (state_da, lol)
+        
+        
+    @classmethod
+    def _from_pickle_state(cls, state_da: T_da, lol: T_lola) -> 'Pydf':
+        """ create a pydf from the state saved by __reduce_ex__ """
+        my_pydf = cls.__new__(cls)
+        my_pydf.__dict__.update(state_da)
+        my_pydf.lol = lol
+        my_pydf._kd = None
+        my_pydf._intern_ds = {}
+        my_pydf._shared_row_ids = None
+        my_pydf.__dict__.setdefault('indexes', {})
+        my_pydf._rebuild_kd()
+        return my_pydf
+        
+    
     def __str__(self) -> str:
         return self.md_pydf_table_snippet()
         
@@ -447,6 +548,8 @@ class Pydf:
     
         if not self.lol:
             return 0
+        if isinstance(self.lol, ColumnsLol):
+            return len(self.lol.columns)
         return len(self.lol[0])
         
 
@@ -601,7 +704,10 @@ class Pydf:
         
         self.hd     = {from_to_dict.get(col, col):idx for idx, col in enumerate(self.hd.keys())}
         self.dtypes = {from_to_dict.get(col, col):typ for col, typ in self.dtypes.items()}
-        if self.keyfield:
+        self.indexes = {from_to_dict.get(col, col):index for col, index in self.indexes.items()}
+        if isinstance(self.keyfield, tuple):
+            self.keyfield = tuple(from_to_dict.get(col, col) for col in self.keyfield)
+        elif self.keyfield:
             self.keyfield = from_to_dict.get(self.keyfield, self.keyfield)
             # no need to rebuild the kd, it should be the same.
             
@@ -651,8 +757,11 @@ class Pydf:
         
         if self.keyfield and self.hd:
             # if column names are already defined (hd) then we need to repair the keyfield.
-            keyfield_idx = self.hd[self.keyfield]
-            self.keyfield = new_cols[keyfield_idx]
+            if isinstance(self.keyfield, tuple):
+                self.keyfield = tuple(new_cols[self.hd[col]] for col in self.keyfield)
+            else:
+                keyfield_idx = self.hd[self.keyfield]
+                self.keyfield = new_cols[keyfield_idx]
         
         # set new cols to the hd
         self._cols_to_hd(new_cols)
@@ -678,13 +787,16 @@ class Pydf:
         return list(self.kd.keys())
         
 
-    def set_keyfield(self, keyfield: str=''):
+    def set_keyfield(self, keyfield: Union[str, T_ts]=''):
         """ set the indexing keyfield to a new column
             if keyfield == '', then reset the keyfield and reset the kd.
+            if keyfield is a tuple of columns, it is a composite keyfield, and the keys are tuples of their values.
             if keyfield not in columns, then KeyError
         """
+        if isinstance(keyfield, list):
+            keyfield = tuple(keyfield)
         if keyfield:
-            if keyfield not in self.hd:
+            if not all(col in self.hd for col in (keyfield if isinstance(keyfield, tuple) else (keyfield,))):
                 raise KeyError
             self.keyfield = keyfield
             self._rebuild_kd()
@@ -695,27 +807,116 @@ class Pydf:
         return self
     
         
+    @property
+    def kd(self) -> T_di:
+        """ key dictionary of each value in the keyfield to its row index, or {} if the keyfield is not set.
+            It is built when first used, so pydfs which are never accessed by key, such as
+            intermediate results, do not build it.
+        """
+        if self._kd is None:
+            key_icols = self._key_icols()
+            self._kd = self.__class__._build_kd(key_icols, self.lol) if key_icols else {}
+        return self._kd
+        
+        
+    @kd.setter
+    def kd(self, kd: Optional[T_di]) -> None:
+        """ set kd. Setting it to None leaves this pydf without keys until the kd is rebuilt. """
+        self._kd = {} if kd is None else kd
+        
+        
     def _rebuild_kd(self) -> None:
         """ anytime deletions are performed, the kd must be rebuilt 
-            if the keyfield is set.
+            if the keyfield is set. It is rebuilt when next used.
+            The secondary indexes are also rebuilt when next used.
         """
         
-        if self.keyfield and self.keyfield in self.hd:
-            col_idx = self.hd[self.keyfield]
-            self.kd = self.__class__._build_kd(col_idx, self.lol)
+        self._kd = None
+        self._invalidate_indexes()
             
         return self
 
 
+    def _keycols(self) -> T_ts:
+        """ return the keyfield columns: one for a single keyfield, each column of a composite keyfield,
+            or none if the keyfield is not set.
+        """
+        if isinstance(self.keyfield, tuple):
+            return self.keyfield
+        return (self.keyfield,) if self.keyfield else ()
+        
+        
+    def _key_icols(self) -> Optional[T_li]:
+        """ return the col indexes of the keyfield columns, 
+            or None if the keyfield is not set or not in the columns.
+        """
+        keycols = self._keycols()
+        if not keycols or not all(col in self.hd for col in keycols):
+            return None
+        return [self.hd[col] for col in keycols]
+        
+        
+    def _keyval_of_record(self, record_da: T_da) -> Any:
+        """ return the key value of record_da: the value of the keyfield, or for a composite 
+            keyfield, the tuple of the values of its columns.
+        """
+        if isinstance(self.keyfield, tuple):
+            return tuple(record_da[col] for col in self.keyfield)
+        return record_da[self.keyfield]
+        
+        
+    def _update_kd_from(self, irow: int) -> None:
+        """ update kd for the rows from irow to the end, which are new or have moved, 
+            as when rows are appended or inserted. Rows before irow must be unchanged.
+            As with _rebuild_kd(), a key in more than one row refers to the last one.
+        """
+        key_icols = self._key_icols()
+        if key_icols and self._kd is not None:
+            key_col = self.__class__._key_col_of_lol(key_icols, self.lol, irow)
+            self._kd.update(zip(key_col, range(irow, len(self.lol))))
+            
+            
+    def _kd_without_irows(self, removed_irows: T_li, kept_lol: T_lola) -> T_di:
+        """ return kd for kept_lol, which is lol without the sorted removed_irows, by patching 
+            a copy of kd: the keys of removed rows are deleted and only rows after the first 
+            removed row are shifted. Keys must be unique.
+        """
+        key_icols = cast(T_li, self._key_icols())
+        kd = self.kd.copy()
+        for key in self.__class__._key_col_of_lol(key_icols, [self.lol[irow] for irow in removed_irows]):
+            del kd[key]
+            
+        first_irow = removed_irows[0] if removed_irows else len(kept_lol)
+        key_col = self.__class__._key_col_of_lol(key_icols, kept_lol, first_irow)
+        kd.update(zip(key_col, range(first_irow, len(kept_lol))))
+        return kd
+        
+        
     @staticmethod
-    def _build_kd(col_idx: int, lol: T_lola) -> T_di:
-        """ build key dictionary from col_idx col of lol """
+    def _build_kd(key_icols: T_li, lol: T_lola) -> T_di:
+        """ build key dictionary from the key_icols cols of lol """
         
-        key_col = utils.select_col_of_lol_by_col_idx(lol, col_idx)
+        key_col = Pydf._key_col_of_lol(key_icols, lol)
         kd = {key: index for index, key in enumerate(key_col)}
         return kd
         
         
+    @staticmethod
+    def _key_col_of_lol(key_icols: T_li, lol: T_lola, irow: int=0) -> T_la:
+        """ return the key values of the rows of lol from irow to the end: the values of the one 
+            key_icols col, or for a composite keyfield, tuples of the values of the key_icols cols.
+        """
+        if isinstance(lol, ColumnsLol):
+            key_cols = [lol.col_la(icol) if not irow else col_to_la(lol.columns[icol][irow:]) for icol in key_icols]
+            return key_cols[0] if len(key_cols) == 1 else list(zip(*key_cols))
+            
+        rows_lol = lol[irow:] if irow else lol
+        if len(key_icols) == 1:
+            return utils.select_col_of_lol_by_col_idx(rows_lol, key_icols[0])
+        # itemgetter of more than one item returns tuples.
+        return list(map(operator.itemgetter(*key_icols), rows_lol))
+        
+        
     def row_idx_of(self, rowkey: str) -> int:
         """ return row_idx of key provided or -1 if not able to do it.
         """
@@ -734,7 +935,152 @@ class Pydf:
         return [key for key in keylist if key in self.kd]
 
 
+    #===========================
+    # secondary indexes
     
+    def create_index(self, 
+            colname:    str,                # column to index.
+            kind:       str = 'hash',       # 'hash' for equality lookups, or 'sorted' for range lookups too.
+            ) -> 'Pydf':
+        """ create a secondary index on colname. 
+            A 'hash' index is a dict of each value in the column to the list of row indexes where it is found. 
+            A 'sorted' index is a SortedIndex of the values in sorted order, and the column must be orderable.
+            
+            select_by_dict(), select_first_row_by_dict() and valuecounts_for_colname_selectedby_colname() 
+            use either index when the selector includes colname, instead of scanning all rows.
+            select_by_range() uses a sorted index.
+            The index is updated as rows are appended and cells are assigned. After rows are 
+            removed, inserted or reordered, it is rebuilt when next used.
+            
+            if colname not in columns, then KeyError
+        """
+        if colname not in self.hd:
+            raise KeyError(colname)
+        if kind not in ('hash', 'sorted'):
+            raise ValueError(f"index kind must be 'hash' or 'sorted', not {kind!r}")
+            
+        sorted_index = SortedIndex() if kind == 'sorted' else None
+        self.indexes[colname] = self._build_index(self.hd[colname], sorted_index)
+        return self
+        
+        
+    def drop_index(self, colname: str) -> 'Pydf':
+        """ remove the secondary index on colname, if any. """
+        self.indexes.pop(colname, None)
+        return self
+        
+        
+    def _build_index(self, icol: int, sorted_index: Optional[SortedIndex]=None) -> Union[Dict[Any, T_li], SortedIndex]:
+        """ build secondary index from icol col of lol, 
+            building sorted_index if it is provided, otherwise a hash index.
+        """
+        if isinstance(self.lol, ColumnsLol):
+            col_la = self.lol.col_la(icol)
+        else:
+            col_la = utils.select_col_of_lol_by_col_idx(self.lol, icol)
+            
+        if sorted_index is not None:
+            sorted_index.build(col_la)
+            return sorted_index
+            
+        index: Dict[Any, T_li] = {}
+        for irow, val in enumerate(col_la):
+            index.setdefault(val, []).append(irow)
+        return index
+        
+        
+    def _index_of(self, colname: str) -> Union[Dict[Any, T_li], SortedIndex, None]:
+        """ return the secondary index on colname, rebuilding it if it is out of date, 
+            or None if there is no index on colname.
+        """
+        if colname not in self.indexes:
+            return None
+            
+        if colname not in self.hd:
+            # the column was dropped.
+            del self.indexes[colname]
+            return None
+            
+        index = self.indexes[colname]
+        if index is None:
+            index = self.indexes[colname] = self._build_index(self.hd[colname])
+        elif isinstance(index, SortedIndex) and not index.is_built():
+            self._build_index(self.hd[colname], index)
+        return index
+        
+        
+    def _out_of_date_indexes(self) -> Dict[str, Optional[SortedIndex]]:
+        """ return the secondary indexes marked out of date, to be rebuilt when next used: 
+            None for a hash index, and a SortedIndex which is not built for a sorted index.
+        """
+        return {colname: SortedIndex() if isinstance(index, SortedIndex) else None for colname, index in self.indexes.items()}
+        
+        
+    def _invalidate_indexes(self) -> None:
+        """ mark all secondary indexes out of date, as when rows are removed, inserted or reordered. """
+        if self.indexes:
+            self.indexes = self._out_of_date_indexes()
+            
+            
+    def _index_rows_from(self, irow: int) -> None:
+        """ add the rows from irow to the end, which are new, to the secondary indexes. 
+            Rows before irow must be unchanged.
+        """
+        for colname, index in self.indexes.items():
+            if index is None or colname not in self.hd:
+                continue
+            icol = self.hd[colname]
+            if isinstance(index, SortedIndex):
+                if index.is_built():
+                    for new_irow in range(irow, len(self.lol)):
+                        index.add(self.lol[new_irow][icol], new_irow)
+                continue
+            for new_irow in range(irow, len(self.lol)):
+                index.setdefault(self.lol[new_irow][icol], []).append(new_irow)
+                
+                
+    def _reindex_cell(self, irow: int, colname: str, old_val: Any, new_val: Any) -> None:
+        """ move irow from old_val to new_val in the secondary index on colname, if it is up to date. """
+        index = self.indexes.get(colname)
+        if index is None or old_val == new_val:
+            return
+            
+        if isinstance(index, SortedIndex):
+            if index.is_built():
+                index.remove(old_val, irow)
+                index.add(new_val, irow)
+            return
+            
+        old_irows = index[old_val]
+        del old_irows[bisect.bisect_left(old_irows, irow)]
+        if not old_irows:
+            del index[old_val]
+        bisect.insort(index.setdefault(new_val, []), irow)
+        
+        
+    def _indexed_irows(self, selector_da: T_da) -> Optional[T_li]:
+        """ return the row indexes of the rows matching selector_da, in order, using the secondary 
+            indexes on the selected columns, or None if no selected column is indexed.
+            Other columns in selector_da are compared in the indexed rows.
+        """
+        indexed_cols = [col for col in selector_da if self._index_of(col) is not None]
+        if not indexed_cols:
+            return None
+            
+        # start with the shortest list of rows, and keep those found in the others.
+        irows_lists = sorted((self.indexes[col].get(selector_da[col], []) for col in indexed_cols), key=len)
+        irows = irows_lists[0]
+        for other_irows in irows_lists[1:]:
+            other_irows_set = set(other_irows)
+            irows = [irow for irow in irows if irow in other_irows_set]
+            
+        other_selector_da = {col: val for col, val in selector_da.items() if col not in indexed_cols}
+        if other_selector_da:
+            irows = [irow for irow in irows 
+                        if utils.is_d1_in_d2(d1=other_selector_da, d2=dict(zip(self.hd, self.lol[irow])))]
+        return irows
+        
+
     #===========================
     # dtypes
     
@@ -742,6 +1088,7 @@ class Pydf:
         """ convert columns to the datatypes specified in self.dtypes dict """
         
         self.lol = utils.apply_dtypes_to_hdlol((self.hd, self.lol), self.dtypes)[1]
+        self._invalidate_indexes()
             
         return self
         
@@ -759,7 +1106,9 @@ class Pydf:
             
         # from utilities import utils
 
+        self._unshare_rows()
         self.hd, self.lol = utils.unflatten_hdlol_by_cols((self.hd, self.lol), cols)    
+        self._invalidate_indexes()
             
         return self
 
@@ -844,6 +1193,7 @@ class Pydf:
         
         self.lol = new_lol
         self._rebuild_kd()
+        self.clear_intern_table()
         
         return self
         
@@ -857,7 +1207,8 @@ class Pydf:
             cls,
             records_lod:    T_loda,                         # List[List[Any]] to initialize the lol data array.
             keyfield:       str='',                         # set a new keyfield or set no keyfield.
-            dtypes:         Optional[T_dtype_dict]=None     # set the data types for each column.
+            dtypes:         Optional[T_dtype_dict]=None,    # set the data types for each column.
+            intern:         Union[bool, T_ls]=False,        # share one object for equal str values in all or these columns.
             ) -> 'Pydf':
         """ Create Pydf instance from loda type, adopting dict keys as column names
             Generally, all dicts in records_lod should be the same OR the first one must have all keys
@@ -879,6 +1230,9 @@ class Pydf:
         
         lol = [list(utils.set_cols_da(record_da, cols).values()) for record_da in records_lod]
         
+        if intern:
+            lol = list(utils.intern_rows(lol, utils.intern_icols(cols, intern)))
+        
         return cls(cols=cols, lol=lol, keyfield=keyfield, dtypes=dtypes)
         
         
@@ -1099,25 +1453,48 @@ class Pydf:
             noheader: bool=False,                   # if True, do not try to initialize columns in header dict.
             user_format: bool=False,                # if True, preprocess the file and omit comment lines.
             unflatten: bool=True,                   # unflatten fields that are defined as dict or list.
+            sheetname: Optional[str]=None,          # name of the sheet to read. Default is the first sheet.
             ) -> 'Pydf':
         """ read excel file from a buffer and convert to pydf.
+            The sheet is read directly into a lol of str values, padded to the same length,
+            and then converted per dtypes in one pass.
         """
         
-        # from utilities import xlsx_utils
-
-        csv_buff = utils.xlsx_to_csv(excel_buff)
+        data_lol = pydf_xlsx.xlsx_to_lol(excel_buff, sheetname=sheetname)
+        
+        if user_format:
+            # omit comment and blank lines, as preprocess_csv_buff() does for csv files.
+            data_lol = [la for la in data_lol if any(val != '' for val in la) and not str(la[0]).startswith('#')]
 
-        my_pydf  = cls.from_csv_buff(
-                        csv_buff, 
-                        keyfield    = keyfield,         # field to use as unique key, if not ''
-                        dtypes      = dtypes,           # dictionary of types to apply if set.
-                        noheader    = noheader,         # if True, do not try to initialize columns in header dict.
-                        user_format = user_format,      # if True, preprocess the file and omit comment lines.
-                        unflatten   = unflatten,        # unflatten fields that are defined as dict or list.
-                        )
+        cols = []
+        if not noheader:
+            cols = data_lol.pop(0) if data_lol else []
+        elif dtypes:
+            cols = list(dtypes.keys())
+            
+        utils.convert_lol(data_lol, utils.compile_dtype_converters(cols, dtypes, unflatten=unflatten))
+        
+        # data is already converted, so dtypes are set after init to avoid converting again.
+        my_pydf = cls(lol=data_lol, cols=cols, keyfield=keyfield)
+        my_pydf.dtypes = dtypes or {}
         
         return my_pydf
     
+    to_excel_file = pydf_xlsx._to_excel_file
+    
+    to_excel_buff = pydf_xlsx._to_excel_buff
+    
+    
+    #==== .pydf binary files
+    to_pydf_file = pydf_binfile._to_pydf_file
+    
+    #@classmethod
+    from_pydf_file = pydf_binfile._from_pydf_file
+    
+    #@classmethod
+    open_pydf_mmap = pydf_binfile._open_pydf_mmap
+    
+    
     #==== CSV
     @classmethod
     def from_csv_buff(
@@ -1130,6 +1507,8 @@ class Pydf:
             sep: str=',',                           # field separator.
             unflatten: bool=True,                   # unflatten fields that are defined as dict or list.
             include_cols: Optional[T_ls]=None,      # include only the columns specified. noheader must be false.
+            layout: str='rows',                     # 'rows' or 'columns'. See set_layout().
+            intern: Union[bool, T_ls]=False,        # share one object for equal str values in all or these columns.
             ) -> 'Pydf':
         """
         Convert CSV data in a buffer (bytes or string) to a pydf object
@@ -1141,24 +1520,111 @@ class Pydf:
             noheader: do not initialize columns from the first (non-comment) line.
             user_format (bool): Whether to preprocess the CSV data (remove comments and blank lines).
             sep (str): The separator used in the CSV data.
+            layout: 'columns' stores Categorical columns as codes. 
+            intern: if True, or a list of column names, str values are interned in a table for this 
+                buffer as they are parsed, so equal values share one object.
 
         Returns:
             hllola: A tuple containing a header list and a list of lists representing the CSV data.
         """
         
-        data_lol = utils.buff_csv_to_lol(csv_buff, user_format=user_format, sep=sep, include_cols=include_cols, dtypes=dtypes)
+        # if the buffer is CSVJ, dtypes, keyfield and name are provided by the header section
+        #   unless they are specified here.
+        csvj_metadata_da, csv_buff = utils.split_csvj_header(csv_buff)
+        if csvj_metadata_da:
+            dtypes   = dtypes   or csvj_metadata_da.get('dtypes')
+            keyfield = keyfield or csvj_metadata_da.get('keyfield', '')
+        
+        # dtypes are applied, and list/dict columns unflattened, as each row is parsed.
+        data_lol = utils.buff_csv_to_lol(csv_buff, user_format=user_format, sep=sep, include_cols=include_cols, 
+                        dtypes=dtypes, raw=True, noheader=noheader, unflatten=unflatten, intern=intern)
         
         cols = []
         if not noheader:
             cols = data_lol.pop(0)        # return the first item and shorten the list.
+        elif dtypes:
+            cols = list(dtypes.keys())
         
-        my_pydf = cls(lol=data_lol, cols=cols, keyfield=keyfield, dtypes=dtypes)
-        
-        if unflatten:
-            my_pydf.unflatten_by_dtypes()
-   
-        return my_pydf
-    
+        # data is already converted, so dtypes are set after init to avoid converting again.
+        my_pydf = cls(lol=data_lol, cols=cols, keyfield=keyfield, name=csvj_metadata_da.get('name', ''))
+        my_pydf.dtypes = dtypes or {}
+
+        return my_pydf.set_layout(layout)
+
+
+    #@classmethod
+    from_csv_file = pydf_csv._from_csv_file
+
+    #@classmethod
+    open_csv_mmap = pydf_csv._open_csv_mmap
+
+
+    @classmethod
+    def iter_csv_file(
+            cls,
+            file_path_or_fp: Union[str, Any],       # path to a csv file, or a file object already open.
+            chunk_size: int=10000,                  # maximum number of rows in each Pydf chunk.
+            keyfield: str='',                       # field to use as unique key, if not ''
+            dtypes: Optional[T_dtype_dict]=None,    # dictionary of types to apply if set.
+            noheader: bool=False,                   # if True, do not try to initialize columns in header dict.
+            user_format: bool=False,                # if True, preprocess the file and omit comment lines.
+            sep: str=',',                           # field separator.
+            unflatten: bool=True,                   # unflatten fields that are defined as dict or list.
+            include_cols: Optional[T_ls]=None,      # include only the columns specified. noheader must be false.
+            compression: Optional[str]='infer',     # 'gzip', 'bz2', 'xz', None, or 'infer' from file extension.
+            ) -> Iterator['Pydf']:
+        """
+        Read a csv file incrementally and yield Pydf instances of no more than chunk_size rows.
+
+        All chunks share the same column names (taken from the header of the file unless noheader)
+        and the same dtypes. Only one chunk is parsed at a time, so very large files can be
+        processed with constant memory, for example:
+
+            for chunk_pydf in Pydf.iter_csv_file(file_path, chunk_size=50000, dtypes=my_dtypes):
+                reduction_da = chunk_pydf.reduce(Pydf.sum_da, reduction_da)
+
+        If file_path_or_fp is a path, it is opened and closed here, and decompressed while it is read
+        if compression is given or inferred from the extension, like '.csv.gz'. Otherwise, it is 
+        read from its current position and left open. Binary files are decoded as utf-8.
+        A CSVJ header section, if any, provides dtypes and keyfield unless they are specified.
+        """
+
+        detach_fp = False
+        if isinstance(file_path_or_fp, str):
+            fp = utils.open_file(file_path_or_fp, mode='rt', compression=compression)
+            close_fp = True
+        else:
+            fp = file_path_or_fp
+            if isinstance(fp, (io.RawIOBase, io.BufferedIOBase)):
+                fp = io.TextIOWrapper(fp, encoding='utf-8', newline='')
+                detach_fp = True
+            close_fp = False
+
+        try:
+            cols, dtypes, csvj_metadata_da, rows_iter = utils.csv_rows_from_lines(
+                    fp, 
+                    dtypes          = dtypes, 
+                    noheader        = noheader, 
+                    user_format     = user_format, 
+                    sep             = sep,
+                    unflatten       = unflatten,
+                    include_cols    = include_cols,
+                    )
+            keyfield = keyfield or csvj_metadata_da.get('keyfield', '')
+
+            for chunk_lol in utils.iter_lol_chunks(rows_iter, chunk_size=chunk_size):
+                # data is already converted, so dtypes are set after init to avoid converting again.
+                chunk_pydf = cls(lol=chunk_lol, cols=cols, keyfield=keyfield)
+                chunk_pydf.dtypes = dtypes
+
+                yield chunk_pydf
+        finally:
+            if close_fp:
+                fp.close()
+            elif detach_fp:
+                # otherwise the wrapper would close the binary file of the caller when it is collected.
+                fp.detach()
+
 
 
     def to_csv_file(
@@ -1166,14 +1632,44 @@ class Pydf:
             file_path: str='',
             line_terminator: Optional[str]=None,
             include_header: bool=True,
+            csvj: bool=False,
+            flatten: bool=False,
+            batch_size: int=10000,
+            compression: Optional[str]='infer',     # 'gzip', 'bz2', 'xz', None, or 'infer' from file extension.
             ) -> str:
+        """ write the pydf array to a csv file.
+            Local files are written directly in batches of rows by to_csv_fp(), so the whole
+            file is never built in memory. If compression is given or inferred from the extension,
+            like '.csv.gz', each batch is compressed as it is written. 
+            s3 paths are written using to_csv_buff().
+        """
+        if csvj and not include_header:
+            # checked here as well so an existing file is not truncated.
+            raise ValueError("csvj=True requires include_header=True")
+
+        if file_path.startswith('s3'):
+            buff = self.to_csv_buff(
+                    line_terminator=line_terminator,
+                    include_header=include_header,
+                    csvj=csvj,
+                    flatten=flatten,
+                    )
 
-        buff = self.to_csv_buff(
-                line_terminator=line_terminator,
-                include_header=include_header,
-                )
-
-        self.__class__.buff_to_file(buff, file_path=file_path)
+            self.__class__.buff_to_file(buff, file_path=file_path)
+            
+            return file_path
+            
+        file_path = utils.path_sep_per_os(file_path)
+        with utils.open_file(file_path, mode='wt', compression=compression) as fp:
+            self.to_csv_fp(
+                    fp,
+                    line_terminator=line_terminator,
+                    include_header=include_header,
+                    csvj=csvj,
+                    flatten=flatten,
+                    batch_size=batch_size,
+                    )
+        utils.sts(f"Saved {len(self.lol):,} rows to {file_path}", 3)
         
         return file_path
 
@@ -1182,20 +1678,23 @@ class Pydf:
             self, 
             line_terminator: Optional[str]=None,
             include_header: bool=True,
+            csvj: bool=False,
+            flatten: bool=False,
             ) -> T_buff:
         """ this function writes the pydf array to a csv buffer, including the header if include_header==True.
             The buffer can be saved to a local file or uploaded to a storage service like s3.
+            
+            If csvj is True, the buffer starts with a CSVJ header section providing dtypes, keyfield,
+            name, flattened columns and the row count, and list and dict columns are written as JSON.
+            from_csv_buff() will then convert the data as it is parsed without specifying dtypes.
+            csvj requires include_header, as the column names are in the header row, else ValueError.
+            
+            If flatten is True, list and dict columns (per dtypes) are written as JSON.
         """
     
-        if line_terminator is None:
-            line_terminator = '\r\n'
-    
         f = io.StringIO(newline = '')           # Use newline='' to ensure consistent line endings
         
-        csv_writer = csv.writer(f, lineterminator=line_terminator)
-        if include_header:
-            csv_writer.writerow(self.columns())     # Write the header row
-        csv_writer.writerows(self.lol)          # Write the data rows
+        self.to_csv_fp(f, line_terminator=line_terminator, include_header=include_header, csvj=csvj, flatten=flatten)
 
         buff = f.getvalue()
         f.close()
@@ -1203,11 +1702,217 @@ class Pydf:
         return buff   
 
 
+    def to_csv_fp(
+            self,
+            fp: Any,                                # text file opened with newline=''
+            line_terminator: Optional[str]=None,
+            include_header: bool=True,
+            csvj: bool=False,                       # write CSVJ header section. Implies flatten.
+            flatten: bool=False,                    # write list and dict columns (per dtypes) as JSON.
+            batch_size: int=10000,                  # number of rows written at a time.
+            ) -> int:
+        """ write the pydf array as csv to an open text file handle in batches of rows.
+            Rows are flattened one batch at a time, so no copy of the whole array is made.
+            Returns the number of data rows written.
+        """
+        for chunk in self.iter_csv_chunks(
+                line_terminator=line_terminator, 
+                include_header=include_header, 
+                csvj=csvj,
+                flatten=flatten,
+                batch_size=batch_size,
+                encoding=None,
+                ):
+            fp.write(chunk)
+            
+        return len(self.lol)
+        
+
+    def iter_csv_chunks(
+            self,
+            line_terminator: Optional[str]=None,
+            include_header: bool=True,
+            csvj: bool=False,                       # write CSVJ header section. Implies flatten.
+            flatten: bool=False,                    # write list and dict columns (per dtypes) as JSON.
+            batch_size: int=10000,                  # number of rows in each chunk.
+            encoding: Optional[str]='utf-8',        # if None, yield str chunks rather than bytes.
+            ) -> Iterator[Union[bytes, str]]:
+        """ generate the csv representation of the pydf array in chunks of batch_size rows,
+            encoded as bytes unless encoding is None. The header (and CSVJ header section) 
+            is included in the first chunk. Useful for sending a large array to a socket
+            or HTTP response with bounded memory, for example:
+            
+                for chunk in my_pydf.iter_csv_chunks():
+                    sock.sendall(chunk)
+        """
+        if line_terminator is None:
+            line_terminator = '\r\n'
+            
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be at least 1, got {batch_size}")
+        if csvj and not include_header:
+            # the CSVJ header section does not name the columns, so readers take the first row as the header.
+            raise ValueError("csvj=True requires include_header=True")
+    
+        f = io.StringIO(newline = '')           # Use newline='' to ensure consistent line endings
+        csv_writer = csv.writer(f, lineterminator=line_terminator)
+
+        flattened_cols = self.calc_cols(include_types=[list, dict]) if (csvj or flatten) else []
+        flatten_icols = [self.hd[col] for col in flattened_cols]
+        
+        if csvj:
+            metadata_da = {
+                'name':             self.name,
+                'keyfield':         self.keyfield,
+                'dtypes':           utils.dtypes_to_names({col: self.dtypes.get(col, str) for col in self.hd}),
+                'flattened_cols':   flattened_cols,
+                'num_rows':         len(self.lol),
+                'num_cols':         self.num_cols(),
+                }
+            f.write(utils.make_csvj_header(metadata_da, line_terminator=line_terminator))
+        
+        if include_header:
+            csv_writer.writerow(self.columns())     # Write the header row
+            
+        num_rows = len(self.lol)
+        for start in range(0, max(num_rows, 1), batch_size):
+            batch_lol = self.lol[start:start + batch_size]
+            if flatten_icols:
+                batch_lol = [utils.flatten_row_la(la, flatten_icols) for la in batch_lol]
+            csv_writer.writerows(batch_lol)         # Write the data rows
+            
+            chunk = f.getvalue()
+            f.seek(0)
+            f.truncate()
+            if chunk:
+                yield chunk.encode(encoding) if encoding else chunk
+
+
     @staticmethod
     def buff_to_file(buff: T_buff, file_path: str):
     
         return utils.write_buff_to_fp(buff, file_path)
 
+
+    #==== JSON Lines
+    @classmethod
+    def from_jsonl_file(
+            cls,
+            file_path: str,                         # path to a JSON Lines (NDJSON) file.
+            keyfield: str='',                       # field to use as unique key, if not ''
+            dtypes: Optional[T_dtype_dict]=None,    # dictionary of types to set. Values keep their JSON types.
+            cols: Optional[T_ls]=None,              # if given, use only these columns, in this order.
+            compression: Optional[str]='infer',     # 'gzip', 'bz2', 'xz', None, or 'infer' from file extension.
+            ) -> 'Pydf':
+        """ read a JSON Lines file, with one JSON object per line, into a pydf.
+            Each object is placed directly into a row in the cached column order, rather than
+            creating a lod first. Columns are in the order keys are first seen unless cols is given.
+        """
+        
+        read_cols = list(cols or (dtypes or {}).keys())
+        with utils.open_file(file_path, mode='rt', compression=compression) as fp:
+            data_lol = list(utils.jsonl_rows_from_lines(fp, read_cols, fixed_cols=bool(cols)))
+            
+        # rows before new keys were seen are short.
+        utils.pad_rows_in_lol(data_lol, len(read_cols))
+        
+        my_pydf = cls(lol=data_lol, cols=read_cols, keyfield=keyfield)
+        my_pydf.dtypes = dtypes or {}
+        
+        return my_pydf
+        
+        
+    @classmethod
+    def iter_jsonl_file(
+            cls,
+            file_path_or_fp: Union[str, Any],       # path to a JSON Lines file, or a text file object already open.
+            chunk_size: int=10000,                  # maximum number of rows in each Pydf chunk.
+            keyfield: str='',                       # field to use as unique key, if not ''
+            dtypes: Optional[T_dtype_dict]=None,    # dictionary of types to set. Values keep their JSON types.
+            cols: Optional[T_ls]=None,              # if given, use only these columns, in this order.
+            compression: Optional[str]='infer',     # 'gzip', 'bz2', 'xz', None, or 'infer' from file extension.
+            ) -> Iterator['Pydf']:
+        """ read a JSON Lines file incrementally and yield Pydf instances of no more than chunk_size rows,
+            so large logs can be processed with constant memory.
+            
+            Unless cols is given, a chunk has any new keys first seen in it appended to the columns 
+            of the prior chunk.
+        """
+        
+        if isinstance(file_path_or_fp, str):
+            fp = utils.open_file(file_path_or_fp, mode='rt', compression=compression)
+            close_fp = True
+        else:
+            fp = file_path_or_fp
+            close_fp = False
+            
+        try:
+            read_cols = list(cols or (dtypes or {}).keys())
+            rows_iter = utils.jsonl_rows_from_lines(fp, read_cols, fixed_cols=bool(cols))
+            
+            for chunk_lol in utils.iter_lol_chunks(rows_iter, chunk_size=chunk_size):
+                utils.pad_rows_in_lol(chunk_lol, len(read_cols))
+                chunk_pydf = cls(lol=chunk_lol, cols=list(read_cols), keyfield=keyfield)
+                chunk_pydf.dtypes = dtypes or {}
+                
+                yield chunk_pydf
+        finally:
+            if close_fp:
+                fp.close()
+                
+                
+    def to_jsonl_file(
+            self,
+            file_path: str,
+            batch_size: int=10000,                  # number of rows written at a time.
+            compression: Optional[str]='infer',     # 'gzip', 'bz2', 'xz', None, or 'infer' from file extension.
+            ) -> str:
+        """ write the pydf array to a JSON Lines file, one object per row, in batches of rows.
+            NumPy scalars and arrays are converted by utils.NpEncoder.
+        """
+        
+        file_path = utils.path_sep_per_os(file_path)
+        with utils.open_file(file_path, mode='wt', compression=compression) as fp:
+            self.to_jsonl_fp(fp, batch_size=batch_size)
+        utils.sts(f"Saved {len(self.lol):,} rows to {file_path}", 3)
+        
+        return file_path
+        
+        
+    def to_jsonl_fp(
+            self,
+            fp: Any,                                # text file open for writing.
+            batch_size: int=10000,                  # number of rows written at a time.
+            ) -> int:
+        """ write the pydf array as JSON Lines to an open text file handle in batches of rows.
+            Each row is written as an object keyed by column name, or as an array if there are 
+            no column names. Returns the number of rows written.
+        """
+        
+        encode = utils.NpEncoder(ensure_ascii=False).encode
+        cols = self.columns()
+        
+        for start in range(0, len(self.lol), batch_size):
+            batch_lol = self.lol[start:start + batch_size]
+            if cols:
+                lines_ls = [encode(dict(zip(cols, row_la))) for row_la in batch_lol]
+            else:
+                lines_ls = [encode(row_la) for row_la in batch_lol]
+            lines_ls.append('')
+            fp.write('\n'.join(lines_ls))
+            
+        return len(self.lol)
+        
+    
+    #==== SQLite
+    to_sqlite = pydf_sqlite._to_sqlite
+    
+    #@classmethod
+    from_sqlite = pydf_sqlite._from_sqlite
+    
+    #@classmethod
+    iter_sqlite = pydf_sqlite._iter_sqlite
+    
     
     #==== Pandas
     #@classmethod
@@ -1264,6 +1969,17 @@ class Pydf:
         """
     
         import numpy as np
+        
+        if isinstance(self.lol, ColumnsLol):
+            # columns stored as arrays are used directly.
+            if not self.lol.columns:
+                return np.array([])
+            return np.column_stack([self.col_to_npa(icol=icol) for icol in range(len(self.lol.columns))])
+            
+        if isinstance(self.lol, ProjectedLol):
+            # rows are projected without materializing the view.
+            return np.array(self.lol.projected_rows())
+            
         return np.array(self.lol)
         
 
@@ -1394,13 +2110,20 @@ class Pydf:
     #===========================
     # append
         
-    def append(self, data_item: Union[T_Pydf, T_loda, T_da, T_la]):
+    def append(self, data_item: Union[T_Pydf, T_loda, T_da, T_la], intern: Union[bool, T_ls]=False):
         """ general append method can handle appending one record as T_da or T_la, many records as T_loda or T_pydf
+            if intern is True, or a list of column names, str values in those columns are interned in a table
+            kept by this pydf, so equal values appended by any call share one object.
+            The table holds every distinct value appended this way, even after its rows are removed, 
+            until clear_intern_table() is called or the data is replaced by set_lol().
         """
         # test exists in test_pydf.py for all three cases
         
         if not data_item:
             return self
+            
+        if intern:
+            data_item = self._intern_data_item(data_item, intern)
         
         if isinstance(data_item, dict):
             self.record_append(data_item)
@@ -1428,6 +2151,34 @@ class Pydf:
         return self
         
 
+    def _intern_data_item(self, data_item: Union[T_Pydf, T_loda, T_da, T_la], intern: Union[bool, T_ls]) -> Union[T_Pydf, T_loda, T_da, T_la]:
+        """ return a copy of data_item for append() with str values interned using self._intern_ds. """
+        
+        if isinstance(data_item, dict):
+            cols = list(data_item.keys())
+            row_la = next(utils.intern_rows([list(data_item.values())], utils.intern_icols(cols, intern), self._intern_ds))
+            return dict(zip(cols, row_la))
+            
+        if isinstance(data_item, Pydf):
+            rows_lol = [list(row_la) for row_la in data_item.lol]
+            icols = utils.intern_icols(data_item.columns(), intern)
+            return data_item.clone_empty(lol=list(utils.intern_rows(rows_lol, icols, self._intern_ds)))
+            
+        if isinstance(data_item[0], dict):
+            return [self._intern_data_item(record_da, intern) for record_da in data_item]
+            
+        # simple list, in the order of the columns.
+        return next(utils.intern_rows([list(data_item)], utils.intern_icols(self.columns(), intern), self._intern_ds))
+        
+        
+    def clear_intern_table(self) -> 'Pydf':
+        """ release the intern table used by append(intern=...). Values already in the data are not changed, 
+            but values appended later no longer share objects with them.
+        """
+        self._intern_ds = {}
+        return self
+        
+        
     def concat(self, other_instance: 'Pydf'):
         """ concatenate records from passed pydf cls to self pydf 
             This directly modifies self
@@ -1459,10 +2210,10 @@ class Pydf:
             raise KeyError ("keys in pydf do not match lod keys")
         
         # simply append the rows from pydf.lol to the end of self.lol
-        for idx in range(len(other_instance.lol)):
-            rec_la = other_instance.lol[idx]
-            self.lol.append(rec_la)
-        self._rebuild_kd()   # only if the keyfield is set.
+        prior_num_rows = len(self.lol)
+        self.lol.extend(other_instance.lol)
+        self._update_kd_from(prior_num_rows)   # only if the keyfield is set.
+        self._index_rows_from(prior_num_rows)
 
         if diagnose:  # pragma: no cover
             print(f"result=\n{self}")
@@ -1546,15 +2297,17 @@ class Pydf:
             
         if self.keyfield:
             # insert will overwrite any existing key with the same value.
-            keyval = record_da[self.keyfield]
+            keyval = self._keyval_of_record(record_da)
             idx = self.kd.get(keyval, -1)
             if idx >= 0:
-                self.lol[idx] = rec_la
+                self._replace_row(idx, rec_la)
             else:
                 self._basic_append_la(rec_la, keyval)
         else:
             # no keyfield is set, just append to the end.
             self.lol.append(rec_la)
+            if self.indexes:
+                self._index_rows_from(len(self.lol) - 1)
             
         return self
 
@@ -1563,8 +2316,11 @@ class Pydf:
         """ basic append to the end of the array without any checks
             including appending to kd and la to lol
         """
-        self.kd[keyval] = len(self.lol)
+        if self._kd is not None:
+            self._kd[keyval] = len(self.lol)
         self.lol.append(rec_la)
+        if self.indexes:
+            self._index_rows_from(len(self.lol) - 1)
             
         return self
                 
@@ -1652,6 +2408,10 @@ class Pydf:
             
         elif isinstance(row_spec, str) or utils.is_list_of_type(row_spec, str):
             sel_rows_pydf = self.select_krows(krows=row_spec)
+            
+        elif isinstance(self.keyfield, tuple) and (isinstance(row_spec, tuple) or utils.is_list_of_type(row_spec, tuple)):
+            # keys of a composite keyfield are tuples.
+            sel_rows_pydf = self.select_krows(krows=row_spec)
         else:
             sel_rows_pydf = self
 
@@ -1687,7 +2447,7 @@ class Pydf:
             row_spec = None
             irows = list(range(len(self)))
             
-        if isinstance(row_spec, str) or utils.is_list_of_type(row_spec, str) or isinstance(row_spec, tuple):
+        if isinstance(row_spec, str) or utils.is_list_of_type(row_spec, (str, tuple)) or isinstance(row_spec, tuple):
             irows = self.krows_to_irows(krows = row_spec)
             
         elif isinstance(row_spec, (int, slice)) or utils.is_list_of_type(row_spec, int):
@@ -1775,14 +2535,14 @@ class Pydf:
             irow = irows[0]
             
             if isinstance(value, list):
-                self.lol[irow] = value
+                self._replace_row(irow, value)
             elif isinstance(value, dict):
                 self.assign_record_da_irow(irow, record_da=value)
             elif isinstance(value, self.__class__):
-                self.lol[irow] = value
+                self._replace_row(irow, value)
             else:
                 # set the same value in the row for all columns.
-                self.lol[irow] = [value] * len(self.lol[irow])
+                self._replace_row(irow, [value] * len(self.lol[irow]))
                 
         if num_irows == 1 and num_icols == 1:
         
@@ -1792,23 +2552,23 @@ class Pydf:
             if isinstance(value, dict):
                 self.assign_record_da_irow(irow, record_da=value)
             else:    
-                self.lol[irow][icol] = value
+                self._set_cell(irow, icol, value)
                 
         elif num_irows > 1 and num_icols == 0:
             
             if isinstance(value, list):
                 for irow in irows:
-                    self.lol[irow] = value
+                    self._replace_row(irow, value)
             elif isinstance(value, dict):
                 for irow in irows:
                     self.assign_record_da_irow(irow, record_da=value)
             elif isinstance(value, self.__class__):
                 for source_row, irow in enumerate(irows):
-                    self.lol[irow] = value[source_row]
+                    self._replace_row(irow, value[source_row])
             else:
                 # set the same value in the row for all columns.
                 for irow in irows:
-                    self.lol[irow] = [value] * len(self.lol[irow])
+                    self._replace_row(irow, [value] * len(self.lol[irow]))
                 
         elif num_irows > 0 and num_icols == 1:
         
@@ -1820,7 +2580,7 @@ class Pydf:
             if isinstance(value, list):
                 for source_idx, irow in enumerate(irows):
                     try:
-                        self.lol[irow][icol] = value[source_idx]
+                        self._set_cell(irow, icol, value[source_idx])
                     except Exception:
                         import pdb; pdb.set_trace() #temp
                     
@@ -1831,12 +2591,12 @@ class Pydf:
                 
             elif isinstance(value, self.__class__):
                 for source_idx, irow in enumerate(irows):
-                    self.lol[irow][icol] = value[source_idx][0]
+                    self._set_cell(irow, icol, value[source_idx][0])
                 
             else:
                 # set the same value in the row for all selected columns.
                 for irow in irows:
-                    self.lol[irow][icol] = value
+                    self._set_cell(irow, icol, value)
         else:
             if irows is None:
                 irows = range(len(self.lol))
@@ -1845,7 +2605,7 @@ class Pydf:
                 for irow in irows:
                     for source_col, icol in enumerate(icols):
                         try:
-                            self.lol[irow][icol] = value[source_col]
+                            self._set_cell(irow, icol, value[source_col])
                         except Exception:
                             import pdb; pdb.set_trace() #temp
                     
@@ -1857,13 +2617,13 @@ class Pydf:
             elif isinstance(value, self.__class__):
                 for irow in irows:
                     for source_col, icol in enumerate(icols):
-                        self.lol[irow][icol] = value[source_col]
+                        self._set_cell(irow, icol, value[source_col])
                 
             else:
                 # set the same value in the row for all selected columns.
                 for irow in irows:
                     for icol in icols:
-                        self.lol[irow][icol] = value
+                        self._set_cell(irow, icol, value)
         return self
     
     
@@ -1886,6 +2646,10 @@ class Pydf:
             else:
                 return []
             
+        if isinstance(self.keyfield, tuple) and isinstance(krows, tuple):
+            # with a composite keyfield, a tuple is one key rather than a range of keys.
+            krows = [krows]
+            
         return self.__class__.gkeys_to_idxs(
                     keydict = self.kd,
                     gkeys = krows,
@@ -1970,7 +2734,7 @@ class Pydf:
                 
             stop_idx = len(keydict)    
             if len(gkeys) > 1:
-                stop_idx = keydict.get(gkeys[0], stop_idx - 1) + 1
+                stop_idx = keydict.get(gkeys[1], stop_idx - 1) + 1
                     
             idxs_slice = slice(start_idx, stop_idx, 1)
             idxs = idxs_slice
@@ -1990,12 +2754,22 @@ class Pydf:
             silent_error: bool=False,
             ) -> 'Pydf':
     
+        if inverse and self.kd and len(self.kd) == len(self.lol) and isinstance(self.lol, list):
+            # removing rows with unique keys: the kd of the result is patched rather than rebuilt.
+            removed_irows = self.krows_to_irows(krows=krows, silent_error=silent_error)
+            if isinstance(removed_irows, list):
+                return self._select_irows_removing(removed_irows)
+            
         irows = self.krows_to_irows( 
             krows = krows,
             inverse = inverse,
             silent_error = silent_error,
             )
-        return self.select_irows(irows)
+        result_pydf = self.select_irows(irows)
+        if inverse:
+            # the rows are removed, as by remove_key(), so the secondary indexes are kept, to be rebuilt when next used.
+            result_pydf.indexes = self._out_of_date_indexes()
+        return result_pydf
     
     
     def select_kcols(self, 
@@ -2016,31 +2790,136 @@ class Pydf:
     def select_irows(self, irows: Union[slice, int, T_li, None]) -> 'Pydf':
         """ select rows from pydf and return a new instance.
             This is an efficient opeation. The array in the new instance
-            uses references to selected rows in the original array.
+            uses references to selected rows in the original array, and is a copy-on-write view: 
+            a shared row is copied the first time either pydf modifies it, so changes made to 
+            one are not seen by the other.
             
             irows: can be either a slice, int, or list of integers. These
                     refer to row indices that are inherent in the lol structure.
             
             returns a new pydf instance cloned from the original.
         """
-        row_sliced_lol = self.lol
+        if isinstance(self.lol, (ColumnsLol, pydf_csv.CsvMmapLol)):
+            # rows of a ColumnsLol or CsvMmapLol are assembled when accessed, so they are not shared.
+            return self.clone_empty().set_lol(self._selected_rows(irows, row_copier=list))
+            
+        return self._rows_view(self._selected_rows(irows))
+        
+        
+    def _rows_view(self, row_sliced_lol: T_lola, kd: Optional[T_di]=None) -> 'Pydf':
+        """ return a new pydf which shares the rows row_sliced_lol of this pydf, copy-on-write. 
+            kd of the new pydf is rebuilt unless it is provided.
+        """
+        if self._shared_row_ids is None:
+            self._shared_row_ids = SharedRowIds()
+        self._shared_row_ids.add(self, row_sliced_lol)
+        
+        # the rows already have the dtypes, so they are not converted again.
+        view_pydf = self.clone_empty()
+        if kd is None:
+            view_pydf.set_lol(row_sliced_lol)
+        else:
+            view_pydf.lol = row_sliced_lol
+            view_pydf.kd = kd
+        view_pydf._shared_row_ids = self._shared_row_ids
+        self._shared_row_ids.add(view_pydf)
+        
+        return view_pydf
+        
+        
+    def _select_irows_removing(self, removed_irows: T_li) -> 'Pydf':
+        """ return a view of the rows of this pydf except removed_irows, 
+            copying the kept rows a run at a time, with kd patched from this kd.
+        """
+        removed_irows = sorted(set(removed_irows))
+        
+        kept_lol: T_lola = []
+        start_irow = 0
+        for irow in removed_irows:
+            kept_lol.extend(self.lol[start_irow:irow])
+            start_irow = irow + 1
+        kept_lol.extend(self.lol[start_irow:])
+        
+        kept_pydf = self._rows_view(kept_lol, kd=self._kd_without_irows(removed_irows, kept_lol))
+        
+        # the secondary indexes are kept, to be rebuilt when next used.
+        kept_pydf.indexes = self._out_of_date_indexes()
+        return kept_pydf
+        
+        
+    def _selected_rows(self, irows: Union[slice, int, T_li, None], row_copier: Optional[Callable]=None) -> T_lola:
+        """ return the list of rows selected by irows, as in select_irows(). """
+        row_copier = row_copier or (lambda row_la: row_la)
         
         if isinstance(irows, int):
             # simple single row selection
-            row_sliced_lol = [self.lol[irows]]
+            return [row_copier(self.lol[irows])]
         
         elif isinstance(irows, list):
             if irows and isinstance(irows[0], int):
                 # list of integers:
-                row_sliced_lol = [self.lol[i] for i in irows]
-            else:
-                row_sliced_lol = []
+                return [row_copier(self.lol[i]) for i in irows]
+            return []
             
         elif isinstance(irows, slice):
-            slice_spec = irows
-            row_sliced_lol = self.lol[slice_spec]
+            # slices of a ColumnsLol are lists of new rows. Rows of a CsvMmapLol are read-only, so they are copied.
+            if isinstance(self.lol, pydf_csv.CsvMmapLol):
+                return list(map(row_copier, self.lol[irows]))
+            return self.lol[irows]
             
-        return self.clone_empty(lol=row_sliced_lol)
+        return list(map(row_copier, self.lol))
+        
+        
+    def _writable_row(self, irow: int) -> T_la:
+        """ return row irow to be modified in place, first copying it if it is shared with a view. 
+            See select_irows().
+        """
+        row_la = self.lol[irow]
+        if self._shared_row_ids is not None and self._shared_row_ids.is_shared(row_la):
+            row_la = list(row_la)
+            self.lol[irow] = row_la
+        return row_la
+        
+        
+    def _set_cell(self, irow: int, icol: int, val: Any) -> None:
+        """ assign val to the cell at irow, icol, first copying the row if it is shared with a view,
+            and update the secondary index on the column, if any.
+        """
+        row_la = self._writable_row(irow)
+        if self.indexes:
+            # there are few indexes, so finding the one on icol does not depend on the number of columns.
+            for colname in self.indexes:
+                if self.hd.get(colname) == icol:
+                    self._reindex_cell(irow, colname, row_la[icol], val)
+                    break
+        row_la[icol] = val
+        
+        
+    def _replace_row(self, irow: int, row_la: T_la) -> None:
+        """ replace row irow with row_la, updating the secondary indexes, if any. """
+        if self.indexes:
+            if isinstance(row_la, list) and len(row_la) >= len(self.hd):
+                old_la = self.lol[irow]
+                for colname in self.indexes:
+                    icol = self.hd.get(colname)
+                    if icol is not None:
+                        self._reindex_cell(irow, colname, old_la[icol], row_la[icol])
+            else:
+                self._invalidate_indexes()
+        self.lol[irow] = row_la
+        
+        
+    def _unshare_rows(self):
+        """ copy all rows shared with views before modifying many rows in place. See select_irows(). """
+        shared_row_ids = self._shared_row_ids
+        if shared_row_ids is not None:
+            for irow, row_la in enumerate(self.lol):
+                if shared_row_ids.is_shared(row_la):
+                    self.lol[irow] = list(row_la)
+                    
+            # no rows of this pydf are shared now, but the registry is still used by the other views.
+            shared_row_ids.discard(self)
+        self._shared_row_ids = None
     
     
     def select_icols(self, icols: Union[slice, int, T_li, None], flip: bool=False) -> 'Pydf':
@@ -2067,65 +2946,67 @@ class Pydf:
         """
         orig_cols = list(self.hd.keys())    # may be an empty list if colnames not defined.
         orig_dtypes = self.dtypes or {}
-        sliced_cols = []
         
         if isinstance(icols, int):
-            # simple single row selection
-            icol = icols
-            if not flip:
-                col_sliced_lol = [[row[icol]] for row in self.lol]
-                if orig_cols:
-                    sliced_cols = orig_cols[icol]
-            else: # flip
-                col_sliced_lol = [row[icol] for row in self.lol]
-            
+            # simple single column selection
+            icols_li = [icols]
         elif isinstance(icols, slice):
-            slice_spec = icols
-            icols_range = range(slice_spec.start or 0, slice_spec.stop or 0, slice_spec.step or 1)
-            
-            if not flip:
-                col_sliced_lol = [[row[icol] for icol in icols_range]
-                                        for row in self.lol]
-                if orig_cols:
-                    sliced_cols = [orig_cols[icol] for icol in icols_range]
-            else: # flip
-                col_sliced_lol = [[row[icol] for row in self.lol]
-                                        for icol in icols_range]
-                
+            icols_li = list(range(*icols.indices(max(self.num_cols(), len(orig_cols)))))
         elif isinstance(icols, list) and icols and isinstance(icols[0], int):
-            # list of integers:
-            if not flip:
-                col_sliced_lol = [[row[icol] for icol in icols]
-                                        for row in self.lol]
-                if orig_cols:                        
-                    sliced_cols = [orig_cols[icol] for icol in icols]
-                
-            else: # flip
-                col_sliced_lol = [[row[icol] for row in self.lol]
-                                        for icol in icols]
+            icols_li = icols
+        elif not flip:
+            return self
         else:
-            if not flip:
-                return self
-            else: # flip
-                col_sliced_lol = [[row[icol] for row in self.lol]
-                                        for icol in range(self.num_cols())]
-                sliced_cols = []
+            icols_li = list(range(self.num_cols()))
+            
+        if flip:
+            # the columns selected are the rows of the new pydf, with no colnames, dtypes or keyfield.
+            if isinstance(icols, int):
+                col_sliced_lol = list(map(operator.itemgetter(icols), self.lol))
+            else:
+                col_sliced_lol = [list(map(operator.itemgetter(icol), self.lol)) for icol in icols_li]
+            return Pydf(lol=col_sliced_lol)
+            
+        sliced_cols = [orig_cols[icol] for icol in icols_li] if orig_cols else []
             
         # fix up the dtypes and reset the keyfield if it is no longer in the pydf.
-        if sliced_cols:
-            new_dtypes = {col:orig_dtypes[col] for col in orig_dtypes if col in sliced_cols}
-            new_keyfield = self.keyfield if self.keyfield in sliced_cols else ''    
-        else:
-            new_dtypes = {}
-            new_keyfield = ''    
+        new_dtypes = {col:orig_dtypes[col] for col in orig_dtypes if col in sliced_cols}
+        new_keyfield = self.keyfield if self.keyfield and all(col in sliced_cols for col in self._keycols()) else ''    
             
+        # the rows already have the dtypes, so they are not converted again.
         new_pydf = Pydf(    cols=sliced_cols, 
-                            lol=col_sliced_lol, 
+                            lol=self._projected_lol(icols_li), 
                             keyfield=new_keyfield,
-                            dtypes=new_dtypes,
                             )
+        new_pydf.dtypes = new_dtypes
         
         return new_pydf
+        
+        
+    def _projected_lol(self, icols: T_li) -> Union[T_lola, ProjectedLol, ColumnsLol]:
+        """ return the columns icols of all rows, as a ProjectedLol view of the rows of this pydf,
+            or for the columns layout, as a ColumnsLol of copies of the columns.
+        """
+        if isinstance(self.lol, ColumnsLol):
+            return self.lol.select_columns(icols)
+            
+        if isinstance(self.lol, ProjectedLol) and self.lol.icols_of_source() is not None:
+            # a view of a view projects the same source rows.
+            source_icols = self.lol.icols_of_source()
+            return ProjectedLol(self.lol.source_lol, [source_icols[icol] for icol in icols], self.lol.shared_row_ids)
+            
+        if not isinstance(self.lol, list):
+            return list(map(row_projector(icols), self.lol))
+            
+        # the view keeps its own list of the rows, so rows later appended, removed or replaced are not seen.
+        # rows modified in place by this pydf are first copied, as for select_irows().
+        source_lol = list(self.lol)
+        if self._shared_row_ids is None:
+            self._shared_row_ids = SharedRowIds()
+        self._shared_row_ids.add(self, source_lol)
+        
+        return ProjectedLol(source_lol, icols, self._shared_row_ids)
+    
     
     #=============================================
     # the following methods might be absorbed into the above.
@@ -2295,9 +3176,17 @@ class Pydf:
             test exists in test_pydf.py
         """
 
-        # from utilities import utils
-
-        result_lol = [list(d2.values()) for d2 in self if inverse ^ utils.is_d1_in_d2(d1=selector_da, d2=d2)]
+        indexed_irows = self._indexed_irows(selector_da)
+        cat_selector_da = {col: val for col, val in selector_da.items() if self._categorical_col(col) is not None}
+        if indexed_irows is not None:
+            if inverse:
+                indexed_irows_set = set(indexed_irows)
+                indexed_irows = [irow for irow in range(len(self.lol)) if irow not in indexed_irows_set]
+            result_lol = [list(self.lol[irow]) for irow in indexed_irows]
+        elif cat_selector_da:
+            result_lol = self._select_by_categorical_dict(selector_da, cat_selector_da, inverse)
+        else:
+            result_lol = [list(d2.values()) for d2 in self if inverse ^ utils.is_d1_in_d2(d1=selector_da, d2=d2)]
     
         if expectmax != -1 and len(result_lol) > expectmax:
             raise LookupError
@@ -2311,6 +3200,29 @@ class Pydf:
         return pydf
         
         
+    def _select_by_categorical_dict(self, selector_da: T_da, cat_selector_da: T_da, inverse: bool=False) -> T_lola:
+        """ return the rows matching selector_da, as lists, comparing the codes of categorical 
+            columns in cat_selector_da. Other columns in selector_da are compared in the matching rows.
+        """
+        match_npa = np.ones(len(self.lol), dtype=bool)
+        for col, val in cat_selector_da.items():
+            cat_col = self._categorical_col(col)
+            code = cat_col.code_of.get(val)
+            if code is None:
+                match_npa[:] = False
+                break
+            match_npa &= cat_col.codes_npa() == code
+            
+        other_selector_da = {col: val for col, val in selector_da.items() if col not in cat_selector_da}
+        if other_selector_da:
+            for irow in np.flatnonzero(match_npa).tolist():
+                match_npa[irow] = utils.is_d1_in_d2(d1=other_selector_da, d2=dict(zip(self.hd, self.lol[irow])))
+        
+        if inverse:
+            match_npa = ~match_npa
+        return [list(self.lol[irow]) for irow in np.flatnonzero(match_npa).tolist()]
+        
+        
     def select_first_row_by_dict(self, selector_da: T_da, inverse:bool=False) -> T_da:
         """ Selects the first row in pydf which matches the fields specified in selector_da
             and returns that row. Else returns {}.
@@ -2319,6 +3231,11 @@ class Pydf:
             
         # test exists in test_pydf.py
 
+        if not inverse:
+            indexed_irows = self._indexed_irows(selector_da)
+            if indexed_irows is not None:
+                return dict(zip(self.hd, self.lol[indexed_irows[0]])) if indexed_irows else {}
+
         for d2 in self:
             if inverse ^ utils.is_d1_in_d2(d1=selector_da, d2=d2):
                 return d2
@@ -2326,6 +3243,29 @@ class Pydf:
         return {}
 
 
+    def select_by_range(self, 
+            colname:        str,                # column with orderable values.
+            start:          Any = None,         # lowest value selected, or None for no lower limit.
+            stop:           Any = None,         # value above those selected, or None for no upper limit.
+            include_stop:   bool = False,       # if True, values equal to stop are also selected.
+            ) -> 'Pydf':
+        """ Selects rows in pydf where start <= value < stop in colname, (or value <= stop if include_stop)
+            and returns them in row order as a view, as select_irows() does.
+            
+            Uses the sorted index on colname if one was created with create_index(colname, kind='sorted'),
+            otherwise compares all values in the column. Values which cannot be compared with start 
+            and stop, like '' in a column of numbers, are not selected.
+        """
+        index = self._index_of(colname)
+        if isinstance(index, SortedIndex):
+            irows = index.range_irows(start, stop, include_stop)
+        else:
+            icol = self.hd[colname]
+            irows = [irow for irow, row_la in enumerate(self.lol) if value_in_range(row_la[icol], start, stop, include_stop)]
+        
+        return self.select_irows(irows)
+
+
     def select_where(self, where: Callable) -> 'Pydf':
         """
         Select rows in Pydf based on the provided where condition
@@ -2389,6 +3329,24 @@ class Pydf:
         return result_la
 
         
+    def col_to_npa(self, colname: str='', icol: Optional[int]=None) -> Any:
+        """ return a column, by colname or icol, as a NumPy array.
+            Columns stored as arrays, such as those mapped by open_pydf_mmap(), are returned without copying
+            and should be treated as read-only. Otherwise the array is created from the column values.
+        """
+        if icol is None:
+            if colname not in self.hd:
+                raise RuntimeError(f"colname {colname} not defined in this pydf.")
+            icol = self.hd[colname]
+            
+        if isinstance(self.lol, ColumnsLol):
+            col_npa = self.lol.col_npa(icol)
+            if col_npa is not None:
+                return col_npa
+                
+        return np.array(self.icol_to_la(icol))
+
+        
     def icol(self, icol: int) -> list:
         return self.icol_to_la(icol)
 
@@ -2403,7 +3361,11 @@ class Pydf:
         if icol < 0 or not self or icol >= self.num_cols():
             return []
         
-        if omit_nulls:
+        if isinstance(self.lol, ColumnsLol):
+            result_la = self.lol.col_la(icol)
+            if omit_nulls:
+                result_la = [val for val in result_la if val]
+        elif omit_nulls:
             result_la = [la[icol] for la in self.lol if la[icol]]
         else:
             result_la = [la[icol] for la in self.lol]
@@ -2433,6 +3395,9 @@ class Pydf:
             la = [la[idx] for idx in keep_idxs_li]
             self.lol[irow] = la
             
+        for col in exclude_cols:
+            self.drop_index(col)
+            
         old_cols = list(self.hd.keys())
         new_cols = [old_cols[idx] for idx in keep_idxs_li]
         self._cols_to_hd(new_cols)
@@ -2445,10 +3410,10 @@ class Pydf:
             cols: Optional[T_ls]=None, 
             exclude_cols: Optional[T_ls]=None, 
             ) -> 'Pydf':
-        """ given a list of colnames, alter the pydf to select only the cols specified.
-            this produces a new pydf. Instead of selecting cols in this manner, it is better
-            provide cols parameter in any .apply, .reduce, .from_xxx or .to_xxx methods,
-            because this operation is not efficient.
+        """ given a list of colnames, select only the cols specified, in their original order.
+            this produces a new pydf, which is a view of the rows of this pydf, as for select_icols().
+            Instead of selecting cols in this manner, it is better to
+            provide cols parameter in any .apply, .reduce, .from_xxx or .to_xxx methods.
         """
         
         if not cols:
@@ -2461,24 +3426,12 @@ class Pydf:
             exclude_cols=exclude_cols
             )
     
-        selected_cols_li = [self.hd[col] for col in desired_cols if col in self.hd]
+        selected_cols_li = sorted({self.hd[col] for col in desired_cols if col in self.hd})
         
-        # select from the array and create a new object.
-        # this is time consuming.
-        new_lol = []
-        for irow, la in enumerate(self.lol):
-            la = [la[col_idx] for col_idx in range(len(la)) if col_idx in selected_cols_li]
-            new_lol.append(la)
-       
-        old_cols = self.columns()
-        new_cols = [old_cols[idx] for idx in range(len(old_cols)) if idx in selected_cols_li]
-        dtypes = {col: typ for col, typ in self.dtypes.items() if col in new_cols}
+        if not selected_cols_li:
+            return Pydf(lol=[[] for _ in range(len(self.lol))])
         
-        new_keyfield = self.keyfield if self.keyfield and self.keyfield in new_cols else ''
-
-        new_pydf = Pydf(lol=new_lol, cols=new_cols, dtypes=dtypes, keyfield=new_keyfield)
-    
-        return(new_pydf)
+        return self.select_icols(selected_cols_li)
         
 
     # def from_selected_cols(self, cols: Optional[T_ls]=None, exclude_cols: Optional[T_ls]=None) -> 'Pydf':
@@ -2523,21 +3476,20 @@ class Pydf:
         if not self.keyfield:
             raise RuntimeError("No keyfield estabished for pydf.")
             
-        keyfield = self.keyfield
-        if keyfield not in record_da:
+        if not all(col in record_da for col in self._keycols()):
             raise RuntimeError("No keyfield in dict.")
             
         if self and list(record_da.keys()) != list(self.hd.keys()):
             raise RuntimeError("record fields not equal to pydf columns")
             
-        keyval = record_da[keyfield]
+        keyval = self._keyval_of_record(record_da)
             
         row_idx = self.kd.get(keyval, -1)
         if row_idx < 0 or row_idx >= len(self.lol):
             self.append(record_da)
         else:
             #normal_record_da = Pydf.normalize_record_da(record_da, cols=self.columns(), dtypes=self.dtypes)   
-            self.lol[row_idx] = [record_da.get(col, '') for col in self.hd]
+            self._replace_row(row_idx, [record_da.get(col, '') for col in self.hd])
         
 
     def assign_record_da_irow(self, irow: int=-1, record_da: Optional[T_da]=None):
@@ -2552,7 +3504,7 @@ class Pydf:
             self.append(record_da)
         else:
             #normal_record_da = Pydf.normalize_record_da(record_da, cols=self.columns(), dtypes=self.dtypes)   
-            self.lol[irow] = [record_da.get(col, '') for col in self.hd]
+            self._replace_row(irow, [record_da.get(col, '') for col in self.hd])
         
 
     def update_by_keylist(self, keylist: Optional[T_ls]=None, record_da: Optional[T_da]=None):
@@ -2585,7 +3537,7 @@ class Pydf:
         for colname, val in record_da.items():
             icol = self.hd.get(colname, -1)
             if icol >= 0:
-                self.lol[irow][icol] = record_da[colname]
+                self._set_cell(irow, icol, record_da[colname])
         
 
     def assign_icol(self, icol: int=-1, col_la: Optional[T_la]=None, default: Any=''):
@@ -2596,7 +3548,9 @@ class Pydf:
         """
         # from utilities import utils
 
+        self._unshare_rows()
         self.lol = utils.assign_col_in_lol_at_icol(icol, col_la, lol=self.lol, default=default)
+        self._invalidate_indexes()
         
         
         
@@ -2609,6 +3563,7 @@ class Pydf:
         
         # from utilities import utils
 
+        self._unshare_rows()
         self.lol = utils.insert_col_in_lol_at_icol(icol, col_la, lol=self.lol, default=default)
         
         if colname:
@@ -2634,9 +3589,17 @@ class Pydf:
         
         # from utilities import utils
 
+        prior_num_rows = len(self.lol)
         self.lol = utils.insert_row_in_lol_at_irow(irow=irow, row_la=row_la, lol=self.lol, default=default)
         
-        self._rebuild_kd()
+        # only the inserted row and the rows after it have new indexes.
+        first_irow = irow if 0 <= irow < prior_num_rows else prior_num_rows
+        self._update_kd_from(first_irow)
+        if first_irow < prior_num_rows:
+            # rows after the inserted row have moved.
+            self._invalidate_indexes()
+        else:
+            self._index_rows_from(first_irow)
 
 
     def assign_col(self, colname: str, la: Optional[T_la]=None, default: Any=''):
@@ -2719,7 +3682,7 @@ class Pydf:
     def set_icol(self, icol: int, val: Any):
     
         for irow in range(len(self.lol)):
-            self.lol[irow][icol] = val
+            self._set_cell(irow, icol, val)
         
 
     def set_icol_irows(self, icol: int, irows: T_li, val: Any):
@@ -2729,7 +3692,7 @@ class Pydf:
             if irow >= len(self.lol) or irow < 0:
                 continue
         
-            self.lol[irow][icol] = val        
+            self._set_cell(irow, icol, val)
     
     
     #=========================
@@ -2738,10 +3701,10 @@ class Pydf:
     def find_replace(self, find_pat, replace_val):
         """ scan cells in pydf and if match is found, replace the cell with pattern """
 
-        for row_la in self.lol:
+        for irow, row_la in enumerate(self.lol):
             for i, value in enumerate(row_la):
                 if bool(re.search(find_pat, str(value))):
-                    row_la[i] = replace_val
+                    self._set_cell(irow, i, replace_val)
         
     
 
@@ -2776,8 +3739,10 @@ class Pydf:
     def sort_by_colname(self, colname:str, reverse: bool=False, length_priority: bool=False):
         """ sort the data by a given colname, using length priority unless specified.
             sorts in place. Make a copy if you need the original order.
+            The data is converted to the 'rows' layout first, and is left in that layout.
         """
         colidx = self.hd[colname]
+        self.set_layout('rows')
         self.lol = utils.sort_lol_by_col(self.lol, colidx, reverse=reverse, length_priority=length_priority)
         self._rebuild_kd()
         
@@ -2848,6 +3813,9 @@ class Pydf:
         prior_retmode = self.retmode
         self.retmode = self.RETMODE_VAL
         
+        key_icols = self._key_icols() or []
+        keys_changed = False
+        
         while lol_changed:
             lol_changed = False
             loop_count += 1
@@ -2869,14 +3837,17 @@ class Pydf:
                     
                     if new_value != self.lol[irow][icol]:
                         # update the value in the array, and set lol_changed flag
-                        self.lol[irow][icol] = new_value
+                        self._set_cell(irow, icol, new_value)
                         lol_changed = True
+                        keys_changed = keys_changed or icol in key_icols
                     else:
                         continue
                         
         self.retmode = prior_retmode
 
-        self._rebuild_kd()
+        # kd is only affected if values in the keyfield column changed.
+        if keys_changed:
+            self._rebuild_kd()
         
     def _parse_formulas(self) -> 'Pydf':
     
@@ -3036,17 +4007,27 @@ class Pydf:
         if by == 'row':
             keylist_or_dict = keylist if not keylist or len(keylist) < 30 else dict.fromkeys(keylist)
 
+            keys_changed = False
+            key_icols = self._key_icols() or []
             for idx, row_da in enumerate(self):
                 if self.keyfield and keylist_or_dict and self.keyfield not in keylist_or_dict:
                     continue
                 transformed_row_da = func(row_da, **kwargs)
-                self.lol[idx] = list(transformed_row_da.values())
+                
+                # func may modify row_da in place and return it, so the key values are compared 
+                # in the row being replaced.
+                old_row_la = self.lol[idx]
+                new_row_la = list(transformed_row_da.values())
+                if any(icol >= len(new_row_la) or new_row_la[icol] != old_row_la[icol] for icol in key_icols):
+                    keys_changed = True
+                self._replace_row(idx, new_row_la)
                 
         else:
             raise NotImplementedError
             
         # Rebuild the internal data structure (if needed)
-        self._rebuild_kd()
+        if keys_changed:
+            self._rebuild_kd()
         
         
     def reduce(
@@ -3238,6 +4219,16 @@ class Pydf:
         
         result_dopydf: Dict[str, 'Pydf'] = {}
         
+        cat_col = self._categorical_col(colname)
+        if cat_col is not None:
+            # group the row indexes by code, then copy each group of rows at once.
+            rows_lol = self.lol.materialize()
+            for fieldval, irows in cat_col.irows_by_value().items():
+                if omit_nulls and fieldval=='':
+                    continue
+                result_dopydf[fieldval] = self.clone_empty(lol=[rows_lol[irow] for irow in irows])
+            return result_dopydf
+        
         for da in self:
             fieldval = da[colname]
             if omit_nulls and fieldval=='':
@@ -3642,13 +4633,24 @@ class Pydf:
         
         sums_d_by_colidx = dict.fromkeys(cleaned_colidxs_li, 0.0)
         
-        for la in self.lol:
+        if isinstance(self.lol, ColumnsLol):
+            # columns stored as arrays are summed directly.
             for colidx in cleaned_colidxs_li:
-                if la[colidx]:
-                    if numeric_only:
-                        sums_d_by_colidx[colidx] += Pydf._safe_tofloat(la[colidx])
-                    else:
-                        sums_d_by_colidx[colidx] += float(la[colidx])
+                col_npa = self.lol.col_npa(colidx)
+                if col_npa is not None:
+                    sums_d_by_colidx[colidx] = float(np.sum(col_npa))
+                elif numeric_only:
+                    sums_d_by_colidx[colidx] = sum(Pydf._safe_tofloat(val) for val in self.lol.col_la(colidx) if val)
+                else:
+                    sums_d_by_colidx[colidx] = sum(float(val) for val in self.lol.col_la(colidx) if val)
+        else:
+            for la in self.lol:
+                for colidx in cleaned_colidxs_li:
+                    if la[colidx]:
+                        if numeric_only:
+                            sums_d_by_colidx[colidx] += Pydf._safe_tofloat(la[colidx])
+                        else:
+                            sums_d_by_colidx[colidx] += float(la[colidx])
 
         try:
             sums_d = {cleaned_colnames_ls[idx]: sums_d_by_colidx[colidx] for idx, colidx in enumerate(cleaned_colidxs_li)}
@@ -3677,6 +4679,12 @@ class Pydf:
         
         if not self:
             return {}
+            
+        if isinstance(self.lol, ColumnsLol):
+            # sum each column directly from its array.
+            if colnames_ls is None:
+                colnames_ls = self.columns()
+            return {colname: np.sum(self.col_to_npa(colname)).item() for colname in colnames_ls}
 
         if colnames_ls is None:
             to_sum_pydf = self
@@ -3721,12 +4729,20 @@ class Pydf:
 
         icol = self.hd[colname]
         
-        for irow in range(len(self.lol)):
-            val = self.lol[irow][icol]
-            if val not in valuecounts_di:
-                valuecounts_di[val] = 1
-            else:
-                valuecounts_di[val] += 1
+        cat_col = self._categorical_col(colname)
+        if cat_col is not None:
+            # count the codes, in order of the code table.
+            valuecounts_di = cat_col.value_counts()
+        elif isinstance(self.lol, ColumnsLol):
+            # count the column directly, in order of first appearance.
+            valuecounts_di = dict(collections.Counter(self.lol.col_la(icol)))
+        else:
+            for irow in range(len(self.lol)):
+                val = self.lol[irow][icol]
+                if val not in valuecounts_di:
+                    valuecounts_di[val] = 1
+                else:
+                    valuecounts_di[val] += 1
 
         if omit_nulls:
             utils.safe_del_key(valuecounts_di, '') 
@@ -3782,7 +4798,13 @@ class Pydf:
         icol = self.hd[colname]
         selectedby_colidx = self.hd[selectedby_colname]
         
-        for irow in range(len(self.lol)):
+        index = self._index_of(selectedby_colname)
+        if index is not None:
+            irows: Iterable[int] = index.get(selectedby_colvalue, [])
+        else:
+            irows = range(len(self.lol))
+        
+        for irow in irows:
             val = self.lol[irow][selectedby_colidx]
             if val != selectedby_colvalue:
                 continue
@@ -3913,7 +4935,10 @@ class Pydf:
             new_cols = ['key'] + Pydf._generate_spreadsheet_column_names_list(num_cols=len(self.lol))
 
         # transpose the array
-        new_lol = [list(row) for row in zip(*self.lol)]
+        if isinstance(self.lol, ColumnsLol):
+            new_lol = [self.lol.col_la(icol) for icol in range(len(self.lol.columns))]
+        else:
+            new_lol = [list(row) for row in zip(*self.lol)]
         
         if include_header:
             # add a new first column which will be the old column names row.
@@ -3986,20 +5011,19 @@ class Pydf:
         else:
             colnames_ls = list(self.hd.keys())
             
-        result_lol = self.lol
-        if colnames_ls:
-            result_lol = [colnames_ls] + result_lol
+        header_lol = [colnames_ls] if colnames_ls else []
 
         # no limits, return summary.
         if not max_rows and not max_cols:
-            return result_lol
+            return header_lol + self.lol[:] if header_lol else self.lol
 
         num_rows    = len(self.lol) if self.lol else 0
         num_cols    = self.num_cols()
 
         if max_rows and num_rows <= max_rows:
             # Get all the rows, but potentially limit columns
-            result_lol = utils.reduce_lol_cols(result_lol, max_cols=max_cols)
+            # lol may be a ColumnsLol or ProjectedLol, and slices of these are lists.
+            result_lol = utils.reduce_lol_cols(header_lol + self.lol[:], max_cols=max_cols)
         
         else:
             # Get the first and last portion of rows
@@ -0,0 +1,321 @@
+# pydf_binfile.py
+"""
+
+# Pydf -- Python Dataframes
+
+The Pydf class provides a lightweight, simple and fast alternative to provide
+2-d data arrays with mixed types.
+
+This file handles the native binary .pydf file format, which stores each
+column as a typed block so that files can be loaded without parsing.
+
+"""
+
+"""
+    MIT License
+
+    Copyright (c) 2024 Ray Lutz
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+"""
+
+
+"""
+See README file at this location: https://github.com/raylutz/Pydf/blob/main/README.md
+"""
+
+import json
+import mmap
+import pickle
+import struct
+
+import numpy as np
+
+from Pydf.pydf_types import T_ls, T_la, T_lola, T_da
+
+import Pydf.pydf_utils as utils
+
+from Pydf.pydf_columns import ColumnsLol, lol_to_cols, cols_to_lol
+
+from typing import List, Dict, Any, Tuple, Optional, Union, cast, Type, Callable, BinaryIO #
+def fake_function(a: Optional[List[Dict[str, Tuple[int,Union[Any, str, Type, Callable ]]]]] = None) -> Optional[int]:
+    return None or cast(int, 0)   # pragma: no cover
+
+
+# .pydf file layout:
+#
+#   PYDF_FILE_MAGIC
+#   column blocks, each part aligned to BLOCK_ALIGNMENT bytes so numeric parts can be mapped as arrays.
+#   header:  utf-8 JSON with name, keyfield, cols, dtypes, num_rows and the codec and 
+#               [offset, nbytes] of each part of each column.
+#   trailer: PYDF_FILE_TRAILER, length of the header and PYDF_FILE_MAGIC.
+#
+# The header is written last so that columns can be written one at a time without knowing 
+#   their sizes in advance.
+
+PYDF_FILE_MAGIC     = b'PYDFBIN\x00'
+PYDF_FILE_VERSION   = 1
+PYDF_FILE_TRAILER   = struct.Struct('<Q8s')     # length of header, magic
+BLOCK_ALIGNMENT     = 8
+
+# codecs of columns stored as raw arrays. parts are the values and an optional uint8 null mask.
+NUMERIC_CODECS: Dict[str, Any] = {'int64': np.int64, 'float64': np.float64, 'bool': np.bool_}
+NUMERIC_CODEC_BY_TYPE: Dict[Type, str] = {int: 'int64', float: 'float64', bool: 'bool'}
+
+
+#==== column codecs
+# These are also used to pickle Pydf instances, so numeric columns can be passed as buffers.
+
+def encode_col(col_la: T_la) -> Tuple[str, List[Any]]:
+    """ choose a codec for one column and return (codec, parts), where parts are bytes-like objects.
+    
+        'int64', 'float64', 'bool': numpy array of values, and a uint8 null mask if any values are ''.
+        'str':                      int64 array of num_rows+1 offsets, and the utf-8 encoded data with
+                                        each value terminated by NUL.
+        'pickle':                   the column list pickled, used for any other mix of types.
+    """
+    val_types = set(map(type, col_la))
+    
+    has_nulls = False
+    if len(val_types) == 2 and str in val_types and all(val == '' for val in col_la if type(val) is str):
+        # numeric columns may have '' for missing values.
+        has_nulls = True
+        val_types.discard(str)
+
+    codec = NUMERIC_CODEC_BY_TYPE.get(next(iter(val_types))) if len(val_types) == 1 else None
+    
+    if codec:
+        if has_nulls:
+            null_mask = np.fromiter((type(val) is str for val in col_la), dtype=np.uint8, count=len(col_la))
+            col_la = [0 if type(val) is str else val for val in col_la]
+        try:
+            values_npa = np.array(col_la, dtype=NUMERIC_CODECS[codec])
+        except OverflowError:
+            # ints larger than int64
+            return 'pickle', [pickle.dumps(list(col_la), protocol=pickle.HIGHEST_PROTOCOL)]
+        return codec, [values_npa, null_mask] if has_nulls else [values_npa]
+        
+    if not has_nulls and val_types == {str}:
+        # each value is followed by a NUL so that columns without embedded NULs can be decoded with one split.
+        encoded_lb = [val.encode('utf-8') + b'\x00' for val in col_la]
+        offsets_npa = np.zeros(len(encoded_lb) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded_lb), dtype=np.int64, count=len(encoded_lb)), out=offsets_npa[1:])
+        return 'str', [offsets_npa, b''.join(encoded_lb)]
+        
+    return 'pickle', [pickle.dumps(list(col_la), protocol=pickle.HIGHEST_PROTOCOL)]
+    
+    
+def decode_col(codec: str, parts: List[Any]) -> T_la:
+    """ return the column list from the codec and parts produced by encode_col(). 
+        parts may be any bytes-like objects, including memoryviews of a mapped file.
+    """
+    if codec in NUMERIC_CODECS:
+        col_la = np.frombuffer(parts[0], dtype=NUMERIC_CODECS[codec]).tolist()
+        if len(parts) > 1:
+            for irow in np.flatnonzero(np.frombuffer(parts[1], dtype=np.uint8)).tolist():
+                col_la[irow] = ''
+        return col_la
+        
+    if codec == 'str':
+        data = bytes(parts[1])
+        num_vals = memoryview(parts[0]).nbytes // 8 - 1
+        if num_vals <= 0:
+            return []
+        if data.count(b'\x00') == num_vals:
+            return data[:-1].decode('utf-8').split('\x00')
+        # some values have embedded NULs, so use the offsets.
+        offsets_li = np.frombuffer(parts[0], dtype=np.int64).tolist()
+        return [data[start:end - 1].decode('utf-8') for start, end in zip(offsets_li, offsets_li[1:])]
+        
+    if codec == 'pickle':
+        return pickle.loads(parts[0])
+        
+    raise ValueError(f"Unknown column codec '{codec}'")
+    
+    
+#==== .pydf files
+def _to_pydf_file(
+        self,
+        file_path: str,
+        ) -> str:
+    """ write the pydf to a binary .pydf file, with each column stored as a typed block.
+        hd, keyfield, dtypes and name are saved in the header and restored by from_pydf_file().
+        Returns file_path.
+    """
+    file_path = utils.path_sep_per_os(file_path)
+    num_rows = len(self.lol)
+    cols_lol = lol_to_cols(self.lol, max(self.num_cols(), len(self.hd)))
+    
+    col_blocks_lod = []
+    with open(file_path, 'wb') as fp:
+        fp.write(PYDF_FILE_MAGIC)
+        offset = len(PYDF_FILE_MAGIC)
+        
+        for col_la in cols_lol:
+            codec, parts = encode_col(col_la)
+            parts_lol = []
+            for part in parts:
+                part_mv = memoryview(part).cast('B')
+                padding = -offset % BLOCK_ALIGNMENT
+                fp.write(b'\x00' * padding)
+                offset += padding
+                fp.write(part_mv)
+                parts_lol.append([offset, part_mv.nbytes])
+                offset += part_mv.nbytes
+            col_blocks_lod.append({'codec': codec, 'parts': parts_lol})
+                
+        header_da = {
+            'version':      PYDF_FILE_VERSION,
+            'name':         self.name,
+            'keyfield':     self.keyfield,
+            'cols':         list(self.hd.keys()),
+            'dtypes':       utils.dtypes_to_names(self.dtypes),
+            'num_rows':     num_rows,
+            'col_blocks':   col_blocks_lod,
+            }
+        header_bytes = json.dumps(header_da).encode('utf-8')
+        fp.write(header_bytes)
+        fp.write(PYDF_FILE_TRAILER.pack(len(header_bytes), PYDF_FILE_MAGIC))
+        
+    utils.sts(f"Saved {num_rows:,} rows to {file_path}", 3)
+        
+    return file_path
+    
+
+def read_pydf_file_header(fp: BinaryIO) -> T_da:
+    """ read and check the header of an open .pydf file. """
+    fp.seek(0, 2)
+    file_size = fp.tell()
+    if file_size < len(PYDF_FILE_MAGIC) + PYDF_FILE_TRAILER.size:
+        raise ValueError("File is too short to be a .pydf file")
+        
+    fp.seek(file_size - PYDF_FILE_TRAILER.size)
+    header_len, magic = PYDF_FILE_TRAILER.unpack(fp.read(PYDF_FILE_TRAILER.size))
+    fp.seek(0)
+    if magic != PYDF_FILE_MAGIC or fp.read(len(PYDF_FILE_MAGIC)) != PYDF_FILE_MAGIC:
+        raise ValueError("File is not a .pydf file")
+        
+    fp.seek(file_size - PYDF_FILE_TRAILER.size - header_len)
+    header_da = json.loads(fp.read(header_len).decode('utf-8'))
+    if header_da.get('version', 0) > PYDF_FILE_VERSION:
+        raise ValueError(f"Unsupported .pydf file version {header_da.get('version')}")
+        
+    header_da['dtypes'] = utils.names_to_dtypes(header_da['dtypes'])
+    return header_da
+    
+    
+def icols_to_load(header_da: T_da, include_cols: Optional[T_ls]) -> List[int]:
+    """ return column indexes to load, in the order of include_cols if it is given. """
+    if include_cols is None:
+        return list(range(len(header_da['col_blocks'])))
+        
+    hd = {col: icol for icol, col in enumerate(header_da['cols'])}
+    missing_ls = [col for col in include_cols if col not in hd]
+    if missing_ls:
+        raise KeyError(f"Columns {missing_ls} are not in the file")
+    return [hd[col] for col in include_cols]
+    
+
+@classmethod
+def _from_pydf_file(
+        cls,
+        file_path: str,
+        include_cols: Optional[T_ls]=None,      # load only the columns specified. Other blocks are not read.
+        ) -> 'Pydf':
+    """ read a binary .pydf file written by to_pydf_file().
+        Columns are decoded directly from their blocks, so no parsing or type conversion is needed.
+    """
+    file_path = utils.path_sep_per_os(file_path)
+    with open(file_path, 'rb') as fp:
+        header_da = read_pydf_file_header(fp)
+        icols = icols_to_load(header_da, include_cols)
+        
+        cols_lol = []
+        for icol in icols:
+            col_block_da = header_da['col_blocks'][icol]
+            parts = []
+            for offset, nbytes in col_block_da['parts']:
+                fp.seek(offset)
+                parts.append(fp.read(nbytes))
+            cols_lol.append(decode_col(col_block_da['codec'], parts))
+            
+    all_cols = header_da['cols']
+    cols = [all_cols[icol] for icol in icols if icol < len(all_cols)]
+    dtypes = {col: dtype for col, dtype in header_da['dtypes'].items() if col in cols}
+    
+    # data is already typed, so dtypes are set after init to avoid converting again.
+    my_pydf = cls(lol=cols_to_lol(cols_lol, header_da['num_rows']), cols=cols, 
+                    keyfield=header_da['keyfield'], name=header_da['name'])
+    my_pydf.dtypes = dtypes
+    
+    # the keyfield is not set if include_cols leaves out any of its columns, as with select_icols().
+    if not all(col in my_pydf.hd for col in my_pydf._keycols()):
+        my_pydf.set_keyfield('')
+    
+    return my_pydf
+
+
+@classmethod
+def _open_pydf_mmap(
+        cls,
+        file_path: str,
+        include_cols: Optional[T_ls]=None,      # map only the columns specified. Other blocks are not read.
+        ) -> 'Pydf':
+    """ open a .pydf file with int, float and bool columns memory-mapped as read-only NumPy arrays,
+        without reading them into Python objects. Other columns, and numeric columns with '' values, 
+        are decoded into lists.
+        
+        The rows of the result are assembled from the columns when accessed. Assigning to a mapped 
+        column first copies it into memory, so the file is not modified.
+        col(), col_to_npa(), sum_np() and to_numpy() work directly on the mapped arrays.
+        Since the file is mapped through the page cache, processes that open the same file
+        share one copy of the numeric data.
+    """
+    file_path = utils.path_sep_per_os(file_path)
+    with open(file_path, 'rb') as fp:
+        header_da = read_pydf_file_header(fp)
+        icols = icols_to_load(header_da, include_cols)
+        
+        # the mapping remains valid after the file is closed, and is released when the arrays are.
+        mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        
+    mm_mv = memoryview(mm)
+    columns = []
+    for icol in icols:
+        col_block_da = header_da['col_blocks'][icol]
+        codec = col_block_da['codec']
+        parts = [mm_mv[offset:offset + nbytes] for offset, nbytes in col_block_da['parts']]
+        if codec in NUMERIC_CODECS and len(parts) == 1:
+            columns.append(np.frombuffer(parts[0], dtype=NUMERIC_CODECS[codec]))
+        else:
+            columns.append(decode_col(codec, parts))
+            
+    all_cols = header_da['cols']
+    cols = [all_cols[icol] for icol in icols if icol < len(all_cols)]
+    dtypes = {col: dtype for col, dtype in header_da['dtypes'].items() if col in cols}
+    
+    my_pydf = cls(lol=ColumnsLol(columns, header_da['num_rows']), cols=cols, 
+                    keyfield=header_da['keyfield'], name=header_da['name'])
+    my_pydf.dtypes = dtypes
+    
+    # the keyfield is not set if include_cols leaves out any of its columns, as with select_icols().
+    if not all(col in my_pydf.hd for col in my_pydf._keycols()):
+        my_pydf.set_keyfield('')
+    
+    return my_pydf
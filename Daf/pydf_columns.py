@@ -0,0 +1,439 @@
+# pydf_columns.py
+"""
+
+# Pydf -- Python Dataframes
+
+The Pydf class provides a lightweight, simple and fast alternative to provide
+2-d data arrays with mixed types.
+
+This file provides a list-like sequence of rows which is stored as columns,
+so that numeric columns can be held in arrays, including arrays mapped from a file.
+This is used for the 'columns' layout of Pydf.
+
+"""
+
+"""
+    MIT License
+
+    Copyright (c) 2024 Ray Lutz
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+"""
+
+
+"""
+See README file at this location: https://github.com/raylutz/Pydf/blob/main/README.md
+"""
+
+import array
+import itertools
+
+import numpy as np
+
+from Pydf.pydf_types import T_la, T_lola
+
+from typing import List, Dict, Any, Tuple, Optional, Union, cast, Type, Callable, Iterator #
+def fake_function(a: Optional[List[Dict[str, Tuple[int,Union[Any, str, Type, Callable ]]]]] = None) -> Optional[int]:
+    return None or cast(int, 0)   # pragma: no cover
+
+
+ROW_BLOCK_SIZE = 1000       # rows assembled at a time when iterating.
+
+# columns with all int or all float values are stored as arrays of these types.
+ARRAY_TYPECODE_BY_TYPE: Dict[Type, str] = {int: 'q', float: 'd'}
+NP_DTYPE_BY_TYPECODE:   Dict[str, Any]  = {'q': np.int64, 'd': np.float64}
+TYPECODE_BY_NP_DTYPE:   Dict[str, str]  = {'i8': 'q', 'f8': 'd'}
+
+# the only type of value stored in an array or NumPy array column, by typecode or dtype kind.
+TYPE_BY_TYPECODE:       Dict[str, Type] = {'q': int, 'd': float}
+TYPE_BY_NP_KIND:        Dict[str, Type] = {'i': int, 'f': float, 'b': bool}
+
+CATEGORY_CODE_TYPECODE = 'i'    # codes of categorical columns are stored as array('i').
+
+
+class Categorical:
+    """ dtype for columns with few distinct values, such as state or status, used in dtypes like str.
+        In the 'columns' layout, these columns are stored as a CategoricalColumn of small int codes 
+        and a code table of the distinct values. In the 'rows' layout, equal values read from a file 
+        are the same object.
+    """
+    
+    def __init__(self):
+        raise TypeError("Categorical is used as a dtype and is not instantiated.")
+
+
+class ColumnsLol:
+    """ list-like sequence of rows which is stored as a list of columns.
+        Each column is an array('q') or array('d') for all int or all float values, a NumPy array
+        (for example, mapped from a file), a CategoricalColumn for columns with dtype Categorical, 
+        or a list for other types.
+        
+        Rows are assembled as ColumnsRow lists when accessed. Assigning to an item of a row also 
+        assigns to the column, but rows cannot change length. If a value assigned or appended is not
+        of the type stored in the array of a column, such as an int assigned to an array('d') column 
+        or True to an array('q') column, that column is converted to a list so the value keeps its 
+        type. A read-only NumPy array, such as one mapped from a file, is copied when first assigned 
+        to, so the file is not modified.
+        Column operations can work directly on the arrays using col_npa().
+    """
+    
+    def __init__(self, columns: List[Any], num_rows: Optional[int]=None):
+        self.columns = columns
+        if num_rows is None:
+            num_rows = len(columns[0]) if columns else 0
+        self.num_rows = num_rows
+        
+        # NumPy scalars are converted to Python values when rows are assembled.
+        self._getters: List[Callable] = [column_getter(col) for col in columns]
+        
+        
+    @classmethod
+    def from_lol(cls, lol: T_lola, num_cols: int, categorical_icols: Optional[List[int]]=None) -> 'ColumnsLol':
+        """ transpose lol into columns, using arrays for columns with all int or all float values,
+            and a CategoricalColumn for columns in categorical_icols.
+        """
+        categorical_icols = categorical_icols or []
+        
+        return cls([CategoricalColumn.from_values(col_la) if icol in categorical_icols else typed_column(col_la)
+                        for icol, col_la in enumerate(lol_to_cols(lol, num_cols))], len(lol))
+        
+        
+    def __reduce__(self) -> Tuple[Callable, Tuple]:
+        # arrays are pickled as contiguous buffers; NumPy arrays out-of-band with protocol 5 if a buffer_callback is used.
+        return self.__class__, (self.columns, self.num_rows)
+        
+        
+    def __len__(self) -> int:
+        return self.num_rows
+        
+        
+    def __getitem__(self, idx: Union[int, slice]) -> Any:
+        if isinstance(idx, slice):
+            return self._rows(idx)
+            
+        if idx < 0:
+            idx += self.num_rows
+        if not 0 <= idx < self.num_rows:
+            raise IndexError("ColumnsLol index out of range")
+        return ColumnsRow([getter(idx) for getter in self._getters], self, idx)
+        
+        
+    def __setitem__(self, idx: int, row_la: T_la):
+        if not isinstance(idx, int):
+            raise TypeError("ColumnsLol rows can only be assigned one at a time.")
+        if idx < 0:
+            idx += self.num_rows
+        if not 0 <= idx < self.num_rows:
+            raise IndexError("ColumnsLol assignment index out of range")
+        if len(row_la) != len(self.columns):
+            raise ValueError(f"row has {len(row_la)} values but there are {len(self.columns)} columns.")
+        for icol, val in enumerate(row_la):
+            self.set_value(idx, icol, val)
+        
+        
+    def __iter__(self) -> Iterator[T_la]:
+        # assemble blocks of rows at a time from column slices.
+        for block_start in range(0, self.num_rows, ROW_BLOCK_SIZE):
+            block_lol = self._rows(slice(block_start, min(block_start + ROW_BLOCK_SIZE, self.num_rows)))
+            for irow, row_la in enumerate(block_lol, start=block_start):
+                yield ColumnsRow(row_la, self, irow)
+            
+            
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (list, ColumnsLol)):
+            return len(self) == len(other) and all(row == other_row for row, other_row in zip(self, other))
+        return NotImplemented
+            
+            
+    def _rows(self, row_slice: slice) -> T_lola:
+        if not self.columns:
+            return [[] for _ in range(*row_slice.indices(self.num_rows))]
+        return list(map(list, zip(*[col_to_la(col[row_slice]) for col in self.columns])))
+        
+        
+    def set_value(self, irow: int, icol: int, val: Any):
+        """ assign val to column icol at irow, converting the column to a list if val does not fit. 
+            A read-only NumPy array column is first copied to an array or list.
+        """
+        col = self.columns[icol]
+        if not value_fits(col, val):
+            col = self._set_column(icol, col_to_la(col))
+        elif isinstance(col, np.ndarray) and not col.flags.writeable:
+            col = self._set_column(icol, growable_column(col))
+        try:
+            col[irow] = val
+        except (TypeError, ValueError, OverflowError):
+            col = self._set_column(icol, col_to_la(col))
+            col[irow] = val
+        
+        
+    def append(self, row_la: T_la):
+        """ append a row to the end of all columns. Short rows are padded with ''. """
+        if len(row_la) > len(self.columns):
+            raise ValueError(f"row has {len(row_la)} values but there are {len(self.columns)} columns.")
+            
+        for icol, val in itertools.zip_longest(range(len(self.columns)), row_la, fillvalue=''):
+            col = self.columns[icol]
+            if isinstance(col, np.ndarray):
+                col = self._set_column(icol, growable_column(col))
+            if not value_fits(col, val):
+                col = self._set_column(icol, col_to_la(col))
+            try:
+                col.append(val)
+            except (TypeError, OverflowError):
+                col = self._set_column(icol, col_to_la(col))
+                col.append(val)
+        self.num_rows += 1
+        
+        
+    def extend(self, rows_lol: T_lola):
+        for row_la in rows_lol:
+            self.append(row_la)
+            
+            
+    def _set_column(self, icol: int, col: Any) -> Any:
+        self.columns[icol] = col
+        self._getters[icol] = column_getter(col)
+        return col
+        
+        
+    def col_la(self, icol: int) -> T_la:
+        """ return column icol as a list of Python values. """
+        return col_to_la(self.columns[icol])
+        
+        
+    def col_npa(self, icol: int) -> Optional[Any]:
+        """ return column icol as a NumPy array without copying, or None if it is not stored as an array. 
+            The NumPy array of an array('q') or array('d') column prevents rows from being appended
+            while it exists.
+        """
+        col = self.columns[icol]
+        if isinstance(col, np.ndarray):
+            return col
+        if isinstance(col, array.array) and col.typecode in NP_DTYPE_BY_TYPECODE:
+            return np.frombuffer(col, dtype=NP_DTYPE_BY_TYPECODE[col.typecode])
+        return None
+        
+        
+    def select_columns(self, icols: List[int]) -> 'ColumnsLol':
+        """ return a new ColumnsLol of a copy of the columns icols, in that order. """
+        return self.__class__([copy_column(self.columns[icol]) for icol in icols], self.num_rows)
+        
+        
+    def categorical_col(self, icol: int) -> Optional['CategoricalColumn']:
+        """ return column icol if it is a CategoricalColumn, otherwise None. """
+        col = self.columns[icol]
+        return col if isinstance(col, CategoricalColumn) else None
+        
+        
+    def materialize(self) -> T_lola:
+        """ return all rows as a normal lol. """
+        return self._rows(slice(None))
+        
+        
+class ColumnsRow(list):
+    """ a row of a ColumnsLol. Assigning to an item also assigns to the column. 
+        Rows cannot change length, so methods that would do that raise TypeError.
+    """
+    __slots__ = ('_columns_lol', '_irow')
+    
+    def __init__(self, row_la: T_la, columns_lol: ColumnsLol, irow: int):
+        super().__init__(row_la)
+        self._columns_lol = columns_lol
+        self._irow = irow
+        
+        
+    def __setitem__(self, idx: Union[int, slice], val: Any):
+        if isinstance(idx, slice):
+            icols = range(*idx.indices(len(self)))
+            val = list(val)
+            if len(val) != len(icols):
+                raise TypeError("ColumnsRow length cannot be changed.")
+            for icol, icol_val in zip(icols, val):
+                self._columns_lol.set_value(self._irow, icol, icol_val)
+        else:
+            self._columns_lol.set_value(self._irow, idx, val)
+        super().__setitem__(idx, val)
+        
+        
+    def __reduce__(self) -> Tuple[Callable, Tuple]:
+        return list, (list(self),)
+        
+        
+    def _fixed_length(self, *args, **kwargs):
+        raise TypeError("ColumnsRow length cannot be changed. Use set_layout('rows') first.")
+        
+    append = extend = insert = pop = remove = clear = sort = reverse = __delitem__ = __iadd__ = __imul__ = _fixed_length
+        
+        
+class CategoricalColumn:
+    """ column stored as a code table of distinct values and an array('i') of codes, one per row.
+        Values are assigned codes in order of first appearance. Assigning or appending a value 
+        which is not yet in the code table adds it, so any hashable value can be stored.
+        Counting, grouping and selecting by value work on the codes.
+    """
+    
+    def __init__(self, categories: Optional[T_la]=None, codes: Optional[Any]=None):
+        self.categories: T_la = list(categories or [])
+        self.code_of: Dict[Any, int] = {val: code for code, val in enumerate(self.categories)}
+        self.codes = array.array(CATEGORY_CODE_TYPECODE, codes if codes is not None else [])
+        
+        
+    @classmethod
+    def from_values(cls, col_la: T_la) -> 'CategoricalColumn':
+        """ encode the values in col_la. """
+        cat_col = cls()
+        encode = cat_col.encode
+        cat_col.codes = array.array(CATEGORY_CODE_TYPECODE, [encode(val) for val in col_la])
+        return cat_col
+        
+        
+    def __reduce__(self) -> Tuple[Callable, Tuple]:
+        return self.__class__, (self.categories, self.codes)
+        
+        
+    def __len__(self) -> int:
+        return len(self.codes)
+        
+        
+    def __getitem__(self, idx: Union[int, slice]) -> Any:
+        if isinstance(idx, slice):
+            categories = self.categories
+            return [categories[code] for code in self.codes[idx]]
+        return self.categories[self.codes[idx]]
+        
+        
+    def __setitem__(self, idx: int, val: Any):
+        self.codes[idx] = self.encode(val)
+        
+        
+    def encode(self, val: Any) -> int:
+        """ return the code of val, adding it to the code table if it is new. """
+        code = self.code_of.get(val)
+        if code is None:
+            code = self.code_of[val] = len(self.categories)
+            self.categories.append(val)
+        return code
+        
+        
+    def append(self, val: Any):
+        self.codes.append(self.encode(val))
+        
+        
+    def tolist(self) -> T_la:
+        categories = self.categories
+        return [categories[code] for code in self.codes]
+        
+        
+    def codes_npa(self) -> Any:
+        """ return the codes as a NumPy array without copying. """
+        return np.frombuffer(self.codes, dtype=np.intc) if self.codes else np.zeros(0, dtype=np.intc)
+        
+        
+    def value_counts(self) -> Dict[Any, int]:
+        """ return dict of the count of each value present, in order of the code table. """
+        counts_la = np.bincount(self.codes_npa(), minlength=len(self.categories)).tolist()
+        return {val: count for val, count in zip(self.categories, counts_la) if count}
+        
+        
+    def irows_of(self, val: Any) -> List[int]:
+        """ return the row indexes where the value is val. """
+        code = self.code_of.get(val)
+        if code is None:
+            return []
+        return np.flatnonzero(self.codes_npa() == code).tolist()
+        
+        
+    def irows_by_value(self) -> Dict[Any, List[int]]:
+        """ return dict of the row indexes of each value present, in order of first appearance. """
+        codes_npa = self.codes_npa()
+        if not len(codes_npa):
+            return {}
+        order_npa = np.argsort(codes_npa, kind='stable')
+        _, starts_npa = np.unique(codes_npa[order_npa], return_index=True)
+        irows_npa_list = np.split(order_npa, starts_npa[1:])
+        
+        # the first row index of each group is the smallest, as the sort is stable.
+        irows_npa_list.sort(key=lambda irows_npa: irows_npa[0])
+        return {self.categories[codes_npa[irows_npa[0]]]: irows_npa.tolist() for irows_npa in irows_npa_list}
+        
+        
+def column_getter(col: Any) -> Callable:
+    """ return function which gets a value of col by index, as a Python value. """
+    return col.item if isinstance(col, np.ndarray) else col.__getitem__
+    
+    
+def value_fits(col: Any, val: Any) -> bool:
+    """ return True if val can be stored in col and read back with the same type. """
+    if isinstance(col, array.array):
+        return type(val) is TYPE_BY_TYPECODE.get(col.typecode)
+    if isinstance(col, np.ndarray):
+        return type(val) is TYPE_BY_NP_KIND.get(col.dtype.kind)
+    return True
+    
+    
+def col_to_la(col: Any) -> T_la:
+    """ return a column or column slice as a list of Python values. """
+    return col.tolist() if isinstance(col, (np.ndarray, array.array, CategoricalColumn)) else list(col)
+    
+    
+def copy_column(col: Any) -> Any:
+    """ return a copy of a column which can be modified independently. Read-only NumPy arrays are shared. """
+    if isinstance(col, np.ndarray):
+        return col if not col.flags.writeable else col.copy()
+    if isinstance(col, CategoricalColumn):
+        return CategoricalColumn(col.categories, col.codes)
+    return col[:]
+    
+    
+def typed_column(col_la: T_la) -> Any:
+    """ return col_la as array('q') or array('d') if all values are int or all are float. Otherwise, col_la. """
+    val_types = set(map(type, col_la))
+    typecode = ARRAY_TYPECODE_BY_TYPE.get(next(iter(val_types))) if len(val_types) == 1 else None
+    if typecode:
+        try:
+            return array.array(typecode, col_la)
+        except OverflowError:
+            # ints larger than int64
+            pass
+    return col_la
+    
+    
+def growable_column(col_npa: Any) -> Any:
+    """ return a NumPy array column as an array or list which can be appended to. """
+    typecode = TYPECODE_BY_NP_DTYPE.get(f"{col_npa.dtype.kind}{col_npa.dtype.itemsize}")
+    if typecode:
+        return array.array(typecode, col_npa.tobytes())
+    return col_npa.tolist()
+    
+    
+def lol_to_cols(lol: T_lola, num_cols: int) -> List[T_la]:
+    """ transpose lol to a list of columns. Short rows are padded with ''. """
+    if not lol:
+        return [[] for _ in range(num_cols)]
+    cols_lol = list(map(list, itertools.zip_longest(*lol, fillvalue='')))
+    cols_lol.extend([[''] * len(lol) for _ in range(num_cols - len(cols_lol))])
+    return cols_lol
+    
+    
+def cols_to_lol(cols_lol: List[T_la], num_rows: int) -> T_lola:
+    """ transpose a list of columns back to lol. """
+    if not cols_lol:
+        return [[] for _ in range(num_rows)]
+    return list(map(list, zip(*cols_lol)))
@@ -0,0 +1,542 @@
+# pydf_csv.py
+"""
+
+# Pydf -- Python Dataframes
+
+The Pydf class provides a lightweight, simple and fast alternative to provide
+2-d data arrays with mixed types.
+
+This file handles reading csv files directly from the file system,
+including reading large files in parallel using multiple processes.
+
+"""
+
+"""
+    MIT License
+
+    Copyright (c) 2024 Ray Lutz
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+"""
+
+
+"""
+See README file at this location: https://github.com/raylutz/Pydf/blob/main/README.md
+"""
+
+import io
+import os
+import csv
+import mmap
+import array
+import struct
+import weakref
+import concurrent.futures
+
+import numpy as np
+
+from Pydf.pydf_types import T_ls, T_li, T_la, T_lola, T_da, T_dtype_dict
+
+import Pydf.pydf_utils as utils
+
+from typing import List, Dict, Any, Tuple, Optional, Union, cast, Type, Callable, Iterator #
+def fake_function(a: Optional[List[Dict[str, Tuple[int,Union[Any, str, Type, Callable ]]]]] = None) -> Optional[int]:
+    return None or cast(int, 0)   # pragma: no cover
+
+
+QUOTE_COUNT_BLOCK_SIZE = 16 * 1024 * 1024     # limits memory used when counting quotes in a mapped file.
+ROW_INDEX_BLOCK_SIZE   = 4 * 1024 * 1024      # bytes scanned at a time when building the row offset index.
+ROW_PARSE_BLOCK_SIZE   = 1000                 # rows parsed at a time when iterating a mapped file.
+
+ROW_INDEX_MAGIC        = b'PYDFRIX1'
+ROW_INDEX_HEADER       = struct.Struct('<8sqqqq') # magic, file size, file mtime_ns, offset of first row, number of rows
+
+
+#==== CSV files
+@classmethod
+def _from_csv_file(
+        cls,
+        file_path: str,                         # path to a local csv file.
+        keyfield: str='',                       # field to use as unique key, if not ''
+        dtypes: Optional[T_dtype_dict]=None,    # dictionary of types to apply if set.
+        noheader: bool=False,                   # if True, do not try to initialize columns in header dict.
+        user_format: bool=False,                # if True, preprocess the file and omit comment lines.
+        sep: str=',',                           # field separator.
+        unflatten: bool=True,                   # unflatten fields that are defined as dict or list.
+        include_cols: Optional[T_ls]=None,      # include only the columns specified. noheader must be false.
+        workers: int=1,                         # number of processes used to parse the file.
+        compression: Optional[str]='infer',     # 'gzip', 'bz2', 'xz', None, or 'infer' from file extension.
+        layout: str='rows',                     # 'rows' or 'columns'. See set_layout().
+        ) -> 'Pydf':
+    """
+    Read a local csv (or CSVJ) file into a pydf object.
+
+    If workers > 1, the file is split into byte ranges at record boundaries which are
+    safe even if quoted values contain newlines, and the ranges are parsed, including
+    dtype conversion, in a pool of worker processes. The resulting blocks are concatenated
+    in file order. This is worthwhile for large files on hosts with multiple cores.
+    
+    Otherwise, and always for compressed files, the file is parsed as it is read (and decompressed),
+    so that neither the file contents nor the decompressed text are held in memory.
+    
+    Values of Categorical columns are encoded as they are parsed, so equal values share one object,
+    and with layout='columns', the columns are stored as codes.
+    """
+
+    compression = utils.compression_of_path(file_path, compression)
+
+    if workers <= 1 or compression or not os.path.getsize(file_path):
+        with utils.open_file(file_path, mode='rt', compression=compression) as fp:
+            cols, dtypes, csvj_metadata_da, rows_iter = utils.csv_rows_from_lines(
+                    fp, 
+                    dtypes          = dtypes, 
+                    noheader        = noheader, 
+                    user_format     = user_format, 
+                    sep             = sep,
+                    unflatten       = unflatten,
+                    include_cols    = include_cols,
+                    )
+            data_lol = list(rows_iter)
+            
+        keyfield = keyfield or csvj_metadata_da.get('keyfield', '')
+        
+        # data is already converted, so dtypes are set after init to avoid converting again.
+        my_pydf = cls(lol=data_lol, cols=cols, keyfield=keyfield, name=csvj_metadata_da.get('name', ''))
+        my_pydf.dtypes = dtypes
+
+        return my_pydf.set_layout(layout)
+
+    with open(file_path, mode='rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+
+        # CSVJ header section, if any, provides defaults for dtypes, keyfield and name.
+        # other leading comment lines are skipped only if user_format, as when the file is streamed.
+        csvj_metadata_da, data_start = csvj_header_section(mm, skip_comments=user_format)
+        if csvj_metadata_da:
+            dtypes   = dtypes   or csvj_metadata_da.get('dtypes')
+            keyfield = keyfield or csvj_metadata_da.get('keyfield', '')
+
+        cols: T_ls = []
+        if not noheader:
+            header_end = next_csv_record_boundary(mm, data_start)
+            header_buff = mm[data_start:header_end].decode('utf-8')
+            cols = next(csv.reader(io.StringIO(header_buff), delimiter=sep), [])
+            data_start = header_end
+        elif dtypes:
+            cols = list(dtypes.keys())
+
+        icols: Optional[T_li] = None
+        if include_cols and not noheader:
+            icols = utils.icols_of_cols(cols, include_cols)
+            cols = [cols[icol] for icol in icols]
+
+        boundaries = csv_record_boundaries(mm, workers, start=data_start)
+
+    ranges = [(file_path, boundaries[i], boundaries[i + 1], cols, dtypes, sep, unflatten, icols, user_format)
+                for i in range(len(boundaries) - 1)]
+
+    data_lol: T_lola = []
+    if len(ranges) == 1:
+        data_lol = _parse_csv_byte_range(ranges[0])
+    elif ranges:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            for block_lol in executor.map(_parse_csv_byte_range, ranges):
+                data_lol.extend(block_lol)
+
+    # data is already converted, so dtypes are set after init to avoid converting again.
+    my_pydf = cls(lol=data_lol, cols=cols, keyfield=keyfield, name=csvj_metadata_da.get('name', ''))
+    my_pydf.dtypes = dtypes or {}
+
+    return my_pydf.set_layout(layout)
+
+
+def _parse_csv_byte_range(range_args: Tuple) -> T_lola:
+    """ worker function for _from_csv_file().
+        Parse the bytes from start to end of file_path, which must start and end at record boundaries.
+    """
+
+    file_path, start, end, cols, dtypes, sep, unflatten, icols, user_format = range_args
+
+    with open(file_path, mode='rb') as fp:
+        fp.seek(start)
+        buff = fp.read(end - start).decode('utf-8')
+
+    if user_format:
+        buff = utils.preprocess_csv_buff(buff)
+
+    rows_iter = csv.reader(io.StringIO(buff, newline=''), delimiter=sep, quoting=csv.QUOTE_MINIMAL)
+    if icols is not None:
+        rows_iter = utils.project_rows(rows_iter, icols)
+
+    converters_lot = utils.compile_dtype_converters(cols, dtypes, unflatten=unflatten)
+
+    if not converters_lot:
+        return list(rows_iter)
+    return [utils.convert_row_la(row, converters_lot) for row in rows_iter]
+
+
+def count_quotes(buff: Any, start: int, end: int, quotechar: bytes=b'"') -> int:
+    """ count quotechar in buff[start:end] in blocks so a mapped file is not copied all at once. """
+
+    count = 0
+    for block_start in range(start, end, QUOTE_COUNT_BLOCK_SIZE):
+        count += buff[block_start:min(block_start + QUOTE_COUNT_BLOCK_SIZE, end)].count(quotechar)
+    return count
+
+
+def next_csv_record_boundary(buff: Any, pos: int, quotes: int=0, quotechar: bytes=b'"') -> int:
+    """ return the offset just after the first newline at or after pos that is not within a quoted value,
+        or len(buff) if there is none. quotes is the number of quotechar in the record before pos.
+        Quotes are balanced at the end of each record, because an escaped quote within a quoted value
+        is doubled, so a newline preceded by an odd number of quotes is within a quoted value.
+    """
+
+    buff_len = len(buff)
+    while pos < buff_len:
+        eol = buff.find(b'\n', pos)
+        if eol < 0:
+            return buff_len
+        quotes += count_quotes(buff, pos, eol + 1, quotechar)
+        pos = eol + 1
+        if not quotes % 2:
+            return pos
+    return buff_len
+
+
+def csv_record_boundaries(buff: Any, num_parts: int, start: int=0, quotechar: bytes=b'"') -> T_li:
+    """ return list of offsets splitting buff[start:] into up to num_parts ranges of roughly equal size,
+        each starting and ending at csv record boundaries. The first offset is start and the last is len(buff).
+        buff can be bytes or mmap.
+    """
+
+    buff_len = len(buff)
+    boundaries = [start]
+    pos = start
+    quotes = 0                  # quotes since the last boundary.
+
+    for ipart in range(1, num_parts):
+        target = start + (buff_len - start) * ipart // num_parts
+        if target <= pos:
+            continue
+        quotes += count_quotes(buff, pos, target, quotechar)
+        boundary = next_csv_record_boundary(buff, target, quotes, quotechar)
+        if boundary >= buff_len:
+            break
+        quotes = 0
+        pos = boundary
+        boundaries.append(boundary)
+
+    if boundaries[-1] < buff_len:
+        boundaries.append(buff_len)
+
+    return boundaries
+
+
+def csvj_header_section(buff: Any, skip_comments: bool=False) -> Tuple[T_da, int]:
+    """ return the metadata of the CSVJ header section at the start of buff, or {} if there is none,
+        and the offset just after it, where the csv data starts. Leading comment lines which are 
+        not a CSVJ header section are part of the data unless skip_comments.
+    """
+    comment_end = csv_comment_section_end(buff)
+    csvj_metadata_da, _ = utils.split_csvj_header(buff[0:comment_end])
+    return csvj_metadata_da, comment_end if csvj_metadata_da or skip_comments else 0
+
+
+def csv_comment_section_end(buff: Any) -> int:
+    """ return the offset just after any leading comment lines starting with '#', such as a CSVJ header section. """
+
+    pos = 0
+    buff_len = len(buff)
+    while pos < buff_len and buff[pos:pos + 1] == b'#':
+        eol = buff.find(b'\n', pos)
+        if eol < 0:
+            return buff_len
+        pos = eol + 1
+    return pos
+
+
+#==== memory-mapped CSV files
+@classmethod
+def _open_csv_mmap(
+        cls,
+        file_path: str,                         # path to a local csv file.
+        dtypes: Optional[T_dtype_dict]=None,    # dictionary of types to apply as rows are parsed.
+        noheader: bool=False,                   # if True, do not try to initialize columns in header dict.
+        sep: str=',',                           # field separator.
+        unflatten: bool=True,                   # unflatten fields that are defined as dict or list.
+        save_index: bool=False,                 # if True, save the row offset index next to the file.
+        index_path: Optional[str]=None,         # path of the row offset index. Default is file_path + '.rowidx'
+        ) -> 'Pydf':
+    """
+    Open a local csv (or CSVJ) file as a read-only pydf without parsing it.
+
+    The file is memory-mapped and the offsets of the start of each row are found in one scan
+    (or loaded from a saved index if it matches the file size and modification time).
+    Rows are parsed, and converted per dtypes, only when accessed using my_pydf[irow], 
+    select_irows() or iteration, so a few rows can be examined in a very large file quickly.
+    
+    The lol of the resulting pydf is a CsvMmapLol, which does not support modification, and 
+    writing to its rows raises TypeError. Use my_pydf.set_lol(my_pydf.lol.materialize()) to read 
+    all rows into a normal lol. Blank lines are skipped.
+    keyfield is not supported because building the kd would require parsing every row.
+    
+    The file is released by my_pydf.lol.close(), at the end of a with block on the pydf, 
+    or when the CsvMmapLol is garbage collected:
+    
+        with Pydf.open_csv_mmap(file_path) as my_pydf:
+            row_la = my_pydf.lol[1234]
+    """
+    if index_path is None:
+        index_path = file_path + '.rowidx'
+
+    csv_mmap_lol = CsvMmapLol(file_path, dtypes=dtypes, noheader=noheader, sep=sep, unflatten=unflatten, index_path=index_path)
+    
+    if save_index:
+        csv_mmap_lol.save_index(index_path)
+
+    # dtypes are applied as rows are parsed, so they are set after init to avoid converting here.
+    my_pydf = cls(lol=csv_mmap_lol, cols=csv_mmap_lol.cols, name=csv_mmap_lol.name)
+    my_pydf.dtypes = csv_mmap_lol.dtypes
+
+    return my_pydf
+
+
+class CsvMmapLol:
+    """ read-only list-like sequence of the rows of a memory-mapped csv file.
+        Rows are located using an array('q') of row start offsets and are parsed on access,
+        as CsvMmapRow lists which cannot be modified.
+        
+        The mapping and file are released by close(), on leaving a with block, or when
+        the CsvMmapLol is garbage collected.
+    """
+
+    def __init__(self,
+            file_path: str,
+            dtypes: Optional[T_dtype_dict]=None,
+            noheader: bool=False,
+            sep: str=',',
+            unflatten: bool=True,
+            index_path: Optional[str]=None,
+            ):
+        self.file_path  = file_path
+        self.sep        = sep
+        self.name       = ''
+
+        self._fp = open(file_path, mode='rb')
+        try:
+            self._mm: Any = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped.
+            self._mm = b''
+        self._finalizer = weakref.finalize(self, close_mapped_file, self._mm, self._fp)
+        self.file_size = len(self._mm)
+
+        csvj_metadata_da, data_start = csvj_header_section(self._mm)
+        if csvj_metadata_da:
+            dtypes = dtypes or csvj_metadata_da.get('dtypes')
+            self.name = csvj_metadata_da.get('name', '')
+        
+        self.cols: T_ls = []
+        if not noheader:
+            header_end = next_csv_record_boundary(self._mm, data_start)
+            header_buff = self._mm[data_start:header_end].decode('utf-8')
+            self.cols = next(csv.reader(io.StringIO(header_buff, newline=''), delimiter=sep), [])
+            data_start = header_end
+        elif dtypes:
+            self.cols = list(dtypes.keys())
+            
+        self.dtypes: T_dtype_dict = dtypes or {}
+        self._converters_lot = utils.compile_dtype_converters(self.cols, self.dtypes, unflatten=unflatten)
+        
+        self._data_start = data_start
+        offsets = None
+        if index_path and os.path.exists(index_path):
+            offsets = self._load_index(index_path, data_start)
+        if offsets is None:
+            offsets = csv_row_offsets(self._mm, start=data_start)
+        self.offsets: array.array = offsets
+        
+        
+    def __len__(self) -> int:
+        return len(self.offsets)
+        
+        
+    def __getitem__(self, idx: Union[int, slice]) -> Any:
+        if isinstance(idx, slice):
+            return [CsvMmapRow(self._parse_row(irow)) for irow in range(*idx.indices(len(self.offsets)))]
+            
+        if idx < 0:
+            idx += len(self.offsets)
+        if not 0 <= idx < len(self.offsets):
+            raise IndexError("CsvMmapLol index out of range")
+        return CsvMmapRow(self._parse_row(idx))
+        
+        
+    def __iter__(self) -> Iterator[T_la]:
+        return map(CsvMmapRow, self._iter_rows())
+        
+        
+    def _iter_rows(self) -> Iterator[T_la]:
+        # parse blocks of rows at a time rather than one row at a time.
+        num_rows = len(self.offsets)
+        for block_start in range(0, num_rows, ROW_PARSE_BLOCK_SIZE):
+            block_end = min(block_start + ROW_PARSE_BLOCK_SIZE, num_rows)
+            yield from self._parse_rows(block_start, block_end)
+        
+        
+    def __enter__(self) -> 'CsvMmapLol':
+        return self
+        
+        
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+        
+        
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("CsvMmapLol does not support modification. Use my_pydf.set_lol(my_pydf.lol.materialize()) first.")
+        
+    __setitem__ = __delitem__ = append = extend = insert = _read_only
+        
+        
+    def _row_end(self, irow: int) -> int:
+        return self.offsets[irow + 1] if irow + 1 < len(self.offsets) else self.file_size
+
+
+    def _parse_rows(self, irow_start: int, irow_end: int) -> T_lola:
+        """ parse rows irow_start up to irow_end from the mapped file. """
+        
+        buff = self._mm[self.offsets[irow_start]:self._row_end(irow_end - 1)].decode('utf-8')
+        
+        # blank lines, which are not rows, are at the end of the range of the row before them.
+        rows_lol = [row_la for row_la in csv.reader(io.StringIO(buff, newline=''), delimiter=self.sep, quoting=csv.QUOTE_MINIMAL) if row_la]
+        return utils.convert_lol(rows_lol, self._converters_lot)
+
+
+    def _parse_row(self, irow: int) -> T_la:
+        rows_lol = self._parse_rows(irow, irow + 1)
+        return rows_lol[0] if rows_lol else []
+        
+        
+    def materialize(self) -> T_lola:
+        """ parse all rows and return as a normal lol. """
+        return list(self._iter_rows())
+        
+        
+    def close(self):
+        """ release the mapping and the file. """
+        self._finalizer()
+        
+        
+    def save_index(self, index_path: str):
+        """ save the row offsets so they do not need to be found again when the file is reopened.
+            The file size and modification time are saved so a stale index is not used.
+        """
+        stat = os.stat(self.file_path)
+        with open(index_path, mode='wb') as fp:
+            # the offset where the rows start is saved rather than that of the first row, which may follow blank lines.
+            first_offset = min(self._data_start, self.file_size)
+            fp.write(ROW_INDEX_HEADER.pack(ROW_INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, first_offset, len(self.offsets)))
+            self.offsets.tofile(fp)
+
+
+    def _load_index(self, index_path: str, data_start: int) -> Optional[array.array]:
+        """ return saved row offsets, or None if the index does not match the file. """
+        
+        stat = os.stat(self.file_path)
+        with open(index_path, mode='rb') as fp:
+            header = fp.read(ROW_INDEX_HEADER.size)
+            if len(header) != ROW_INDEX_HEADER.size:
+                return None
+            magic, file_size, mtime_ns, first_offset, num_rows = ROW_INDEX_HEADER.unpack(header)
+            if (magic != ROW_INDEX_MAGIC or file_size != stat.st_size or mtime_ns != stat.st_mtime_ns
+                    or first_offset != min(data_start, file_size)):
+                return None
+            offsets = array.array('q')
+            try:
+                offsets.fromfile(fp, num_rows)
+            except EOFError:
+                return None
+        return offsets
+
+
+class CsvMmapRow(list):
+    """ a row of a CsvMmapLol, which is parsed from the file each time it is accessed, 
+        so modifying it raises TypeError rather than losing the change.
+    """
+    __slots__ = ()
+    
+    def __reduce__(self) -> Tuple[Callable, Tuple]:
+        return list, (list(self),)
+        
+        
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("rows of a CsvMmapLol cannot be modified. Use my_pydf.set_lol(my_pydf.lol.materialize()) first.")
+        
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = append = extend = insert = pop = remove = clear = sort = reverse = _read_only
+    
+    
+def close_mapped_file(mm: Any, fp: Any) -> None:
+    """ close the mapping mm, if the file was mapped, and the file fp. """
+    if isinstance(mm, mmap.mmap):
+        mm.close()
+    fp.close()
+
+
+def csv_row_offsets(buff: Any, start: int=0, quotechar: bytes=b'"') -> array.array:
+    """ return array('q') of the offsets of the start of each csv record in buff[start:].
+        Newlines within quoted values are not record boundaries, and blank lines are not records. 
+        The scan is vectorized using numpy, a block at a time, carrying the quote parity from 
+        block to block.
+    """
+
+    offsets = array.array('q')
+    buff_len = len(buff)
+    if start >= buff_len:
+        return offsets
+        
+    offsets.append(start)
+    quote_ord = ord(quotechar)
+    parity = 0
+    
+    for block_start in range(start, buff_len, ROW_INDEX_BLOCK_SIZE):
+        block_npa = np.frombuffer(buff[block_start:block_start + ROW_INDEX_BLOCK_SIZE], dtype=np.uint8)
+        
+        # parity of the number of quotes up to and including each byte.
+        parity_npa = np.bitwise_xor.accumulate((block_npa == quote_ord).view(np.uint8)) ^ parity
+        
+        eol_npa = np.flatnonzero((block_npa == 10) & (parity_npa == 0))
+        offsets.frombytes((eol_npa + (block_start + 1)).astype(np.int64).tobytes())
+        parity = int(parity_npa[-1])
+        
+    if offsets[-1] >= buff_len:
+        # the file ends with a newline.
+        offsets.pop()
+        
+    # a blank line is a record which is only '\n' or '\r\n'.
+    starts_npa = np.frombuffer(offsets, dtype=np.int64)
+    lengths_npa = np.diff(starts_npa, append=buff_len)
+    buff_npa = np.frombuffer(buff, dtype=np.uint8)
+    first_npa = buff_npa[starts_npa]
+    second_npa = buff_npa[np.minimum(starts_npa + 1, buff_len - 1)]
+    blank_npa = ((lengths_npa == 1) & (first_npa == 10)) | ((lengths_npa == 2) & (first_npa == 13) & (second_npa == 10))
+    if blank_npa.any():
+        kept_offsets = array.array('q')
+        kept_offsets.frombytes(starts_npa[~blank_npa].tobytes())
+        offsets = kept_offsets
+        
+    return offsets
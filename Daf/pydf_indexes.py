@@ -0,0 +1,239 @@
+# pydf_indexes.py
+"""
+
+# Pydf -- Python Dataframes
+
+The Pydf class provides a lightweight, simple and fast alternative to provide
+2-d data arrays with mixed types.
+
+This file provides a sorted secondary index of a column, which finds the rows 
+with values in a range using bisect. This is used by create_index(kind='sorted')
+and select_by_range().
+
+"""
+
+"""
+    MIT License
+
+    Copyright (c) 2024 Ray Lutz
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+"""
+
+
+"""
+See README file at this location: https://github.com/raylutz/Pydf/blob/main/README.md
+"""
+
+import bisect
+
+from Pydf.pydf_types import T_la, T_li
+
+from typing import List, Dict, Any, Tuple, Optional, Union, cast, Type, Callable #
+def fake_function(a: Optional[List[Dict[str, Tuple[int,Union[Any, str, Type, Callable ]]]]] = None) -> Optional[int]:
+    return None or cast(int, 0)   # pragma: no cover
+
+
+DELTA_MERGE_MIN = 256       # the delta run is merged into the main arrays when longer than this,
+                            #   or than 1/16 of the main arrays.
+
+
+class SortedIndex:
+    """ sorted secondary index of one column. The values of the column are kept in sorted order 
+        in keys, with the row index of each in irows, so the rows with values in a range are 
+        found with bisect in O(log n + k). Rows with equal values are in row order.
+        
+        Entries added after the index is built, as when rows are appended, go into a small 
+        sorted delta run, which is merged into the main arrays when it grows, so appending does 
+        not move the main arrays each time.
+        
+        Values which cannot be compared with the others, like the null value '' in a column of 
+        numbers, are kept apart in unordered, by row index. They are found by get() but are never 
+        in a range. A SortedIndex created without col_la is not built, and is used to mark a 
+        sorted index which is out of date.
+    """
+    
+    def __init__(self, col_la: Optional[T_la]=None):
+        self.keys: Optional[T_la] = None
+        self.irows: T_li = []
+        self.delta_keys: T_la = []
+        self.delta_irows: T_li = []
+        self.unordered: Dict[int, Any] = {}     # {irow: value} of values which are not comparable.
+        
+        if col_la is not None:
+            self.build(col_la)
+            
+            
+    def __len__(self) -> int:
+        return len(self.keys or []) + len(self.delta_keys) + len(self.unordered)
+        
+        
+    def __repr__(self) -> str:
+        return f"SortedIndex({len(self)} entries)" if self.is_built() else "SortedIndex(not built)"
+        
+        
+    def is_built(self) -> bool:
+        return self.keys is not None
+        
+        
+    def build(self, col_la: T_la) -> None:
+        """ build the index from all values of the column. """
+        col_la = list(col_la)
+        
+        self.unordered = {}
+        
+        # the sort is stable, so rows with equal values stay in row order.
+        try:
+            self.irows = sorted(range(len(col_la)), key=col_la.__getitem__)
+        except TypeError:
+            # set apart the nulls and the values which are not comparable with the first other value.
+            ref = next((val for val in col_la if not _is_null(val)), None)
+            for irow, val in enumerate(col_la):
+                if _is_null(val) or not _is_comparable(val, ref):
+                    self.unordered[irow] = val
+            self.irows = sorted((irow for irow in range(len(col_la)) if irow not in self.unordered), key=col_la.__getitem__)
+            
+        self.keys  = [col_la[irow] for irow in self.irows]
+        self.delta_keys = []
+        self.delta_irows = []
+        
+        
+    def add(self, key: Any, irow: int) -> None:
+        """ add an entry for key at row irow to the delta run, merging it if it is too long. 
+            If key is not comparable with the values in the index, it is added to unordered.
+        """
+        ref = self.keys[0] if self.keys else self.delta_keys[0] if self.delta_keys else None
+        if _is_null(key) if ref is None else not _is_comparable(key, ref):
+            self.unordered[irow] = key
+            return
+            
+        pos = _entry_position(self.delta_keys, self.delta_irows, key, irow)
+        self.delta_keys.insert(pos, key)
+        self.delta_irows.insert(pos, irow)
+        
+        if len(self.delta_keys) > max(DELTA_MERGE_MIN, len(self.keys or []) // 16):
+            self.merge_delta()
+            
+            
+    def remove(self, key: Any, irow: int) -> None:
+        """ remove the entry for key at row irow. """
+        if irow in self.unordered and self.unordered[irow] == key:
+            del self.unordered[irow]
+            return
+            
+        for keys, irows in ((self.keys or [], self.irows), (self.delta_keys, self.delta_irows)):
+            pos = _entry_position(keys, irows, key, irow)
+            if pos < len(keys) and irows[pos] == irow and keys[pos] == key:
+                del keys[pos]
+                del irows[pos]
+                return
+                
+                
+    def merge_delta(self) -> None:
+        """ merge the delta run into the main arrays. """
+        if not self.delta_keys:
+            return
+            
+        # both parts are sorted runs, which sorted() merges in linear time.
+        entries = sorted(zip((self.keys or []) + self.delta_keys, self.irows + self.delta_irows))
+        self.keys  = [key for key, _ in entries]
+        self.irows = [irow for _, irow in entries]
+        self.delta_keys = []
+        self.delta_irows = []
+        
+        
+    def range_irows(self, start: Any=None, stop: Any=None, include_stop: bool=False) -> T_li:
+        """ return the row indexes, in row order, of the values from start up to stop, 
+            which is included only if include_stop. start or stop of None is not limited.
+            Values which cannot be compared with start and stop are not included, as for 
+            select_by_range() without an index.
+        """
+        try:
+            irows_li = self._ordered_range_irows(start, stop, include_stop)
+        except TypeError:
+            # start or stop is not comparable with the ordered values.
+            irows_li = []
+        irows_li.extend(irow for irow, val in self.unordered.items() if value_in_range(val, start, stop, include_stop))
+            
+        # ranges of values are often ranges of rows, as when rows are appended in order, so this sort is fast.
+        irows_li.sort()
+        return irows_li
+        
+        
+    def _ordered_range_irows(self, start: Any=None, stop: Any=None, include_stop: bool=False) -> T_li:
+        """ return the row indexes, not in row order, of the ordered values from start up to stop. """
+        irows_li: T_li = []
+        for keys, irows in ((self.keys or [], self.irows), (self.delta_keys, self.delta_irows)):
+            lo = 0 if start is None else bisect.bisect_left(keys, start)
+            if stop is None:
+                hi = len(keys)
+            elif include_stop:
+                hi = bisect.bisect_right(keys, stop, lo)
+            else:
+                hi = bisect.bisect_left(keys, stop, lo)
+            irows_li.extend(irows[lo:hi])
+        return irows_li
+        
+        
+    def get(self, key: Any, default: Optional[T_li]=None) -> Optional[T_li]:
+        """ return the row indexes of the rows with value key, or default if none,
+            like the dict used for a hash index.
+        """
+        try:
+            irows = self._ordered_range_irows(key, key, include_stop=True)
+        except TypeError:
+            # key is not comparable with the values in the column.
+            irows = []
+        irows.extend(irow for irow, val in self.unordered.items() if val == key)
+        irows.sort()
+        return irows or default
+        
+        
+def value_in_range(val: Any, start: Any=None, stop: Any=None, include_stop: bool=False) -> bool:
+    """ return True if start <= val < stop, or val <= stop if include_stop, 
+        and False if val cannot be compared with start or stop. start or stop of None is not limited.
+    """
+    try:
+        return ((start is None or start <= val) 
+                    and (stop is None or val < stop or include_stop and val == stop))
+    except TypeError:
+        return False
+        
+        
+def _is_null(val: Any) -> bool:
+    return val is None or (isinstance(val, str) and val == '')
+    
+    
+def _is_comparable(val: Any, ref: Any) -> bool:
+    """ return True if val can be ordered with ref, or if ref is None. """
+    if ref is None:
+        return True
+    try:
+        val < ref
+        ref < val
+    except TypeError:
+        return False
+    return True
+        
+        
+def _entry_position(keys: T_la, irows: T_li, key: Any, irow: int) -> int:
+    """ return the position in sorted keys and irows of the entry key, irow, or where to insert it. """
+    lo = bisect.bisect_left(keys, key)
+    hi = bisect.bisect_right(keys, key, lo)
+    return bisect.bisect_left(irows, irow, lo, hi)
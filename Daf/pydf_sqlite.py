@@ -0,0 +1,210 @@
+# pydf_sqlite.py
+"""
+
+# Pydf -- Python Dataframes
+
+The Pydf class provides a lightweight, simple and fast alternative to provide
+2-d data arrays with mixed types.
+
+This file handles writing pydf arrays to SQLite tables and reading
+query results into pydf arrays, in batches of rows.
+
+"""
+
+"""
+    MIT License
+
+    Copyright (c) 2024 Ray Lutz
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+"""
+
+
+"""
+See README file at this location: https://github.com/raylutz/Pydf/blob/main/README.md
+"""
+
+import sqlite3
+
+from Pydf.pydf_columns import Categorical
+from Pydf.pydf_types import T_ls, T_li, T_la, T_lola, T_dtype_dict
+
+import Pydf.pydf_utils as utils
+
+from typing import List, Dict, Any, Tuple, Optional, Union, cast, Type, Callable, Iterator #
+def fake_function(a: Optional[List[Dict[str, Tuple[int,Union[Any, str, Type, Callable ]]]]] = None) -> Optional[int]:
+    return None or cast(int, 0)   # pragma: no cover
+
+
+# SQLite column affinity used for each dtype. list and dict values are stored as JSON text.
+SQLITE_AFFINITY_BY_DTYPE: Dict[Type, str] = {int: 'INTEGER', float: 'REAL', bool: 'INTEGER', str: 'TEXT', list: 'TEXT', dict: 'TEXT',
+                                                Categorical: 'TEXT'}
+
+
+def quote_identifier(name: str) -> str:
+    """ quote a table or column name for use in SQL. """
+    return '"' + str(name).replace('"', '""') + '"'
+    
+
+def _to_sqlite(
+        self,
+        conn: sqlite3.Connection,
+        table: str,
+        batch_size: int=10000,                  # number of rows inserted by each executemany()
+        if_exists: str='fail',                  # 'fail', 'replace' or 'append' if the table exists.
+        index_keyfield: bool=True,              # create an index on keyfield, if it is set.
+        ) -> int:
+    """ write the pydf array to SQLite table, creating it with column affinities derived from dtypes.
+        Rows are inserted in batches with executemany() inside one transaction, which is rolled back 
+        on error. '' values in INTEGER and REAL columns are written as NULL, and list and dict 
+        columns are written as JSON. Returns the number of rows written.
+    """
+    if if_exists not in ('fail', 'replace', 'append'):
+        raise ValueError(f"if_exists must be 'fail', 'replace' or 'append', not '{if_exists}'")
+        
+    cols = self.columns()
+    if not cols:
+        raise ValueError("Column names are required to write to SQLite.")
+        
+    affinities_ls = [SQLITE_AFFINITY_BY_DTYPE.get(self.dtypes.get(col), '') for col in cols]
+    null_icols  = [icol for icol, affinity in enumerate(affinities_ls) if affinity in ('INTEGER', 'REAL')]
+    flatten_icols = [icol for icol, col in enumerate(cols) if self.dtypes.get(col) in (list, dict)]
+    
+    quoted_table = quote_identifier(table)
+    col_defs_ls = [f"{quote_identifier(col)} {affinity}".rstrip() for col, affinity in zip(cols, affinities_ls)]
+    insert_sql = f"INSERT INTO {quoted_table} VALUES ({', '.join(['?'] * len(cols))})"
+    
+    with conn:
+        # the sqlite3 module only begins a transaction before DML, so it is begun here, 
+        # to also roll back dropping and creating the table.
+        if not conn.in_transaction:
+            conn.execute('BEGIN')
+        if if_exists == 'replace':
+            conn.execute(f"DROP TABLE IF EXISTS {quoted_table}")
+        if_not_exists = 'IF NOT EXISTS ' if if_exists == 'append' else ''
+        conn.execute(f"CREATE TABLE {if_not_exists}{quoted_table} ({', '.join(col_defs_ls)})")
+        
+        for start in range(0, len(self.lol), batch_size):
+            batch_lol = self.lol[start:start + batch_size]
+            if null_icols or flatten_icols:
+                batch_lol = [sqlite_row_la(row_la, null_icols, flatten_icols) for row_la in batch_lol]
+            conn.executemany(insert_sql, batch_lol)
+            
+        # the index is built after the rows are inserted, which is faster than updating it for each row.
+        # a composite keyfield is indexed on all its columns.
+        keycols = self._keycols()
+        if index_keyfield and keycols and all(col in self.hd for col in keycols):
+            index_name = quote_identifier(f"{table}_{'_'.join(keycols)}_idx")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {quoted_table} ({', '.join(map(quote_identifier, keycols))})")
+            
+    return len(self.lol)
+    
+    
+def sqlite_row_la(row_la: T_la, null_icols: T_li, flatten_icols: T_li) -> T_la:
+    """ return a copy of row_la with '' at null_icols as None and values at flatten_icols as JSON. """
+    row_la = utils.flatten_row_la(row_la, flatten_icols)
+    for icol in null_icols:
+        if row_la[icol] == '':
+            row_la[icol] = None
+    return row_la
+    
+
+@classmethod
+def _iter_sqlite(
+        cls,
+        conn: sqlite3.Connection,
+        query: str,
+        params: Union[tuple, dict]=(),          # parameters for placeholders in query.
+        chunk_size: int=10000,                  # maximum number of rows in each Pydf chunk.
+        keyfield: str='',                       # field to use as unique key, if not ''
+        dtypes: Optional[T_dtype_dict]=None,    # bool, list and dict columns are converted.
+        ) -> Iterator['Pydf']:
+    """ run query and yield Pydf instances of no more than chunk_size rows, fetched with fetchmany().
+        Column names are taken from the cursor description. NULL values are returned as ''.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+
+    cursor = conn.execute(query, params)
+    try:
+        cols = [col_desc[0] for col_desc in cursor.description or []]
+        converters_lot = sqlite_converters(cols, dtypes)
+        
+        while True:
+            rows_lot = cursor.fetchmany(chunk_size)
+            if not rows_lot:
+                break
+            chunk_pydf = cls(lol=sqlite_rows_to_lol(rows_lot, converters_lot), cols=cols, keyfield=keyfield)
+            chunk_pydf.dtypes = dtypes or {}
+            yield chunk_pydf
+    finally:
+        cursor.close()
+        
+        
+@classmethod
+def _from_sqlite(
+        cls,
+        conn: sqlite3.Connection,
+        query: str,
+        params: Union[tuple, dict]=(),          # parameters for placeholders in query.
+        chunk_size: int=10000,                  # number of rows fetched at a time.
+        keyfield: str='',                       # field to use as unique key, if not ''
+        dtypes: Optional[T_dtype_dict]=None,    # bool, list and dict columns are converted.
+        ) -> 'Pydf':
+    """ run query and return the result as a pydf. Rows are fetched with fetchmany() and each
+        batch is converted directly into rows of lol, so no lod or full list of tuples is created. 
+        Column names are taken from the cursor description. NULL values are returned as ''.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+
+    cursor = conn.execute(query, params)
+    try:
+        cols = [col_desc[0] for col_desc in cursor.description or []]
+        converters_lot = sqlite_converters(cols, dtypes)
+        
+        data_lol: T_lola = []
+        while True:
+            rows_lot = cursor.fetchmany(chunk_size)
+            if not rows_lot:
+                break
+            data_lol.extend(sqlite_rows_to_lol(rows_lot, converters_lot))
+    finally:
+        cursor.close()
+        
+    my_pydf = cls(lol=data_lol, cols=cols, keyfield=keyfield)
+    my_pydf.dtypes = dtypes or {}
+    
+    return my_pydf
+    
+    
+def sqlite_converters(cols: T_ls, dtypes: Optional[T_dtype_dict]) -> List[Tuple[int, Callable[[Any], Any]]]:
+    """ return converters for values returned by SQLite, which are already int, float or str,
+        so only bool, list and dict columns are converted.
+    """
+    if not dtypes:
+        return []
+    converting_dtypes = {col: dtype for col, dtype in dtypes.items() if dtype in (bool, list, dict)}
+    return utils.compile_dtype_converters(cols, converting_dtypes, unflatten=True)
+    
+
+def sqlite_rows_to_lol(rows_lot: List[tuple], converters_lot: List[Tuple[int, Callable[[Any], Any]]]) -> T_lola:
+    """ convert a batch of row tuples from fetchmany() to lol, with NULL as ''. """
+    lol = [['' if val is None else val for val in row_ta] if None in row_ta else list(row_ta) for row_ta in rows_lot]
+    return utils.convert_lol(lol, converters_lot)
@@ -13,17 +13,22 @@ import datetime
 import statistics
 import ast
 import platform
+import itertools
+import gzip
+import bz2
+import lzma
 
 import xlsx2csv     # type: ignore
 #import numpy as np
 
 
-from typing import List, Dict, Any, Tuple, Optional, Union, cast, Type #, Callable
+from typing import List, Dict, Any, Tuple, Optional, Union, cast, Type, Iterable, Iterator, Callable
 
 def fake_function(a: Optional[List[Dict[str, Tuple[int,Union[Any, str]]]]] = None) -> Optional[int]:
     return None or cast(int, 0)       # pragma: no cover
 
 
+from Pydf.pydf_columns import Categorical
 from Pydf.pydf_types import T_lola, T_loda, T_dtype_dict, T_da, T_ds, T_hdlola, T_la, T_loti, T_ls, T_doda, T_buff, T_li
                     # T_lols, T_loloda, T_lodoloda, T_dtype, T_num, T_lods, T_lodf, 
                     # T_doloda, T_dodf, T_dola, 
@@ -379,14 +384,195 @@ def set_dict_dtypes(d: T_da, dtype_dict: T_dtype_dict) -> T_da:
             continue
         elif dtype_dict[k] == dict:
             continue
+        elif dtype_dict[k] == Categorical:
+            continue
         else:
             import pdb; pdb.set_trace() #perm
             error_beep()
 
             pass
-                 
+
     return d2
+
+
+# converters used by compile_dtype_converters().
+# Each accepts a str value as read from a text file and follows the rules of set_dict_dtypes().
+
+def str_to_int(val: str) -> Union[int, str]:
+    if val == '':
+        return ''                   # null string means None or NAN
+    try:
+        return int(val)
+    except ValueError:
+        pass
+    try:
+        return int(float(val))
+    except (ValueError, OverflowError):
+        return ''
+
+
+def str_to_float(val: str) -> Union[float, str]:
+    if val == '':
+        return ''                   # null string means None or NAN
+    try:
+        return float(val)
+    except ValueError:
+        return ''
+
+
+def shared_value_converter() -> Callable[[Any], Any]:
+    """ return a converter which returns the first equal value seen, so that equal values 
+        of a column share one object. The dict of values seen is the code table of the column.
+    """
+    values_seen: T_da = {}
+    setdefault = values_seen.setdefault
+    return lambda val: setdefault(val, val)
+
+
+def unflatten_val(val: Any) -> Any:
+    """ convert val to list or dict (or tuple) if it appears to be stringified,
+        either as JSON or using f"{}" functionality. Otherwise return val unchanged.
+    """
+    if val and isinstance(val, str) and (val[0], val[-1]) in [('[', ']'), ('{', '}'), ('(', ')')]:
+        try:
+            return json.loads(val)
+        except ValueError:
+            return safe_eval(val)
+    return val
+
+
+def compile_dtype_converters(
+        cols: T_ls,
+        dtypes: Optional[T_dtype_dict],
+        unflatten: bool=True,
+        ) -> List[Tuple[int, Callable[[Any], Any]]]:
+    """ given the column names in order and a dtypes dict, return list of (icol, converter)
+        for only those columns which require conversion from str, in icol order.
+
+        This is done once per file, so that values can be converted as each row is parsed
+        without building a dict per row. Columns with str dtype or not mentioned in dtypes
+        are left alone, as are list and dict columns unless unflatten is True.
+        Values of Categorical columns are not converted, but equal values share one object.
+    """
+
+    if not dtypes or not cols:
+        return []
+
+    converters_lot: List[Tuple[int, Callable[[Any], Any]]] = []
+
+    for icol, col in enumerate(cols):
+        dtype = dtypes.get(col, str)
+
+        if dtype == int:
+            converter = str_to_int
+        elif dtype == float:
+            converter = str_to_float
+        elif dtype == bool:
+            converter = str2bool
+        elif dtype in (list, dict) and unflatten:
+            converter = unflatten_val
+        elif dtype == Categorical:
+            converter = shared_value_converter()
+        else:
+            continue
+        converters_lot.append( (icol, converter) )
+
+    return converters_lot
+
+
+def convert_row_la(row_la: T_la, converters_lot: List[Tuple[int, Callable[[Any], Any]]]) -> T_la:
+    """ apply converters_lot from compile_dtype_converters() to row_la in place.
+        Rows which are short are converted only as far as they go.
+    """
+    try:
+        for icol, converter in converters_lot:
+            row_la[icol] = converter(row_la[icol])
+    except IndexError:
+        # converters are in icol order, so no other values exist.
+        pass
+    return row_la
+
+
+def convert_lol(lol: T_lola, converters_lot: List[Tuple[int, Callable[[Any], Any]]]) -> T_lola:
+    """ apply converters_lot from compile_dtype_converters() to all rows in lol, in place. """
+
+    if converters_lot:
+        for row_la in lol:
+            convert_row_la(row_la, converters_lot)
+    return lol
+
+
+def repetitive_str_icols(lol: T_lola, sample_size: int=100) -> T_li:
+    """ return the indexes of columns in which the values of the first sample_size rows are all str 
+        and at least half are repeats.
+    """
+    sample_lol = lol[:sample_size]
+    if not sample_lol:
+        return []
+        
+    icols = []
+    for icol in range(len(sample_lol[0])):
+        sample_la = [row[icol] for row in sample_lol if icol < len(row)]
+        if all(type(val) is str for val in sample_la) and len(set(sample_la)) <= len(sample_la) // 2:
+            icols.append(icol)
+    return icols
+    
+
+def dedupe_strs_in_lol(lol: T_lola, icols: Optional[T_li]=None) -> T_lola:
+    """ return a copy of lol where equal str values in columns icols are the same object.
+        If icols is None, columns are chosen by repetitive_str_icols().
+        lol is returned unchanged if there are no such columns. Rows are copied, so lol is not modified.
+    """
+    if icols is None:
+        icols = repetitive_str_icols(lol)
+    if not icols:
+        return lol
         
+    unique_ds: T_ds = {}
+    setdefault = unique_ds.setdefault
+    deduped_lol = []
+    for row_la in lol:
+        row_la = row_la.copy()
+        for icol in icols:
+            try:
+                val = row_la[icol]
+                row_la[icol] = setdefault(val, val)
+            except (IndexError, TypeError):
+                # short rows, or unhashable values.
+                pass
+        deduped_lol.append(row_la)
+    return deduped_lol
+
+
+def intern_icols(cols: T_ls, intern: Union[bool, T_ls]) -> Optional[T_li]:
+    """ return the indexes of the columns to intern: None meaning all columns if intern is True,
+        or the columns named in intern.
+    """
+    if intern is True:
+        return None
+    return icols_of_cols(cols, intern or [])
+
+
+def intern_rows(
+        rows_iter: Iterable[T_la], 
+        icols: Optional[T_li]=None,     # columns to intern, or None for all columns.
+        intern_ds: Optional[T_ds]=None, # intern table, if values should be shared with a prior load.
+        ) -> Iterator[T_la]:
+    """ yield each row with the str values in columns icols replaced, in place, by the first equal 
+        str seen, so that equal values share one object. The intern table lasts only as long as the
+        load unless intern_ds is provided, so values are not kept alive longer than the data.
+    """
+    if intern_ds is None:
+        intern_ds = {}
+    setdefault = intern_ds.setdefault
+    
+    for row_la in rows_iter:
+        for icol in (range(len(row_la)) if icols is None else icols):
+            if icol < len(row_la) and type(row_la[icol]) is str:
+                row_la[icol] = setdefault(row_la[icol], row_la[icol])
+        yield row_la
+
+
 def list_stats(alist:T_la, profile:str) -> T_da:
     """ 
         given a list as a column of a table and analyze that given column and provide stats relevant for that column
@@ -1059,6 +1245,82 @@ def prog_loc() -> str:
     return f"[{filename}:{linenumber}]"
     
     
+# CSVJ
+# A CSVJ file is a csv file preceded by one or more comment lines starting with '#' which together
+# contain a JSON object with the key "csvj". For example:
+#
+#   #{"csvj": 1, "name": "", "keyfield": "ID", "dtypes": {"ID": "int", "Tags": "list"}, "flattened_cols": ["Tags"], "num_rows": 2, "num_cols": 2}
+#   ID,Tags
+#   1,"[1, 2]"
+#   2,[]
+#
+# dtypes are provided by name so they can be applied as the file is parsed.
+
+CSVJ_VERSION = 1
+
+DTYPES_BY_NAME: Dict[str, Type] = {'int': int, 'float': float, 'str': str, 'bool': bool, 'list': list, 'dict': dict,
+                                    'Categorical': Categorical}
+
+
+def dtypes_to_names(dtypes: T_dtype_dict) -> T_ds:
+    """ convert dtypes dict to a dict of type names, suitable for JSON. """
+    return {col: getattr(dtype, '__name__', 'str') for col, dtype in dtypes.items()}
+    
+    
+def names_to_dtypes(dtype_names: T_ds) -> T_dtype_dict:
+    """ convert a dict of type names back to dtypes. Unknown names are treated as str. """
+    return {col: DTYPES_BY_NAME.get(name, str) for col, name in dtype_names.items()}
+    
+
+def make_csvj_header(metadata_da: T_da, line_terminator: str='\r\n') -> str:
+    """ return the CSVJ comment line which carries metadata_da. """
+    
+    return '#' + json_encode({'csvj': CSVJ_VERSION, **metadata_da}) + line_terminator
+
+
+def flatten_row_la(row_la: T_la, icols: T_li) -> T_la:
+    """ return a copy of row_la with values at icols encoded as JSON. Short rows are left short. """
+    
+    flat_la = list(row_la)
+    for icol in icols:
+        if icol < len(flat_la) and not isinstance(flat_la[icol], str):
+            flat_la[icol] = json_encode(flat_la[icol])
+    return flat_la
+    
+
+def split_csvj_header(buff: Union[bytes, str]) -> Tuple[T_da, str]:
+    """ if buff starts with a CSVJ header section, return the metadata dict and the remainder of buff.
+        Otherwise, return {} and buff unchanged. The dtypes in metadata, if any, are converted to types.
+    """
+    if isinstance(buff, bytes):
+        buff = buff.decode("utf-8")
+        
+    if not buff.startswith('#'):
+        return {}, buff
+        
+    json_parts: T_ls = []
+    pos = 0
+    while pos < len(buff) and buff[pos] == '#':
+        eol = buff.find('\n', pos)
+        if eol < 0:
+            eol = len(buff) - 1
+        json_parts.append(buff[pos + 1:eol + 1])
+        pos = eol + 1
+
+    try:
+        metadata_da = json.loads(''.join(json_parts))
+    except ValueError:
+        return {}, buff
+        
+    if not isinstance(metadata_da, dict) or 'csvj' not in metadata_da:
+        return {}, buff
+        
+    if metadata_da.get('dtypes'):
+        metadata_da['dtypes'] = names_to_dtypes(metadata_da['dtypes'])
+    
+    return metadata_da, buff[pos:]
+    
+
 def buff_csv_to_lol(
         buff: Union[bytes, str], 
         user_format: bool=False, 
@@ -1066,6 +1328,9 @@ def buff_csv_to_lol(
         include_cols: Optional[T_ls]=None, 
         dtypes: Optional[T_dtype_dict]=None,
         raw: bool=False,
+        noheader: bool=False,
+        unflatten: bool=True,
+        intern: Union[bool, T_ls]=False,
         ) -> T_lola:
     """
     Convert CSV data in a buffer (bytes or string) to a lol data type.
@@ -1074,6 +1339,16 @@ def buff_csv_to_lol(
         buff (Union[bytes, str]): The CSV data as bytes or string.
         user_format (bool): Whether to preprocess the CSV data (remove comments and blank lines).
         sep (str): The separator used in the CSV data.
+        dtypes: if provided, values are converted to these types as each row is parsed.
+            The header row (unless noheader) is left as str. If noheader, dtypes.keys()
+            defines the column names.
+        include_cols: if provided, only these columns are kept, in this order, and dtypes
+            are applied only to them. Ignored if noheader.
+        raw: if False, a CSVJ header section is removed and its dtypes are used if dtypes is not provided.
+        noheader: the first row is data rather than column names.
+        unflatten: convert list and dict columns (per dtypes) in the same pass.
+        intern: if True, or a list of column names, equal str values in those columns are 
+            the same object, as they are parsed. The header row is not interned.
 
     Returns:
         lola: all lines in the file as lol. May be ragged.
@@ -1086,8 +1361,10 @@ def buff_csv_to_lol(
         buff = buff.decode("utf-8")
         
     if not raw:
-        # @@TODO grab the first few lines and get the header section.
-        pass
+        # if this is CSVJ, remove the header section and use its dtypes unless dtypes are provided.
+        csvj_metadata_da, buff = split_csvj_header(buff)
+        if not dtypes:
+            dtypes = csvj_metadata_da.get('dtypes')
     
         
     if user_format:
@@ -1096,11 +1373,71 @@ def buff_csv_to_lol(
     sio = io.StringIO(buff)
     csv_reader = csv.reader(sio, delimiter=sep, quoting=csv.QUOTE_MINIMAL)
 
-    data_lol = [row for row in csv_reader]
+    if noheader:
+        include_cols = None         # columns can only be selected by name using the header.
+
+    if not dtypes and not include_cols and not intern:
+        return [row for row in csv_reader]
+        
+    rows_iter: Iterator[T_la] = csv_reader
+    data_lol: T_lola = []
+    if noheader:
+        cols = list(dtypes.keys()) if dtypes else []
+    else:
+        cols = next(csv_reader, [])
+        if include_cols:
+            # resolve the header once and keep only the selected columns, in the requested order.
+            icols = icols_of_cols(cols, include_cols)
+            cols = [cols[icol] for icol in icols]
+            rows_iter = project_rows(csv_reader, icols)
+        data_lol.append(cols)
+        
+    converters_lot = compile_dtype_converters(cols, dtypes, unflatten=unflatten)
+    
+    if converters_lot:
+        rows_iter = (convert_row_la(row, converters_lot) for row in rows_iter)
+        
+    if intern:
+        # values are interned after conversion, so only those which remain str are in the table.
+        rows_iter = intern_rows(rows_iter, intern_icols(cols, intern))
+    
+    data_lol.extend(rows_iter)
 
     return data_lol
     
 
+def icols_of_cols(cols: T_ls, include_cols: T_ls) -> T_li:
+    """ return the column positions in cols of include_cols, in the order given by include_cols.
+        Names in include_cols not found in cols are ignored.
+    """
+    hd = {col: icol for icol, col in enumerate(cols)}
+    return [hd[col] for col in include_cols if col in hd]
+
+
+def project_rows(rows_iter: Iterable[T_la], icols: T_li) -> Iterator[T_la]:
+    """ yield a new list from each row with only the values at positions icols.
+        Values missing from short rows are ''.
+    """
+    if not icols:
+        for _row in rows_iter:
+            yield []
+        return
+
+    if len(icols) == 1:
+        # itemgetter with one position returns the value rather than a tuple.
+        icol = icols[0]
+        for row in rows_iter:
+            yield [row[icol] if icol < len(row) else '']
+        return
+
+    getter = operator.itemgetter(*icols)
+    for row in rows_iter:
+        try:
+            yield list(getter(row))
+        except IndexError:
+            yield [row[icol] if icol < len(row) else '' for icol in icols]
+    
+
 def preprocess_csv_buff(buff: Union[bytes, str]) -> str:
     """ given a buffer which is csv file read without conversion,
         perform preprocessing to remove comments and blank lines.
@@ -1113,11 +1450,221 @@ def preprocess_csv_buff(buff: Union[bytes, str]) -> str:
     lines = buff.splitlines()
     lines = [line for line in lines if line and not bool(re.search(r'^"?#', line)) and not bool(re.search(r'^,+$', line))]
     buff = '\n'.join(lines)
-    
+
     return buff
+
+
+def preprocess_csv_lines(lines: Iterable[str]) -> Iterator[str]:
+    """ streaming version of preprocess_csv_buff().
+        given an iterable of lines, such as an open text file,
+        yield only lines which are not comments or blank lines.
+    """
+    for line in lines:
+        stripped = line.rstrip('\r\n')
+        if stripped and not bool(re.search(r'^"?#', stripped)) and not bool(re.search(r'^,+$', stripped)):
+            yield line
+
+
+def csv_reader_from_lines(
+        fp: Iterable[str],
+        user_format: bool=False,
+        sep: str=',',
+        ) -> Iterator[T_la]:
+    """
+    Create a csv reader that incrementally parses CSV data from an open text file 
+    (or any iterable of lines). Quoted fields with embedded newlines are handled by csv.reader.
+
+    Args:
+        fp: open text file, opened with newline=''
+        user_format (bool): Whether to preprocess the CSV data (remove comments and blank lines).
+        sep (str): The separator used in the CSV data.
+    """
+
+    if sep is None:
+        sep = ','
+
+    if user_format:
+        fp = preprocess_csv_lines(fp)  # remove comments, blank lines
+
+    return csv.reader(fp, delimiter=sep, quoting=csv.QUOTE_MINIMAL)
+
+
+def split_csvj_header_lines(lines: Iterable[str]) -> Tuple[T_da, Iterator[str]]:
+    """ streaming version of split_csvj_header().
+        if lines start with a CSVJ header section, return the metadata dict and an iterator of the remaining lines.
+        Otherwise, return {} and an iterator of all lines.
+    """
+    lines_iter = iter(lines)
+    comment_lines: T_ls = []
+    for line in lines_iter:
+        if not line.startswith('#'):
+            lines_iter = itertools.chain([line], lines_iter)
+            break
+        comment_lines.append(line)
+        
+    if not comment_lines:
+        return {}, lines_iter
+        
+    metadata_da, _ = split_csvj_header(''.join(comment_lines))
+    if not metadata_da:
+        return {}, itertools.chain(comment_lines, lines_iter)
+    return metadata_da, lines_iter
     
+    
+def csv_rows_from_lines(
+        fp: Iterable[str],
+        dtypes: Optional[T_dtype_dict]=None,
+        noheader: bool=False,
+        user_format: bool=False,
+        sep: str=',',
+        unflatten: bool=True,
+        include_cols: Optional[T_ls]=None,
+        ) -> Tuple[T_ls, T_dtype_dict, T_da, Iterator[T_la]]:
+    """ incrementally parse csv (or CSVJ) data from an open text file (or any iterable of lines).
+        returns (cols, dtypes, csvj_metadata_da, rows_iter) where rows_iter yields the data rows
+        projected to include_cols, if provided, and converted per dtypes. dtypes are taken from
+        the CSVJ header section if not provided.
+    """
+    csvj_metadata_da, lines_iter = split_csvj_header_lines(fp)
+    if not dtypes:
+        dtypes = csvj_metadata_da.get('dtypes')
+        
+    csv_reader = csv_reader_from_lines(lines_iter, user_format=user_format, sep=sep)
+    
+    rows_iter: Iterator[T_la] = csv_reader
+    cols: T_ls = []
+    if not noheader:
+        cols = next(csv_reader, [])
+        if include_cols:
+            icols = icols_of_cols(cols, include_cols)
+            cols = [cols[icol] for icol in icols]
+            rows_iter = project_rows(csv_reader, icols)
+    elif dtypes:
+        cols = list(dtypes.keys())
+        
+    # compile dtypes once for the whole file.
+    converters_lot = compile_dtype_converters(cols, dtypes, unflatten=unflatten)
+    if converters_lot:
+        rows_iter = (convert_row_la(row, converters_lot) for row in rows_iter)
+        
+    return cols, dtypes or {}, csvj_metadata_da, rows_iter
+
 
-def write_buff_to_fp(buff: T_buff, file_path: str, rtype='.csv', local_mirror: bool=False, if_unmodified: bool=False) -> str: # file_path
+def iter_lol_chunks(rows_iter: Iterable[T_la], chunk_size: int=10000) -> Iterator[T_lola]:
+    """ given any iterable of rows, such as a csv reader, yield lists of 
+        no more than chunk_size rows. Only one chunk is held in memory at a time.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+
+    rows_iter = iter(rows_iter)
+    while True:
+        chunk_lol = list(itertools.islice(rows_iter, chunk_size))
+        if not chunk_lol:
+            return
+        yield chunk_lol
+
+
+def jsonl_rows_from_lines(
+        lines: Iterable[str],
+        cols: T_ls,                 # column order. Extended in place with new keys unless fixed_cols.
+        fixed_cols: bool=False,     # if True, keys not in cols are ignored.
+        ) -> Iterator[T_la]:
+    """ decode JSON Lines (NDJSON) and yield each object as a row list in the order of cols,
+        without building a record dict per row. Missing keys are ''. 
+        
+        When keys are first seen, they are appended to cols, so rows yielded earlier are
+        shorter than those yielded later. JSON arrays are yielded as rows as is, and blank lines are skipped.
+    """
+    decode = json.JSONDecoder().decode
+    icol_by_col = {col: icol for icol, col in enumerate(cols)}
+    cols_ta = tuple(cols)
+    
+    for line in lines:
+        if not line or line.isspace():
+            continue
+        obj = decode(line)
+        
+        if type(obj) is dict:
+            # usually every object has the same keys in the same order.
+            if tuple(obj) == cols_ta:
+                yield list(obj.values())
+                continue
+                
+            if not fixed_cols:
+                new_cols = [key for key in obj if key not in icol_by_col]
+                if new_cols:
+                    icol_by_col.update({col: icol for icol, col in enumerate(new_cols, start=len(cols))})
+                    cols.extend(new_cols)
+                    cols_ta = tuple(cols)
+                    
+            yield [obj.get(col, '') for col in cols_ta]
+            
+        elif type(obj) is list:
+            yield obj
+            
+        else:
+            raise ValueError(f"JSON Lines value is not an object or array: {line[:50]}")
+            
+
+def pad_rows_in_lol(lol: T_lola, num_cols: int) -> T_lola:
+    """ extend any rows in lol shorter than num_cols with '', in place. """
+    
+    for row_la in lol:
+        if len(row_la) < num_cols:
+            row_la.extend([''] * (num_cols - len(row_la)))
+    return lol
+    
+
+# compression codecs which can be used to read and write files, by extension.
+COMPRESSION_BY_EXT: Dict[str, str] = {'.gz': 'gzip', '.gzip': 'gzip', '.bz2': 'bz2', '.xz': 'xz', '.lzma': 'xz'}
+
+OPENERS_BY_COMPRESSION: Dict[str, Callable] = {'gzip': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+
+
+def compression_of_path(file_path: str, compression: Optional[str]='infer') -> Optional[str]:
+    """ return the compression to use for file_path: 'gzip', 'bz2', 'xz' or None.
+        if compression is 'infer', it is determined by the file extension, like '.csv.gz'.
+    """
+    if compression == 'infer':
+        return COMPRESSION_BY_EXT.get(os.path.splitext(file_path)[1].lower())
+    if compression and compression not in OPENERS_BY_COMPRESSION:
+        raise ValueError(f"compression must be one of {list(OPENERS_BY_COMPRESSION)}, 'infer' or None, got {compression}")
+    return compression or None
+
+
+def open_file(file_path: str, mode: str='rt', compression: Optional[str]='infer', encoding: str='utf-8') -> Any:
+    """ open a local file, compressed or not, for streaming reads or writes. 
+        Data is compressed or decompressed incrementally by gzip, bz2 or lzma as it is written or read.
+        Text modes use utf-8 and newline='' as required by the csv module.
+    """
+    compression = compression_of_path(file_path, compression)
+    
+    if 'b' in mode:
+        if not compression:
+            return open(file_path, mode=mode)
+        return OPENERS_BY_COMPRESSION[compression](file_path, mode=mode)
+
+    if 't' not in mode:
+        mode += 't'
+    if not compression:
+        return open(file_path, mode=mode, newline='', encoding=encoding)
+    return OPENERS_BY_COMPRESSION[compression](file_path, mode=mode, newline='', encoding=encoding)
+
+
+def write_buff_to_fp(
+        buff: T_buff, 
+        file_path: str, 
+        rtype='.csv', 
+        local_mirror: bool=False, 
+        if_unmodified: bool=False, 
+        compression: Optional[str]=None,        # 'gzip', 'bz2', 'xz', 'infer' or None. Local files only.
+        ) -> str: # file_path
+    """ write buff to file_path, which may be local or s3.
+        buff is written as given unless compression is specified, because binary buffs such as
+        '.gz' or '.xlsx' content are often already compressed. Use compression='infer' to
+        compress a text buff according to the file extension.
+    """
 
     if buff:
         #--- write buffer based on path
@@ -1150,7 +1697,7 @@ def write_buff_to_fp(buff: T_buff, file_path: str, rtype='.csv', local_mirror: b
             if rtype in ['binary', 'image']:
                 buff = cast(bytes, buff)
                 try:
-                    with open(file_path, mode='wb') as file:
+                    with open_file(file_path, mode='wb', compression=compression) as file:
                         file.write(buff)
                 except Exception:
                     error_beep()
@@ -1158,7 +1705,7 @@ def write_buff_to_fp(buff: T_buff, file_path: str, rtype='.csv', local_mirror: b
                     pass
             else:
                 buff = cast(str, buff)
-                with open(file_path, mode='wt', newline='', encoding="utf-8") as file:
+                with open_file(file_path, mode='wt', compression=compression) as file:
                     file.write(buff)
                                         
             sts(f"Saved {len(buff):,} bytes to {file_path}")
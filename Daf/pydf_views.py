@@ -0,0 +1,262 @@
+# pydf_views.py
+"""
+
+# Pydf -- Python Dataframes
+
+The Pydf class provides a lightweight, simple and fast alternative to provide
+2-d data arrays with mixed types.
+
+This file provides a list-like sequence of rows which projects some of the columns
+of the rows of another lol without copying them. This is used by select_icols()
+and select_cols(). It also provides the registry of rows shared by copy-on-write views.
+
+"""
+
+"""
+    MIT License
+
+    Copyright (c) 2024 Ray Lutz
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+"""
+
+
+"""
+See README file at this location: https://github.com/raylutz/Pydf/blob/main/README.md
+"""
+
+import operator
+import weakref
+import collections.abc
+
+from Pydf.pydf_types import T_la, T_li, T_lola
+
+from typing import List, Dict, Any, Tuple, Optional, Union, cast, Type, Callable, Iterator, Iterable, Set #
+def fake_function(a: Optional[List[Dict[str, Tuple[int,Union[Any, str, Type, Callable ]]]]] = None) -> Optional[int]:
+    return None or cast(int, 0)   # pragma: no cover
+
+
+class ProjectedLol(collections.abc.MutableSequence):
+    """ list-like sequence of rows which are the columns icols of the rows of source_lol.
+        Rows are projected with operator.itemgetter when accessed, so creating the view 
+        does not copy the data.
+        
+        The first write to the view, including writing to an item of a row it returned, 
+        materializes all rows as a normal lol, which is used from then on. source_lol is 
+        never modified by the view.
+    """
+    
+    def __init__(self, source_lol: T_lola, icols: T_li, shared_row_ids: Optional['SharedRowIds']=None):
+        self.source_lol = source_lol
+        self.icols      = list(icols)
+        self._project   = row_projector(self.icols)
+        self._lol: Optional[T_lola] = None          # materialized rows, after the first write.
+        
+        # registry of the rows of source_lol shared with the source pydf, until materialized.
+        self.shared_row_ids = shared_row_ids
+        if shared_row_ids is not None:
+            shared_row_ids.add(self)
+        
+        # rows returned before materializing, by irow, which are linked to their materialized rows.
+        self._rows_out: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+        
+        
+    def __reduce__(self) -> Tuple[Callable, Tuple]:
+        return list, (self.materialize(),)
+        
+        
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self[:]!r})"
+        
+        
+    def __len__(self) -> int:
+        return len(self._lol if self._lol is not None else self.source_lol)
+        
+        
+    def __getitem__(self, idx: Union[int, slice]) -> Any:
+        if self._lol is not None:
+            return self._lol[idx]
+        if isinstance(idx, slice):
+            return list(map(self._project, self.source_lol[idx]))
+        if idx < 0:
+            idx += len(self.source_lol)
+        return self._projected_row(idx, self.source_lol[idx])
+        
+        
+    def __iter__(self) -> Iterator[T_la]:
+        if self._lol is not None:
+            yield from self._lol
+            return
+        for irow, source_row in enumerate(self.source_lol):
+            if self._lol is not None:
+                # materialized by a write while iterating.
+                yield from self._lol[irow:]
+                return
+            yield self._projected_row(irow, source_row)
+            
+            
+    def _projected_row(self, irow: int, source_row: T_la) -> 'ProjectedRow':
+        """ return the ProjectedRow for irow, the same one while it is in use. """
+        row_la = self._rows_out.get(irow)
+        if row_la is None:
+            row_la = self._rows_out[irow] = ProjectedRow(self._project(source_row), self, irow)
+        return row_la
+            
+            
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (list, ProjectedLol)):
+            return len(self) == len(other) and all(row == other_row for row, other_row in zip(self, other))
+        return NotImplemented
+        
+        
+    def __setitem__(self, idx: Union[int, slice], val: Any):
+        self.materialize()[idx] = val
+        
+        
+    def __delitem__(self, idx: Union[int, slice]):
+        del self.materialize()[idx]
+        
+        
+    def insert(self, idx: int, row_la: T_la):
+        self.materialize().insert(idx, row_la)
+        
+        
+    def append(self, row_la: T_la):
+        self.materialize().append(row_la)
+        
+        
+    def icols_of_source(self) -> Optional[T_li]:
+        """ return the columns of source_lol which are projected, or None once the view is materialized. """
+        return self.icols if self._lol is None else None
+        
+        
+    def projected_rows(self) -> T_lola:
+        """ return all rows as a new lol, without materializing the view. """
+        if self._lol is not None:
+            return [list(row_la) for row_la in self._lol]
+        return list(map(self._project, self.source_lol))
+        
+        
+    def materialize(self) -> T_lola:
+        """ project all rows once and return them as a normal lol, which the view uses from then on. """
+        if self._lol is None:
+            self._lol = list(map(self._project, self.source_lol))
+            self.source_lol = []
+            if self.shared_row_ids is not None:
+                self.shared_row_ids.discard(self)
+                self.shared_row_ids = None
+            
+            # rows returned earlier now write to their materialized rows, wherever those rows are moved.
+            for irow, row_la in list(self._rows_out.items()):
+                row_la._row_la = self._lol[irow]
+            self._rows_out = weakref.WeakValueDictionary()
+        return self._lol
+        
+        
+    def writable_row(self, irow: int) -> T_la:
+        """ return materialized row irow, to be modified in place. """
+        return self.materialize()[irow]
+        
+        
+class SharedRowIds:
+    """ ids of the rows shared by a pydf and its copy-on-write views, which are copied before 
+        being modified in place. See select_irows().
+        
+        Each pydf or ProjectedLol which uses the shared rows is registered as a holder, without 
+        keeping it alive. Once fewer than two holders are alive, no row is shared any more, so 
+        the ids are dropped.
+    """
+    
+    def __init__(self):
+        self.ids: Set[int] = set()
+        self._finalizers: Dict[int, weakref.finalize] = {}     # by id of each live holder.
+        
+        
+    def add(self, holder: Any, rows_lol: Iterable[T_la]=()) -> None:
+        """ register holder, if it is new, and the rows rows_lol, which it shares. """
+        holder_id = id(holder)
+        if holder_id not in self._finalizers:
+            self._finalizers[holder_id] = weakref.finalize(holder, self._finalizers.pop, holder_id, None)
+        self.ids.update(map(id, rows_lol))
+        
+        
+    def discard(self, holder: Any) -> None:
+        """ unregister holder, which no longer uses any shared rows. """
+        finalizer = self._finalizers.pop(id(holder), None)
+        if finalizer is not None:
+            finalizer.detach()
+            
+            
+    def is_shared(self, row_la: T_la) -> bool:
+        """ return True if row_la may be used by another holder, and so must be copied to be modified. """
+        if len(self._finalizers) < 2:
+            self.ids.clear()
+            return False
+        return id(row_la) in self.ids
+        
+        
+class ProjectedRow(list):
+    """ a row returned by a ProjectedLol before it is materialized. 
+        Modifying the row materializes the ProjectedLol and modifies its row. Once the ProjectedLol 
+        is materialized, the row is linked to its materialized row, so it is modified even if the 
+        rows of the view are later inserted or removed.
+    """
+    __slots__ = ('_projected_lol', '_irow', '_row_la', '__weakref__')
+    
+    def __init__(self, row_la: T_la, projected_lol: ProjectedLol, irow: int):
+        super().__init__(row_la)
+        self._projected_lol = projected_lol
+        self._irow = irow
+        self._row_la: Optional[T_la] = None         # the materialized row, once linked.
+        
+        
+    def __reduce__(self) -> Tuple[Callable, Tuple]:
+        return list, (list(self),)
+        
+        
+def _write_through(method_name: str) -> Callable:
+    """ return a method of ProjectedRow which applies the list method to the row of the 
+        materialized ProjectedLol, then updates this row to match.
+    """
+    def method(self, *args):
+        if self._row_la is None:
+            # materializing links this row to its materialized row.
+            self._projected_lol.materialize()
+        row_la = self._row_la
+        result = getattr(row_la, method_name)(*args)
+        list.__setitem__(self, slice(None), row_la)
+        return self if method_name in ('__iadd__', '__imul__') else result
+    method.__name__ = method_name
+    return method
+    
+    
+for _method_name in ('__setitem__', '__delitem__', '__iadd__', '__imul__', 
+                        'append', 'extend', 'insert', 'pop', 'remove', 'clear', 'sort', 'reverse'):
+    setattr(ProjectedRow, _method_name, _write_through(_method_name))
+    
+    
+def row_projector(icols: T_li) -> Callable[[T_la], T_la]:
+    """ return a function which returns a new list of the values at icols of a row. """
+    if len(icols) == 1:
+        icol = icols[0]
+        return lambda row_la: [row_la[icol]]
+    if not icols:
+        return lambda row_la: []
+    getter = operator.itemgetter(*icols)
+    return lambda row_la: list(getter(row_la))
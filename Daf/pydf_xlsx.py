@@ -0,0 +1,493 @@
+# pydf_xlsx.py
+"""
+
+# Pydf -- Python Dataframes
+
+The Pydf class provides a lightweight, simple and fast alternative to provide
+2-d data arrays with mixed types.
+
+This file handles reading and writing .xlsx workbooks directly, using only
+zipfile and xml.etree from the standard library.
+
+"""
+
+"""
+    MIT License
+
+    Copyright (c) 2024 Ray Lutz
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+"""
+
+
+"""
+See README file at this location: https://github.com/raylutz/Pydf/blob/main/README.md
+"""
+
+import io
+import re
+import json
+import numbers
+import datetime
+import zipfile
+import xml.etree.ElementTree as ET
+
+from Pydf.pydf_types import T_ls, T_la, T_lola, T_ds
+
+from typing import List, Dict, Any, Tuple, Optional, Union, cast, Type, Callable, Iterator #
+def fake_function(a: Optional[List[Dict[str, Tuple[int,Union[Any, str, Type, Callable ]]]]] = None) -> Optional[int]:
+    return None or cast(int, 0)   # pragma: no cover
+
+
+NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+NS_REL  = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+NS_PKG_REL = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+TAG_ROW  = f'{{{NS_MAIN}}}row'
+TAG_C    = f'{{{NS_MAIN}}}c'
+TAG_V    = f'{{{NS_MAIN}}}v'
+TAG_T    = f'{{{NS_MAIN}}}t'
+TAG_IS   = f'{{{NS_MAIN}}}is'
+TAG_SI   = f'{{{NS_MAIN}}}si'
+TAG_RPH  = f'{{{NS_MAIN}}}rPh'
+
+# built-in number formats which are dates or times.
+DATE_NUMFMT_IDS = set(range(14, 23)) | {45, 46, 47}
+
+EXCEL_EPOCH      = datetime.datetime(1899, 12, 30)
+EXCEL_EPOCH_1904 = datetime.datetime(1904, 1, 1)
+
+
+#==== reading
+
+def xlsx_to_lol(
+        xlsx: Union[bytes, Any],                # xlsx file in a buffer, or a file object or path.
+        sheetname: Optional[str]=None,          # name of the sheet to read. Default is the first sheet.
+        add_trailing_blank_cols: bool=True,     # pad all rows with '' to the same length.
+        ) -> T_lola:
+    """ read one sheet of an xlsx workbook directly into a lol of str values, as they would appear in a csv file.
+
+        The sheet XML is streamed out of the zip container with iterparse, so only the resulting
+        lol and the shared strings table are held in memory. Missing rows are provided as
+        empty rows and missing cells as ''. Booleans are 'TRUE' and 'FALSE', and numbers formatted
+        as dates are converted to ISO format.
+    """
+    if isinstance(xlsx, (bytes, bytearray)):
+        xlsx = io.BytesIO(xlsx)
+
+    with zipfile.ZipFile(xlsx) as zf:
+        sheet_path, date1904 = _xlsx_sheet_path(zf, sheetname)
+        shared_strings = _xlsx_shared_strings(zf)
+        date_styles = _xlsx_date_styles(zf)
+        epoch = EXCEL_EPOCH_1904 if date1904 else EXCEL_EPOCH
+
+        lol: T_lola = []
+        with zf.open(sheet_path) as sheet_fp:
+            for row_elem, irow in _iter_xlsx_rows(sheet_fp):
+                while len(lol) < irow:
+                    lol.append([])
+                lol.append(_xlsx_row_to_la(row_elem, shared_strings, date_styles, epoch))
+                row_elem.clear()
+
+    if add_trailing_blank_cols and lol:
+        max_cols = max(len(la) for la in lol)
+        for la in lol:
+            if len(la) < max_cols:
+                la.extend([''] * (max_cols - len(la)))
+
+    return lol
+
+
+def _iter_xlsx_rows(sheet_fp: Any) -> Iterator[Tuple[Any, int]]:
+    """ yield (row element, row index) for each row in the sheet XML, in order. """
+
+    irow = -1
+    for _event, elem in ET.iterparse(sheet_fp, events=('end',)):
+        if elem.tag == TAG_ROW:
+            row_ref = elem.get('r')
+            irow = int(row_ref) - 1 if row_ref else irow + 1
+            yield elem, irow
+
+
+def _xlsx_row_to_la(row_elem: Any, shared_strings: T_ls, date_styles: set, epoch: datetime.datetime) -> T_la:
+
+    la: T_la = []
+    for c_elem in row_elem:
+        if c_elem.tag != TAG_C:
+            continue
+        cell_ref = c_elem.get('r')
+        if cell_ref:
+            icol = _icol_of_cell_ref(cell_ref)
+            if icol > len(la):
+                la.extend([''] * (icol - len(la)))
+
+        cell_type = c_elem.get('t', 'n')
+        val = ''
+        if cell_type == 'inlineStr':
+            for child in c_elem:
+                if child.tag == TAG_IS:
+                    val = _xlsx_text_of(child)
+        else:
+            for child in c_elem:
+                if child.tag == TAG_V:
+                    val = child.text or ''
+            if val:
+                if cell_type == 's':
+                    val = shared_strings[int(val)]
+                elif cell_type == 'b':
+                    val = 'TRUE' if val == '1' else 'FALSE'
+                elif cell_type == 'n' and date_styles and int(c_elem.get('s', '0')) in date_styles:
+                    val = _excel_serial_to_iso(val, epoch)
+        la.append(val)
+
+    return la
+
+
+def _xlsx_text_of(elem: Any) -> str:
+    """ concatenate the text of all <t> elements in a shared or inline string, excluding phonetic runs. """
+
+    parts = []
+    for child in elem:
+        if child.tag == TAG_T:
+            parts.append(child.text or '')
+        elif child.tag != TAG_RPH:
+            parts.extend(t_elem.text or '' for t_elem in child.iter(TAG_T))
+    return ''.join(parts)
+
+
+def _xlsx_shared_strings(zf: zipfile.ZipFile) -> T_ls:
+    """ resolve the shared strings table once for the whole sheet. """
+
+    if 'xl/sharedStrings.xml' not in zf.namelist():
+        return []
+
+    shared_strings: T_ls = []
+    with zf.open('xl/sharedStrings.xml') as fp:
+        for _event, elem in ET.iterparse(fp, events=('end',)):
+            if elem.tag == TAG_SI:
+                shared_strings.append(_xlsx_text_of(elem))
+                elem.clear()
+    return shared_strings
+
+
+def _xlsx_sheet_path(zf: zipfile.ZipFile, sheetname: Optional[str]=None) -> Tuple[str, bool]:
+    """ return the path in the zip file of sheetname (or the first sheet) and whether the workbook uses the 1904 date system. """
+
+    workbook_root = ET.fromstring(zf.read('xl/workbook.xml'))
+    rels_root = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    targets_ds: T_ds = {rel.get('Id', ''): rel.get('Target', '') for rel in rels_root.iter(f'{{{NS_PKG_REL}}}Relationship')}
+
+    workbook_pr = workbook_root.find(f'{{{NS_MAIN}}}workbookPr')
+    date1904 = workbook_pr is not None and workbook_pr.get('date1904', 'false').lower() in ('1', 'true')
+
+    for sheet_elem in workbook_root.iter(f'{{{NS_MAIN}}}sheet'):
+        if sheetname is None or sheet_elem.get('name') == sheetname:
+            target = targets_ds[sheet_elem.get(f'{{{NS_REL}}}id', '')]
+            sheet_path = target.lstrip('/') if target.startswith('/') else 'xl/' + target
+            return sheet_path, date1904
+
+    raise KeyError(f"sheet '{sheetname}' not found in workbook")
+
+
+def _xlsx_date_styles(zf: zipfile.ZipFile) -> set:
+    """ return the set of cell style indexes which format numbers as dates or times. """
+
+    if 'xl/styles.xml' not in zf.namelist():
+        return set()
+
+    styles_root = ET.fromstring(zf.read('xl/styles.xml'))
+
+    date_numfmt_ids = set(DATE_NUMFMT_IDS)
+    for numfmt_elem in styles_root.iter(f'{{{NS_MAIN}}}numFmt'):
+        # remove quoted literals and [colors] before looking for date and time codes.
+        format_code = re.sub(r'"[^"]*"|\[[^\]]*\]', '', numfmt_elem.get('formatCode', ''))
+        if re.search(r'[dmyhs]', format_code, flags=re.IGNORECASE):
+            date_numfmt_ids.add(int(numfmt_elem.get('numFmtId', '0')))
+
+    date_styles = set()
+    cell_xfs_elem = styles_root.find(f'{{{NS_MAIN}}}cellXfs')
+    if cell_xfs_elem is not None:
+        for istyle, xf_elem in enumerate(cell_xfs_elem.iter(f'{{{NS_MAIN}}}xf')):
+            if int(xf_elem.get('numFmtId', '0')) in date_numfmt_ids:
+                date_styles.add(istyle)
+    return date_styles
+
+
+def _excel_serial_to_iso(val: str, epoch: datetime.datetime) -> str:
+    try:
+        date_time = epoch + datetime.timedelta(days=float(val))
+    except (ValueError, OverflowError):
+        return val
+    if date_time.hour or date_time.minute or date_time.second:
+        return date_time.strftime('%Y-%m-%d %H:%M:%S')
+    return date_time.strftime('%Y-%m-%d')
+
+
+_icol_by_col_letters: Dict[str, int] = {}
+
+def _icol_of_cell_ref(cell_ref: str) -> int:
+    """ return the column index of a cell reference like 'AB12', caching the result for each column """
+    
+    col_letters = cell_ref.rstrip('0123456789')
+    try:
+        return _icol_by_col_letters[col_letters]
+    except KeyError:
+        icol = _icol_by_col_letters[col_letters] = col_letters_to_icol(col_letters)
+        return icol
+
+
+def col_letters_to_icol(col_letters: str) -> int:
+    """ convert column letters like 'AB' to column index 27 """
+
+    icol = 0
+    for letter in col_letters:
+        icol = icol * 26 + (ord(letter) - 64)
+    return icol - 1
+
+
+#==== writing
+
+ROW_WRITE_BATCH_SIZE = 1000         # rows formatted and written to the sheet XML at a time.
+
+XML_ILLEGAL_CHARS_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+SHEETNAME_ILLEGAL_CHARS_RE = re.compile(r'[\[\]:*?/\\]')
+
+XML_DECL = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+CONTENT_TYPES_XML = (XML_DECL +
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{overrides}'
+    '</Types>')
+
+ROOT_RELS_XML = (XML_DECL +
+    f'<Relationships xmlns="{NS_PKG_REL}">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>')
+
+STYLES_XML = (XML_DECL +
+    f'<styleSheet xmlns="{NS_MAIN}">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+    '</styleSheet>')
+
+
+def _to_excel_file(
+        self,
+        file_path: str,
+        sheetname: str='Sheet1',                # name of the sheet for this pydf.
+        include_header: bool=True,              # write column names in the first row.
+        shared_strings: bool=False,             # use a shared string table rather than inline strings.
+        sheets_dopydf: Optional[Dict[str, Any]]=None,   # additional sheets, {sheetname: pydf}, written after this one.
+        ) -> str:
+    """ write the pydf to a local xlsx file, with additional pydf instances in other sheets if provided.
+
+        Rows are formatted and streamed into the sheet XML inside the zip file in batches,
+        so memory use does not grow with the number of rows, unless shared_strings is True,
+        in which case the table of unique strings is held until the end.
+        Cell types are determined by dtypes: int and float are numbers, bool is boolean,
+        list and dict are JSON strings, and str is a string. Columns without dtypes are
+        typed by value. '' values are left as empty cells.
+    """
+    with open(file_path, mode='wb') as fp:
+        write_xlsx(fp, {sheetname: self, **(sheets_dopydf or {})}, include_header=include_header, shared_strings=shared_strings)
+    
+    return file_path
+
+
+def _to_excel_buff(
+        self,
+        sheetname: str='Sheet1',                # name of the sheet for this pydf.
+        include_header: bool=True,              # write column names in the first row.
+        shared_strings: bool=False,             # use a shared string table rather than inline strings.
+        sheets_dopydf: Optional[Dict[str, Any]]=None,   # additional sheets, {sheetname: pydf}, written after this one.
+        ) -> bytes:
+    """ write the pydf to an xlsx file in a buffer. See to_excel_file() """
+
+    buff = io.BytesIO()
+    write_xlsx(buff, {sheetname: self, **(sheets_dopydf or {})}, include_header=include_header, shared_strings=shared_strings)
+    return buff.getvalue()
+
+
+def write_xlsx(
+        fp: Any,                                # file object opened for binary writing.
+        dopydf: Dict[str, Any],                 # {sheetname: pydf} written in order.
+        include_header: bool=True,
+        shared_strings: bool=False,
+        ) -> None:
+    """ write an xlsx workbook with one sheet per pydf. """
+
+    sheetnames = [SHEETNAME_ILLEGAL_CHARS_RE.sub('_', str(sheetname))[:31] for sheetname in dopydf]
+    if len(set(sheetnames)) != len(sheetnames):
+        raise ValueError(f"sheet names must be unique: {sheetnames}")
+
+    string_table: Optional[Dict[str, int]] = {} if shared_strings else None
+
+    with zipfile.ZipFile(fp, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for isheet, pydf in enumerate(dopydf.values(), start=1):
+            with zf.open(f'xl/worksheets/sheet{isheet}.xml', mode='w', force_zip64=True) as sheet_fp:
+                _write_sheet_xml(sheet_fp, pydf, include_header, string_table)
+
+        overrides = ''.join(
+            f'<Override PartName="/xl/worksheets/sheet{isheet}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for isheet in range(1, len(sheetnames) + 1))
+        if string_table is not None:
+            overrides += ('<Override PartName="/xl/sharedStrings.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>')
+            with zf.open('xl/sharedStrings.xml', mode='w', force_zip64=True) as sst_fp:
+                _write_shared_strings_xml(sst_fp, string_table)
+
+        zf.writestr('[Content_Types].xml', CONTENT_TYPES_XML.format(overrides=overrides))
+        zf.writestr('_rels/.rels', ROOT_RELS_XML)
+        zf.writestr('xl/styles.xml', STYLES_XML)
+        zf.writestr('xl/workbook.xml', XML_DECL +
+            f'<workbook xmlns="{NS_MAIN}" xmlns:r="{NS_REL}"><sheets>' +
+            ''.join(f'<sheet name="{_xml_escape(sheetname)}" sheetId="{isheet}" r:id="rId{isheet}"/>'
+                    for isheet, sheetname in enumerate(sheetnames, start=1)) +
+            '</sheets></workbook>')
+        zf.writestr('xl/_rels/workbook.xml.rels', XML_DECL +
+            f'<Relationships xmlns="{NS_PKG_REL}">' +
+            ''.join(f'<Relationship Id="rId{isheet}" Type="{NS_REL}/worksheet" Target="worksheets/sheet{isheet}.xml"/>'
+                    for isheet in range(1, len(sheetnames) + 1)) +
+            f'<Relationship Id="rId{len(sheetnames) + 1}" Type="{NS_REL}/styles" Target="styles.xml"/>' +
+            (f'<Relationship Id="rId{len(sheetnames) + 2}" Type="{NS_REL}/sharedStrings" Target="sharedStrings.xml"/>'
+                if string_table is not None else '') +
+            '</Relationships>')
+
+
+def _write_sheet_xml(sheet_fp: Any, pydf: Any, include_header: bool, string_table: Optional[Dict[str, int]]) -> None:
+
+    cols = pydf.columns()
+    num_cols = max(len(cols), pydf.num_cols())
+    col_letters = [icol_to_col_letters(icol) for icol in range(num_cols)]
+    
+    # choose the cell formatter for each column once, based on dtypes.
+    formatters = [_CELL_FORMATTERS_BY_DTYPE.get(pydf.dtypes.get(col), _format_cell_by_value) for col in cols]
+    formatters.extend([_format_cell_by_value] * (num_cols - len(formatters)))
+    
+    sheet_fp.write(f'{XML_DECL}<worksheet xmlns="{NS_MAIN}"><sheetData>'.encode('utf-8'))
+
+    irow = 1
+    if include_header and cols:
+        header_cells = ''.join(_format_str_cell(f'{col_letters[icol]}1', str(col), string_table) for icol, col in enumerate(cols))
+        sheet_fp.write(f'<row r="1">{header_cells}</row>'.encode('utf-8'))
+        irow = 2
+
+    lol = pydf.lol
+    num_rows = len(lol)
+    for batch_start in range(0, num_rows, ROW_WRITE_BATCH_SIZE):
+        row_strs = []
+        for la in lol[batch_start:batch_start + ROW_WRITE_BATCH_SIZE]:
+            cells = ''.join(formatters[icol](f'{col_letters[icol]}{irow}', val, string_table) 
+                                for icol, val in enumerate(la) if val != '' and val is not None)
+            row_strs.append(f'<row r="{irow}">{cells}</row>')
+            irow += 1
+        sheet_fp.write(''.join(row_strs).encode('utf-8'))
+
+    sheet_fp.write(b'</sheetData></worksheet>')
+
+
+def _write_shared_strings_xml(sst_fp: Any, string_table: Dict[str, int]) -> None:
+
+    sst_fp.write(f'{XML_DECL}<sst xmlns="{NS_MAIN}" count="{len(string_table)}" uniqueCount="{len(string_table)}">'.encode('utf-8'))
+    strings = list(string_table)
+    for batch_start in range(0, len(strings), ROW_WRITE_BATCH_SIZE):
+        sst_fp.write(''.join(f'<si>{_xml_t_elem(val)}</si>' for val in strings[batch_start:batch_start + ROW_WRITE_BATCH_SIZE]).encode('utf-8'))
+    sst_fp.write(b'</sst>')
+
+
+def _xml_escape(val: str) -> str:
+    val = XML_ILLEGAL_CHARS_RE.sub('', val)
+    return val.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+
+def _xml_t_elem(val: str) -> str:
+    if val != val.strip() or '\n' in val:
+        return f'<t xml:space="preserve">{_xml_escape(val)}</t>'
+    return f'<t>{_xml_escape(val)}</t>'
+
+
+def _format_str_cell(ref: str, val: Any, string_table: Optional[Dict[str, int]]) -> str:
+    val = val if isinstance(val, str) else str(val)
+    if string_table is None:
+        return f'<c r="{ref}" t="inlineStr"><is>{_xml_t_elem(val)}</is></c>'
+    idx = string_table.setdefault(val, len(string_table))
+    return f'<c r="{ref}" t="s"><v>{idx}</v></c>'
+
+
+def _format_num_cell(ref: str, val: Any, string_table: Optional[Dict[str, int]]) -> str:
+    # NumPy scalars are numbers.Real too, and are written as the equivalent Python values.
+    if isinstance(val, bool) or not isinstance(val, numbers.Real):
+        return _format_cell_by_value(ref, val, string_table)
+    if isinstance(val, numbers.Integral):
+        return f'<c r="{ref}"><v>{int(val)}</v></c>'
+    val = float(val)
+    if val != val or val in (float('inf'), float('-inf')):
+        return ''       # nan and inf cannot be represented.
+    return f'<c r="{ref}"><v>{val!r}</v></c>'
+
+
+def _format_bool_cell(ref: str, val: Any, string_table: Optional[Dict[str, int]]) -> str:
+    if not isinstance(val, bool):
+        return _format_cell_by_value(ref, val, string_table)
+    return f'<c r="{ref}" t="b"><v>{int(val)}</v></c>'
+
+
+def _format_json_cell(ref: str, val: Any, string_table: Optional[Dict[str, int]]) -> str:
+    if isinstance(val, str):
+        return _format_str_cell(ref, val, string_table)
+    return _format_str_cell(ref, json.dumps(val, default=str), string_table)
+
+
+def _format_cell_by_value(ref: str, val: Any, string_table: Optional[Dict[str, int]]) -> str:
+    if isinstance(val, bool):
+        return _format_bool_cell(ref, val, string_table)
+    if isinstance(val, numbers.Real):
+        return _format_num_cell(ref, val, string_table)
+    if isinstance(val, (list, dict)):
+        return _format_json_cell(ref, val, string_table)
+    return _format_str_cell(ref, val, string_table)
+
+
+_CELL_FORMATTERS_BY_DTYPE: Dict[Any, Callable[[str, Any, Optional[Dict[str, int]]], str]] = {
+    int:    _format_num_cell,
+    float:  _format_num_cell,
+    bool:   _format_bool_cell,
+    str:    _format_str_cell,
+    list:   _format_json_cell,
+    dict:   _format_json_cell,
+    }
+
+
+def icol_to_col_letters(icol: int) -> str:
+    """ convert column index 27 to column letters like 'AB' """
+
+    letters = ''
+    icol += 1
+    while icol:
+        icol, rem = divmod(icol - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
@@ -1,16 +1,20 @@
 # test_pydf
 # copyright (c) 2024 Ray Lutz
 
-#import os
+import os
 import sys
 import unittest
 import numpy as np
 import pandas as pd
+import io
+import copy
+import pickle
+import sqlite3
 #from io import BytesIO
 from pathlib import Path
 sys.path.append('..')
 
-from Pydf.Pydf import Pydf
+from Pydf.Pydf import Pydf, Categorical
 from Pydf import pydf_utils as utils
 
 class TestPydf(unittest.TestCase):
@@ -743,6 +747,405 @@ class TestPydf(unittest.TestCase):
         self.assertEqual(my_pydf.columns(), ['ID', 'Name', 'Age'])
         self.assertEqual(my_pydf.lol, [['1', 'John', '30'], ['2', 'Alice', '25'], ['3', 'Bob', '35']])
 
+    def test_from_excel_buff_with_dtypes(self):
+        excel_file_path = Path(__file__).resolve().parent / "test_data" / "excel_test_1.xlsx"
+        excel_data = excel_file_path.read_bytes()
+
+        my_pydf = Pydf.from_excel_buff(excel_data, keyfield='ID', dtypes={'ID': int, 'Name': str, 'Age': int})
+
+        self.assertEqual(my_pydf.lol, [[1, 'John', 30], [2, 'Alice', 25], [3, 'Bob', 35]])
+        self.assertEqual(my_pydf.kd, {1: 0, 2: 1, 3: 2})
+
+        with self.assertRaises(KeyError):
+            Pydf.from_excel_buff(excel_data, sheetname='NoSuchSheet')
+
+    def test_from_excel_buff_sparse_cells(self):
+        import zipfile
+
+        ns = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+        rel_ns = 'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+        buff = io.BytesIO()
+        with zipfile.ZipFile(buff, 'w') as zf:
+            zf.writestr('xl/workbook.xml', f'<workbook {ns} {rel_ns}><sheets><sheet name="Data" sheetId="1" r:id="rId1"/></sheets></workbook>')
+            zf.writestr('xl/_rels/workbook.xml.rels',
+                '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                '<Relationship Id="rId1" Target="worksheets/sheet1.xml" Type="worksheet"/></Relationships>')
+            zf.writestr('xl/styles.xml', f'<styleSheet {ns}><cellXfs count="2"><xf numFmtId="0"/><xf numFmtId="14"/></cellXfs></styleSheet>')
+            zf.writestr('xl/sharedStrings.xml', f'<sst {ns}><si><t>Name</t></si><si><r><t>Jo</t></r><r><t>hn</t></r></si></sst>')
+            zf.writestr('xl/worksheets/sheet1.xml', f'<worksheet {ns}><sheetData>'
+                '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="inlineStr"><is><t>Flag</t></is></c>'
+                    '<c r="C1" t="inlineStr"><is><t>When</t></is></c><c r="D1" t="inlineStr"><is><t>Num</t></is></c></row>'
+                '<row r="2"><c r="A2" t="s"><v>1</v></c><c r="C2" s="1"><v>45292</v></c></row>'
+                '<row r="4"><c r="B4" t="b"><v>1</v></c><c r="D4"><v>2.5</v></c></row>'
+                '</sheetData></worksheet>')
+
+        my_pydf = Pydf.from_excel_buff(buff.getvalue(), sheetname='Data')
+
+        self.assertEqual(my_pydf.columns(), ['Name', 'Flag', 'When', 'Num'])
+        self.assertEqual(my_pydf.lol, [
+            ['John', '',     '2024-01-01', ''],
+            ['',     '',     '',           ''],
+            ['',     'TRUE', '',           '2.5'],
+            ])
+
+
+    # to_excel_buff / to_excel_file
+    def test_to_excel_buff_round_trip(self):
+        dtypes = {'ID': int, 'Score': float, 'Flag': bool, 'Tags': list, 'Name': str}
+        lol = [
+            [1, 2.5, True,  ['a'], ' lead & <trail> '],
+            [2, '',  False, [],    '007'],
+            ]
+        my_pydf = Pydf(lol=lol, cols=list(dtypes.keys()), dtypes=dtypes, keyfield='ID')
+        other_pydf = Pydf(lol=[['x', 1]], cols=['Key', 'Val'])
+
+        for shared_strings in [False, True]:
+            excel_buff = my_pydf.to_excel_buff(sheetname='Main', shared_strings=shared_strings, sheets_dopydf={'Other': other_pydf})
+
+            read_pydf = Pydf.from_excel_buff(excel_buff, keyfield='ID', dtypes=dtypes)
+            self.assertEqual(read_pydf.lol, lol)
+            self.assertEqual(read_pydf.kd, {1: 0, 2: 1})
+
+            other_read_pydf = Pydf.from_excel_buff(excel_buff, sheetname='Other')
+            self.assertEqual(other_read_pydf.lol, [['x', '1']])
+
+    def test_to_excel_buff_numpy_scalars(self):
+        import zipfile
+        
+        lol = [[np.int64(3), np.float64(1.5), np.int32(-2), np.float32(0.25)]]
+        for dtypes in [{'A': int, 'B': float, 'C': int, 'D': float}, {}]:
+            my_pydf = Pydf(lol=lol, cols=['A', 'B', 'C', 'D'])
+            my_pydf.dtypes = dtypes
+            excel_buff = my_pydf.to_excel_buff(sheetname='Main')
+            
+            with zipfile.ZipFile(io.BytesIO(excel_buff)) as zf:
+                sheet_xml = zf.read('xl/worksheets/sheet1.xml').decode('utf-8')
+            self.assertNotIn('np.', sheet_xml)
+            self.assertNotIn('inlineStr', sheet_xml.split('<row r="2">')[1])
+            
+            read_pydf = Pydf.from_excel_buff(excel_buff, dtypes={'A': int, 'B': float, 'C': int, 'D': float})
+            self.assertEqual(read_pydf.lol, [[3, 1.5, -2, 0.25]])
+
+    def test_to_excel_file(self):
+        current_dir = Path(__file__).resolve().parent
+        excel_file_path = current_dir / "test_data" / "test_to_excel_file.xlsx"
+        my_pydf = Pydf(lol=[[irow, f"name {irow}"] for irow in range(2500)], cols=['ID', 'Name'])
+        try:
+            self.assertEqual(my_pydf.to_excel_file(str(excel_file_path)), str(excel_file_path))
+            read_pydf = Pydf.from_excel_buff(excel_file_path.read_bytes(), dtypes={'ID': int, 'Name': str})
+        finally:
+            os.remove(excel_file_path)
+        self.assertEqual(read_pydf.lol, my_pydf.lol)
+
+    def test_to_excel_buff_duplicate_sheetnames(self):
+        my_pydf = Pydf(lol=[[1]], cols=['ID'])
+        with self.assertRaises(ValueError):
+            my_pydf.to_excel_buff(sheetname='A?', sheets_dopydf={'A*': my_pydf})
+
+    def test_to_pydf_file_round_trip(self):
+        current_dir = Path(__file__).resolve().parent
+        pydf_file_path = current_dir / "test_data" / "test_to_pydf_file.pydf"
+        lol = [ [1, 'Alice', 1.5,  True,  [1, 2], 'x\x00y'],
+                [2, 'Bøb',   '',   False, {'a': 1}, ''],
+                [3, '',      2.25, '',    None,   'z']]
+        my_pydf = Pydf(lol=lol, cols=['ID', 'Name', 'Amount', 'Flag', 'Obj', 'Nul'], keyfield='ID', name='people')
+        my_pydf.dtypes = {'ID': int, 'Name': str, 'Amount': float, 'Flag': bool}
+        try:
+            self.assertEqual(my_pydf.to_pydf_file(str(pydf_file_path)), str(pydf_file_path))
+            read_pydf = Pydf.from_pydf_file(str(pydf_file_path))
+            partial_pydf = Pydf.from_pydf_file(str(pydf_file_path), include_cols=['Amount', 'ID'])
+            unkeyed_pydf = Pydf.from_pydf_file(str(pydf_file_path), include_cols=['Name'])
+            with self.assertRaises(KeyError):
+                Pydf.from_pydf_file(str(pydf_file_path), include_cols=['Missing'])
+        finally:
+            os.remove(pydf_file_path)
+            
+        self.assertEqual(read_pydf.lol, lol)
+        self.assertEqual(read_pydf.hd, my_pydf.hd)
+        self.assertEqual(read_pydf.kd, {1: 0, 2: 1, 3: 2})
+        self.assertEqual(read_pydf.dtypes, my_pydf.dtypes)
+        self.assertEqual(read_pydf.name, 'people')
+        
+        self.assertEqual(partial_pydf.lol, [[1.5, 1], ['', 2], [2.25, 3]])
+        self.assertEqual(partial_pydf.hd, {'Amount': 0, 'ID': 1})
+        self.assertEqual(partial_pydf.kd, {1: 0, 2: 1, 3: 2})
+        self.assertEqual(partial_pydf.dtypes, {'ID': int, 'Amount': float})
+        
+        self.assertEqual(unkeyed_pydf.keyfield, '')
+        self.assertEqual(unkeyed_pydf.kd, {})
+        self.assertEqual(unkeyed_pydf.col('Name'), ['Alice', 'Bøb', ''])
+
+    def test_to_pydf_file_empty(self):
+        current_dir = Path(__file__).resolve().parent
+        pydf_file_path = current_dir / "test_data" / "test_to_pydf_file_empty.pydf"
+        try:
+            Pydf(cols=['A', 'B']).to_pydf_file(str(pydf_file_path))
+            read_pydf = Pydf.from_pydf_file(str(pydf_file_path))
+        finally:
+            os.remove(pydf_file_path)
+        self.assertEqual(read_pydf.lol, [])
+        self.assertEqual(read_pydf.columns(), ['A', 'B'])
+
+    def test_open_pydf_mmap(self):
+        current_dir = Path(__file__).resolve().parent
+        pydf_file_path = current_dir / "test_data" / "test_open_pydf_mmap.pydf"
+        lol = [[irow, f"name {irow}", irow * 0.5, irow % 2 == 0, '' if irow == 3 else irow] for irow in range(2500)]
+        my_pydf = Pydf(lol=lol, cols=['ID', 'Name', 'Amount', 'Even', 'Sparse'], keyfield='ID')
+        my_pydf.to_pydf_file(str(pydf_file_path))
+        try:
+            mapped_pydf = Pydf.open_pydf_mmap(str(pydf_file_path))
+            
+            self.assertEqual(len(mapped_pydf), 2500)
+            self.assertEqual(mapped_pydf.lol, lol)
+            self.assertEqual(mapped_pydf.lol[-1], lol[-1])
+            self.assertEqual(mapped_pydf.kd, my_pydf.kd)
+            self.assertEqual(mapped_pydf.select_irows(slice(10, 12)).lol, lol[10:12])
+            
+            amount_npa = mapped_pydf.col_to_npa('Amount')
+            self.assertIsInstance(amount_npa, np.ndarray)
+            self.assertFalse(amount_npa.flags.writeable)
+            
+            self.assertEqual(mapped_pydf.col('Amount'), my_pydf.col('Amount'))
+            self.assertEqual(mapped_pydf.col('Sparse', omit_nulls=True), my_pydf.col('Sparse', omit_nulls=True))
+            self.assertEqual(mapped_pydf.sum_np(['ID', 'Amount']), {'ID': 3123750, 'Amount': 1561875.0})
+            self.assertEqual(mapped_pydf.to_numpy().shape, (2500, 5))
+            
+            # assigning to a mapped column copies it, and does not change the file.
+            written_pydf = Pydf.open_pydf_mmap(str(pydf_file_path))
+            written_pydf[0, 'Amount'] = 7.5
+            written_pydf.lol[1][0] = 'one'
+            self.assertEqual(written_pydf.lol[:2], [[0, 'name 0', 7.5, True, 0], ['one', 'name 1', 0.5, False, 1]])
+            self.assertEqual(Pydf.open_pydf_mmap(str(pydf_file_path)).lol[:2], lol[:2])
+            
+            partial_pydf = Pydf.open_pydf_mmap(str(pydf_file_path), include_cols=['Amount'])
+            self.assertEqual(partial_pydf.to_numpy()[:2].tolist(), [[0.0], [0.5]])
+            self.assertEqual(partial_pydf.keyfield, '')
+            self.assertEqual(partial_pydf.kd, {})
+            del mapped_pydf, written_pydf, partial_pydf, amount_npa
+        finally:
+            os.remove(pydf_file_path)
+
+    def test_pickle_round_trip(self):
+        lol = [[irow, f"name {irow}", ['A', 'B', 'C'][irow % 3], irow * 0.5, [irow]] for irow in range(300)]
+        my_pydf = Pydf(lol=lol, cols=['ID', 'Name', 'Group', 'Amount', 'Obj'], keyfield='ID', name='people')
+        my_pydf.dtypes = {'ID': int, 'Name': str, 'Group': str, 'Amount': float}
+        
+        for protocol in [2, pickle.HIGHEST_PROTOCOL]:
+            read_pydf = pickle.loads(pickle.dumps(my_pydf, protocol=protocol))
+            self.assertEqual(read_pydf, my_pydf)
+            self.assertEqual(read_pydf.kd, my_pydf.kd)
+            self.assertEqual(read_pydf.dtypes, my_pydf.dtypes)
+            self.assertEqual(read_pydf.name, 'people')
+            # repeated str values share one object.
+            self.assertIs(read_pydf.lol[0][2], read_pydf.lol[3][2])
+            
+        self.assertNotIn('kd', pickle.dumps(my_pydf).decode('latin-1'))
+        self.assertEqual(copy.deepcopy(my_pydf), my_pydf)
+
+    def test_pickle_columns_lol_out_of_band(self):
+        current_dir = Path(__file__).resolve().parent
+        pydf_file_path = current_dir / "test_data" / "test_pickle_columns_lol.pydf"
+        my_pydf = Pydf(lol=[[irow, irow * 0.5, f"name {irow}"] for irow in range(100)], cols=['ID', 'Amount', 'Name'], keyfield='ID')
+        my_pydf.to_pydf_file(str(pydf_file_path))
+        try:
+            mapped_pydf = Pydf.open_pydf_mmap(str(pydf_file_path))
+            buffers = []
+            pickled = pickle.dumps(mapped_pydf, protocol=5, buffer_callback=buffers.append)
+            read_pydf = pickle.loads(pickled, buffers=buffers)
+            del mapped_pydf
+        finally:
+            os.remove(pydf_file_path)
+            
+        self.assertEqual(len(buffers), 2)
+        self.assertLess(len(pickled), 2000)
+        self.assertEqual(read_pydf.lol, my_pydf.lol)
+        self.assertEqual(read_pydf.kd, my_pydf.kd)
+
+    def test_jsonl_file_round_trip(self):
+        current_dir = Path(__file__).resolve().parent
+        jsonl_file_path = current_dir / "test_data" / "test_jsonl_file.jsonl.gz"
+        my_pydf = Pydf(lol=[[1, 'Alice', np.int64(30), [1, 2]], [2, 'Bøb', np.float64(2.5), {'a': 1}]], 
+                        cols=['ID', 'Name', 'Value', 'Obj'])
+        try:
+            self.assertEqual(my_pydf.to_jsonl_file(str(jsonl_file_path)), str(jsonl_file_path))
+            read_pydf = Pydf.from_jsonl_file(str(jsonl_file_path), keyfield='ID')
+        finally:
+            os.remove(jsonl_file_path)
+        self.assertEqual(read_pydf.lol, [[1, 'Alice', 30, [1, 2]], [2, 'Bøb', 2.5, {'a': 1}]])
+        self.assertEqual(read_pydf.columns(), ['ID', 'Name', 'Value', 'Obj'])
+        self.assertEqual(read_pydf.kd, {1: 0, 2: 1})
+
+    def test_jsonl_new_keys_and_chunks(self):
+        jsonl_str = '{"a": 1}\n\n{"b": 2, "a": 3}\n{"a": 5, "c": 6}\n'
+        
+        chunks = list(Pydf.iter_jsonl_file(io.StringIO(jsonl_str), chunk_size=2))
+        self.assertEqual([chunk.lol for chunk in chunks], [[[1, ''], [3, 2]], [[5, '', 6]]])
+        self.assertEqual([chunk.columns() for chunk in chunks], [['a', 'b'], ['a', 'b', 'c']])
+        
+        chunks = list(Pydf.iter_jsonl_file(io.StringIO(jsonl_str), cols=['c', 'a']))
+        self.assertEqual(chunks[0].lol, [['', 1], ['', 3], [6, 5]])
+        
+        with self.assertRaises(ValueError):
+            list(Pydf.iter_jsonl_file(io.StringIO('"scalar"\n')))
+
+    def test_to_jsonl_fp_noheader(self):
+        fp = io.StringIO()
+        self.assertEqual(Pydf(lol=[[1, 'a'], [2, 'b']]).to_jsonl_fp(fp, batch_size=1), 2)
+        self.assertEqual(fp.getvalue(), '[1, "a"]\n[2, "b"]\n')
+
+    def test_sqlite_round_trip(self):
+        conn = sqlite3.connect(':memory:')
+        dtypes = {'ID': int, 'Name': str, 'Amount': float, 'Flag': bool, 'Obj': list}
+        my_pydf = Pydf(lol=[[1, 'Alice', 1.5, True, [1]], [2, 'Bob', '', False, []], [3, 'Cy', 3.0, True, [3, 4]]], 
+                        cols=list(dtypes.keys()), keyfield='ID')
+        my_pydf.dtypes = dtypes
+        
+        self.assertEqual(my_pydf.to_sqlite(conn, 'people', batch_size=2), 3)
+        self.assertEqual(conn.execute('SELECT Amount, Obj FROM people WHERE ID = 2').fetchone(), (None, '[]'))
+        schema_ls = [row[0] for row in conn.execute('SELECT sql FROM sqlite_master')]
+        self.assertIn('"Amount" REAL', schema_ls[0])
+        self.assertIn('INDEX "people_ID_idx"', schema_ls[1])
+        
+        with self.assertRaises(sqlite3.OperationalError):
+            my_pydf.to_sqlite(conn, 'people')
+        my_pydf.to_sqlite(conn, 'people', if_exists='append')
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM people').fetchone(), (6,))
+        my_pydf.to_sqlite(conn, 'people', if_exists='replace')
+        
+        read_pydf = Pydf.from_sqlite(conn, 'SELECT * FROM people', chunk_size=2, keyfield='ID', dtypes=dtypes)
+        self.assertEqual(read_pydf.lol, my_pydf.lol)
+        self.assertEqual(read_pydf.kd, {1: 0, 2: 1, 3: 2})
+        
+        chunks = list(Pydf.iter_sqlite(conn, 'SELECT ID, Name FROM people WHERE ID > ?', (1,), chunk_size=1))
+        self.assertEqual([chunk.lol for chunk in chunks], [[[2, 'Bob']], [[3, 'Cy']]])
+        self.assertEqual(chunks[0].columns(), ['ID', 'Name'])
+        
+        # a row that cannot be inserted rolls back replacing the table.
+        bad_pydf = Pydf(lol=[[4, 'Dee', 4.0, True, [4]], [5, object(), 5.0, False, []]], cols=list(dtypes.keys()))
+        bad_pydf.dtypes = dtypes
+        with self.assertRaises(sqlite3.Error):
+            bad_pydf.to_sqlite(conn, 'people', if_exists='replace')
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM people').fetchone(), (3,))
+        conn.close()
+
+    def test_columns_layout(self):
+        lol = [[1, 'a', 1.5, 'x'], [2, 'b', 2.5, 'y'], [3, 'a', 3.5, 'x']]
+        my_pydf = Pydf(lol=[row.copy() for row in lol], cols=['ID', 'Name', 'Amount', 'Tag'], keyfield='ID', layout='columns')
+        
+        self.assertEqual(my_pydf.layout, 'columns')
+        self.assertEqual(my_pydf.lol, lol)
+        self.assertEqual(my_pydf.kd, {1: 0, 2: 1, 3: 2})
+        self.assertEqual(my_pydf.num_cols(), 4)
+        self.assertEqual(my_pydf.sum(['ID', 'Amount']), {'ID': 6.0, 'Amount': 7.5})
+        self.assertEqual(my_pydf.sum_np(['ID', 'Amount']), {'ID': 6, 'Amount': 7.5})
+        self.assertEqual(my_pydf.valuecounts_for_colname('Name'), {'a': 2, 'b': 1})
+        self.assertEqual(my_pydf.col('Amount'), [1.5, 2.5, 3.5])
+        self.assertEqual(my_pydf.to_numpy()[:, 0].tolist(), ['1', '2', '3'])
+        self.assertEqual(my_pydf.col_to_npa('ID').tolist(), [1, 2, 3])
+        self.assertEqual(my_pydf.select_irows([2]).lol, [lol[2]])
+        
+    def test_columns_layout_modify(self):
+        my_pydf = Pydf(lol=[[1, 1.5, 'x'], [2, 2.5, 'y']], cols=['ID', 'Amount', 'Tag'], layout='columns')
+        
+        my_pydf[0, 'Amount'] = 9.5
+        my_pydf.lol[1][0] = ''          # does not fit array('q'), so the column becomes a list.
+        my_pydf.append({'ID': 3, 'Amount': 3.5, 'Tag': 'z'})
+        self.assertEqual(my_pydf.lol, [[1, 9.5, 'x'], ['', 2.5, 'y'], [3, 3.5, 'z']])
+        
+        with self.assertRaises(TypeError):
+            my_pydf.lol[0].append(1)
+            
+        # values keep their type, so an int or bool turns an array column into a list.
+        typed_pydf = Pydf(lol=[[1, 1.5], [2, 2.5]], cols=['ID', 'Amount'], layout='columns')
+        typed_pydf[0, 'Amount'] = 2
+        typed_pydf.lol[1][0] = True
+        typed_pydf.append({'ID': 3, 'Amount': 3})
+        self.assertEqual([list(map(type, row_la)) for row_la in typed_pydf.lol], [[int, int], [bool, float], [int, int]])
+        self.assertEqual(typed_pydf.col('ID'), [1, True, 3])
+        
+        typed_pydf.sort_by_colname('ID', reverse=True, length_priority=False)
+        self.assertEqual(typed_pydf.layout, 'rows')
+        self.assertEqual(typed_pydf.lol, [[3, 3], [1, 2], [True, 2.5]])
+        self.assertIs(type(typed_pydf.lol[0]), list)
+        
+        self.assertIs(my_pydf.set_layout('rows'), my_pydf)
+        self.assertEqual(my_pydf.layout, 'rows')
+        self.assertEqual(my_pydf.lol, [[1, 9.5, 'x'], ['', 2.5, 'y'], [3, 3.5, 'z']])
+        self.assertIs(type(my_pydf.lol[0]), list)
+        
+        with self.assertRaises(ValueError):
+            my_pydf.set_layout('diagonal')
+
+
+    def test_categorical_columns(self):
+        csv_buff = "ID,State,Amount\n1,CA,3\n2,OR,4\n3,CA,5\n4,WA,6\n5,OR,7\n"
+        dtypes = {'ID': int, 'State': Categorical, 'Amount': int}
+        
+        # in the rows layout, equal values share one object.
+        rows_pydf = Pydf.from_csv_buff(csv_buff, keyfield='ID', dtypes=dtypes)
+        self.assertIs(rows_pydf.lol[0][1], rows_pydf.lol[2][1])
+        
+        my_pydf = Pydf.from_csv_buff(csv_buff, keyfield='ID', dtypes=dtypes, layout='columns')
+        cat_col = my_pydf.lol.columns[1]
+        self.assertEqual(cat_col.categories, ['CA', 'OR', 'WA'])
+        self.assertEqual(list(cat_col.codes), [0, 1, 0, 2, 1])
+        self.assertEqual(my_pydf.lol, rows_pydf.lol)
+        
+        self.assertEqual(my_pydf.valuecounts_for_colname('State'), {'CA': 2, 'OR': 2, 'WA': 1})
+        
+        groups_dopydf = my_pydf.groupby('State')
+        self.assertEqual(list(groups_dopydf.keys()), ['CA', 'OR', 'WA'])
+        self.assertEqual(groups_dopydf['OR'].lol, [[2, 'OR', 4], [5, 'OR', 7]])
+        self.assertEqual(groups_dopydf['OR'].kd, {2: 0, 5: 1})
+        
+        self.assertEqual(my_pydf.select_by_dict({'State': 'CA'}).lol, [[1, 'CA', 3], [3, 'CA', 5]])
+        self.assertEqual(my_pydf.select_by_dict({'State': 'CA', 'Amount': 5}).lol, [[3, 'CA', 5]])
+        self.assertEqual(my_pydf.select_by_dict({'State': 'NV'}).lol, [])
+        self.assertEqual(list(my_pydf.select_by_dict({'State': 'CA'}, inverse=True).keys()), [2, 4, 5])
+        
+        # new values are added to the code table.
+        my_pydf[0, 'State'] = 'NV'
+        my_pydf.append({'ID': 6, 'State': 'CA', 'Amount': 1})
+        self.assertEqual(cat_col.categories, ['CA', 'OR', 'WA', 'NV'])
+        self.assertEqual(my_pydf.valuecounts_for_colname('State'), {'CA': 2, 'OR': 2, 'WA': 1, 'NV': 1})
+        
+        self.assertEqual(pickle.loads(pickle.dumps(my_pydf)), my_pydf)
+        self.assertEqual(my_pydf.set_layout('rows').col('State'), ['NV', 'OR', 'CA', 'WA', 'OR', 'CA'])
+
+
+    def test_intern(self):
+        csv_buff = "ID,State,Status\n1,CA,open\n2,OR,open\n3,CA,closed\n"
+        
+        my_pydf = Pydf.from_csv_buff(csv_buff, intern=True)
+        self.assertEqual(my_pydf.lol, Pydf.from_csv_buff(csv_buff).lol)
+        self.assertIs(my_pydf.lol[0][1], my_pydf.lol[2][1])
+        self.assertIs(my_pydf.lol[0][2], my_pydf.lol[1][2])
+        
+        # only the State column is interned.
+        my_pydf = Pydf.from_csv_buff(csv_buff, intern=['State'])
+        self.assertIs(my_pydf.lol[0][1], my_pydf.lol[2][1])
+        self.assertIsNot(my_pydf.lol[0][2], my_pydf.lol[1][2])
+        
+        records_lod = [{'ID': irow, 'State': ''.join(['C', 'A'])} for irow in range(3)]
+        my_pydf = Pydf.from_lod(records_lod, keyfield='ID', intern=True)
+        self.assertIs(my_pydf.lol[0][1], my_pydf.lol[2][1])
+        
+        # appended values share the intern table of the pydf.
+        my_pydf.append({'ID': 3, 'State': ''.join(['C', 'A'])}, intern=True)
+        my_pydf.append([{'ID': 4, 'State': ''.join(['C', 'A'])}], intern=['State'])
+        self.assertEqual(len(my_pydf), 5)
+        self.assertIs(my_pydf.lol[3][1], my_pydf.lol[4][1])
+        self.assertIsNot(my_pydf.lol[0][1], my_pydf.lol[3][1])
+        self.assertEqual(pickle.loads(pickle.dumps(my_pydf)), my_pydf)
+        
+        self.assertEqual(my_pydf._intern_ds, {'CA': 'CA'})
+        my_pydf.clear_intern_table()
+        self.assertEqual(my_pydf._intern_ds, {})
+        my_pydf.append({'ID': 5, 'State': ''.join(['C', 'A'])}, intern=True)
+        self.assertIsNot(my_pydf.lol[3][1], my_pydf.lol[5][1])
+        my_pydf.set_lol([])
+        self.assertEqual(my_pydf._intern_ds, {})
+
 
     def test_to_csv_file(self):
         # Determine the path to the test data directory
@@ -777,8 +1180,356 @@ class TestPydf(unittest.TestCase):
 
         # Clean up: Delete the CSV file after the test
         # os.remove(csv_file_path)
+
+
+    # to_csv_fp / iter_csv_chunks
+    def test_to_csv_fp_batches_with_flatten(self):
+        my_pydf = Pydf(lol=[[1, ['a']], [2, []], [3, ['b', 'c']]], cols=['ID', 'Tags'], dtypes={'ID': int, 'Tags': list})
+        fp = io.StringIO(newline='')
+
+        num_rows = my_pydf.to_csv_fp(fp, flatten=True, batch_size=2)
+
+        self.assertEqual(num_rows, 3)
+        self.assertEqual(fp.getvalue(), 'ID,Tags\r\n1,"[""a""]"\r\n2,[]\r\n3,"[""b"", ""c""]"\r\n')
+        self.assertEqual(my_pydf.lol[0], [1, ['a']])
+
+    def test_iter_csv_chunks(self):
+        my_pydf = Pydf(lol=[[1, 'John'], [2, 'Alice'], [3, 'Bob']], cols=['ID', 'Name'])
+
+        chunks = list(my_pydf.iter_csv_chunks(batch_size=2))
+
+        self.assertEqual(chunks, [b'ID,Name\r\n1,John\r\n2,Alice\r\n', b'3,Bob\r\n'])
+        self.assertEqual(b''.join(chunks).decode('utf-8'), my_pydf.to_csv_buff())
+
+    def test_iter_csv_chunks_empty(self):
+        my_pydf = Pydf(cols=['ID', 'Name'])
+        self.assertEqual(list(my_pydf.iter_csv_chunks(encoding=None)), ['ID,Name\r\n'])
+
+
+    # from_csv_buff
+    def test_from_csv_buff_with_dtypes(self):
+        csv_buff = 'ID,Score,Flag,Tags,Attrs\r\n1,2.5,yes,"[1, 2]","{""a"": 1}"\r\n2,,0,[],{}\r\n3.0,x,True,"[\'z\']",\r\n'
+        dtypes = {'ID': int, 'Score': float, 'Flag': bool, 'Tags': list, 'Attrs': dict}
+
+        my_pydf = Pydf.from_csv_buff(csv_buff, keyfield='ID', dtypes=dtypes)
+
+        self.assertEqual(my_pydf.lol, [
+            [1, 2.5, True,  [1, 2], {'a': 1}],
+            [2, '',  False, [],     {}],
+            [3, '',  True,  ['z'],  ''],
+            ])
+        self.assertEqual(my_pydf.dtypes, dtypes)
+        self.assertEqual(my_pydf.kd, {1: 0, 2: 1, 3: 2})
+
+    def test_from_csv_buff_with_dtypes_no_unflatten(self):
+        csv_buff = 'ID,Tags\r\n1,"[1, 2]"\r\n'
+        my_pydf = Pydf.from_csv_buff(csv_buff, dtypes={'ID': int, 'Tags': list}, unflatten=False)
+        self.assertEqual(my_pydf.lol, [[1, '[1, 2]']])
+
+    def test_from_csv_buff_with_dtypes_noheader_ragged(self):
+        csv_buff = '1,2.5,a\r\n2\r\n'
+        my_pydf = Pydf.from_csv_buff(csv_buff, noheader=True, dtypes={'ID': int, 'Score': float, 'Name': str})
+        self.assertEqual(my_pydf.columns(), ['ID', 'Score', 'Name'])
+        self.assertEqual(my_pydf.lol, [[1, 2.5, 'a'], [2]])
+
+    def test_from_csv_buff_include_cols(self):
+        csv_buff = 'ID,Name,Age,Tags\r\n1,John,30,[1]\r\n2,Alice,25\r\n'
+        dtypes = {'ID': int, 'Name': str, 'Age': int, 'Tags': list}
+
+        my_pydf = Pydf.from_csv_buff(csv_buff, keyfield='ID', dtypes=dtypes, include_cols=['Tags', 'ID', 'Missing'])
+
+        self.assertEqual(my_pydf.columns(), ['Tags', 'ID'])
+        self.assertEqual(my_pydf.lol, [[[1], 1], ['', 2]])
+        self.assertEqual(my_pydf.kd, {1: 0, 2: 1})
+
+    def test_from_csv_buff_include_one_col(self):
+        csv_buff = 'ID,Name,Age\r\n1,John,30\r\n2,Alice,25\r\n'
+        my_pydf = Pydf.from_csv_buff(csv_buff, include_cols=['Age'])
+        self.assertEqual(my_pydf.columns(), ['Age'])
+        self.assertEqual(my_pydf.lol, [['30'], ['25']])
+
+    # CSVJ
+    def test_to_csv_buff_csvj_round_trip(self):
+        dtypes = {'ID': int, 'Score': float, 'Flag': bool, 'Tags': list, 'Attrs': dict, 'Name': str}
+        lol = [
+            [1, 2.5, True,  ['a', 'b'], {'x': 1}, 'John, Jr.'],
+            [2, '',  False, [],         {},       'Alice'],
+            ]
+        src_pydf = Pydf(lol=lol, cols=list(dtypes.keys()), dtypes=dtypes, keyfield='ID', name='people')
+
+        csv_buff = src_pydf.to_csv_buff(csvj=True)
+
+        self.assertTrue(csv_buff.startswith('#{"csvj": 1, '))
+        self.assertIn('"num_rows": 2', csv_buff.splitlines()[0])
+        self.assertEqual(src_pydf.lol[0][3], ['a', 'b'])      # source is not flattened.
+
+        my_pydf = Pydf.from_csv_buff(csv_buff)
+
+        self.assertEqual(my_pydf.lol, lol)
+        self.assertEqual(my_pydf.dtypes, dtypes)
+        self.assertEqual(my_pydf.keyfield, 'ID')
+        self.assertEqual(my_pydf.name, 'people')
+        self.assertEqual(my_pydf.kd, {1: 0, 2: 1})
+        
+        # the CSVJ header section does not name the columns, so the header row is required.
+        with self.assertRaises(ValueError):
+            src_pydf.to_csv_buff(csvj=True, include_header=False)
+        with self.assertRaises(ValueError):
+            list(src_pydf.iter_csv_chunks(csvj=True, include_header=False))
+        with self.assertRaises(ValueError):
+            src_pydf.to_csv_file('unused.csv', csvj=True, include_header=False)
+        self.assertFalse(os.path.exists('unused.csv'))
+
+    def test_from_csv_buff_csvj_multiline_header(self):
+        csv_buff = '#{"csvj": 1,\r\n# "dtypes": {"ID": "int", "Name": "str"}}\r\nID,Name\r\n1,John\r\n'
+        my_pydf = Pydf.from_csv_buff(csv_buff, keyfield='Name')
+        self.assertEqual(my_pydf.lol, [[1, 'John']])
+        self.assertEqual(my_pydf.keyfield, 'Name')
+
+    def test_from_csv_buff_comment_not_csvj(self):
+        csv_buff = '# not json\r\nID,Name\r\n1,John\r\n'
+        my_pydf = Pydf.from_csv_buff(csv_buff, user_format=True)
+        self.assertEqual(my_pydf.columns(), ['ID', 'Name'])
+        self.assertEqual(my_pydf.lol, [['1', 'John']])
+
+
+    # from_csv_file
+    def test_csv_record_boundaries_quoted_newlines(self):
+        from Pydf import pydf_csv
+
+        buff = b'1,"a\nb\nc\nd\ne\nf"\n2,x\n3,"""q""\ny"\n4,z\n'
+        boundaries = pydf_csv.csv_record_boundaries(buff, 4)
+
+        self.assertEqual(boundaries[0], 0)
+        self.assertEqual(boundaries[-1], len(buff))
+        self.assertEqual(boundaries, sorted(set(boundaries)))
+        lol = []
+        for start, end in zip(boundaries, boundaries[1:]):
+            lol.extend(Pydf.from_csv_buff(buff[start:end], noheader=True).lol)
+        self.assertEqual(lol, [['1', 'a\nb\nc\nd\ne\nf'], ['2', 'x'], ['3', '"q"\ny'], ['4', 'z']])
+
+    def test_from_csv_file_workers(self):
+        current_dir = Path(__file__).resolve().parent
+        csv_file_path = current_dir / "test_data" / "test_from_csv_file_workers.csv"
+        lol = [[irow, f"name {irow}\nline \"{irow}\"", irow * 0.5, [irow]] for irow in range(200)]
+        dtypes = {'ID': int, 'Name': str, 'Score': float, 'Tags': list}
+        Pydf(lol=lol, cols=list(dtypes.keys()), dtypes=dtypes, keyfield='ID').to_csv_file(str(csv_file_path), csvj=True)
+
+        try:
+            single_pydf = Pydf.from_csv_file(str(csv_file_path))
+            multi_pydf = Pydf.from_csv_file(str(csv_file_path), workers=3, include_cols=['ID', 'Tags', 'Name'])
+        finally:
+            os.remove(csv_file_path)
+
+        self.assertEqual(single_pydf.lol, lol)
+        self.assertEqual(multi_pydf.columns(), ['ID', 'Tags', 'Name'])
+        self.assertEqual(multi_pydf.lol, [[la[0], la[3], la[1]] for la in lol])
+        self.assertEqual(multi_pydf.keyfield, 'ID')
+        self.assertEqual(multi_pydf.kd[199], 199)
+
+    def test_from_csv_file_workers_leading_comment(self):
+        current_dir = Path(__file__).resolve().parent
+        csv_file_path = current_dir / "test_data" / "test_from_csv_file_comment.csv"
+        with open(csv_file_path, 'w', newline='') as fp:
+            fp.write('# comment\r\nID,S\r\n' + ''.join(f'{irow},s{irow}\r\n' for irow in range(2000)))
+
+        # the result does not depend on workers: a comment line which is not CSVJ is data unless user_format.
+        try:
+            for user_format in [False, True]:
+                single_pydf = Pydf.from_csv_file(str(csv_file_path), workers=1, user_format=user_format)
+                multi_pydf = Pydf.from_csv_file(str(csv_file_path), workers=2, user_format=user_format)
+                self.assertEqual(multi_pydf.columns(), single_pydf.columns())
+                self.assertEqual(multi_pydf.lol, single_pydf.lol)
+                self.assertEqual(len(single_pydf), 2000 if user_format else 2001)
+            self.assertEqual(single_pydf.columns(), ['ID', 'S'])
+            with Pydf.open_csv_mmap(str(csv_file_path)) as mapped_pydf:
+                self.assertEqual(mapped_pydf.columns(), ['# comment'])
+        finally:
+            os.remove(csv_file_path)
+
+
+    def test_csv_file_compressed(self):
+        import gzip
+
+        current_dir = Path(__file__).resolve().parent
+        lol = [[irow, f"name {irow}", [irow]] for irow in range(50)]
+        dtypes = {'ID': int, 'Name': str, 'Tags': list}
+        src_pydf = Pydf(lol=lol, cols=list(dtypes.keys()), dtypes=dtypes, keyfield='ID')
+
+        for ext in ['.gz', '.bz2', '.xz']:
+            csv_file_path = str(current_dir / "test_data" / f"test_compressed.csv{ext}")
+            try:
+                src_pydf.to_csv_file(csv_file_path, csvj=True, batch_size=7)
+
+                my_pydf = Pydf.from_csv_file(csv_file_path, workers=2)
+                self.assertEqual(my_pydf.lol, lol)
+                self.assertEqual(my_pydf.kd[49], 49)
+
+                chunks = list(Pydf.iter_csv_file(csv_file_path, chunk_size=20))
+                self.assertEqual([len(chunk) for chunk in chunks], [20, 20, 10])
+                self.assertEqual(chunks[2].lol, lol[40:])
+            finally:
+                os.remove(csv_file_path)
+
+        csv_file_path = str(current_dir / "test_data" / "test_compressed.dat")
+        try:
+            src_pydf.to_csv_file(csv_file_path, compression='gzip')
+            with gzip.open(csv_file_path, 'rt', newline='') as fp:
+                self.assertEqual(fp.readline(), 'ID,Name,Tags\r\n')
+            my_pydf = Pydf.from_csv_file(csv_file_path, compression='gzip', dtypes={'ID': int})
+            self.assertEqual(my_pydf.lol[49], [49, 'name 49', '[49]'])
+        finally:
+            os.remove(csv_file_path)
+
+        # an already compressed buff is written as given, not compressed again.
+        gz_file_path = str(current_dir / "test_data" / "test_compressed_buff.csv.gz")
+        gz_buff = gzip.compress(b'ID\r\n1\r\n')
+        try:
+            utils.write_buff_to_fp(gz_buff, gz_file_path, rtype='binary')
+            with gzip.open(gz_file_path, 'rb') as fp:
+                self.assertEqual(fp.read(), b'ID\r\n1\r\n')
+        finally:
+            os.remove(gz_file_path)
+
+
+    # open_csv_mmap
+    def test_open_csv_mmap(self):
+        current_dir = Path(__file__).resolve().parent
+        csv_file_path = current_dir / "test_data" / "test_open_csv_mmap.csv"
+        index_path = str(csv_file_path) + '.rowidx'
+        lol = [[irow, f"name {irow}\nline \"{irow}\"", [irow]] for irow in range(2500)]
+        dtypes = {'ID': int, 'Name': str, 'Tags': list}
+        Pydf(lol=lol, cols=list(dtypes.keys()), dtypes=dtypes).to_csv_file(str(csv_file_path), csvj=True)
+
+        try:
+            my_pydf = Pydf.open_csv_mmap(str(csv_file_path), save_index=True)
+
+            self.assertEqual(len(my_pydf), 2500)
+            self.assertEqual(my_pydf.columns(), ['ID', 'Name', 'Tags'])
+            self.assertEqual(my_pydf.dtypes, dtypes)
+            self.assertEqual(my_pydf.lol[1234], lol[1234])
+            self.assertEqual(my_pydf.lol[-1], lol[-1])
+            self.assertEqual(my_pydf.select_irows([3, 2000]).lol, [lol[3], lol[2000]])
+            self.assertEqual(my_pydf.select_irows(slice(10, 12)).lol, lol[10:12])
+            self.assertEqual(my_pydf.lol.materialize(), lol)
+            self.assertEqual(next(iter(my_pydf)), {'ID': 0, 'Name': lol[0][1], 'Tags': [0]})
+            self.assertTrue(os.path.exists(index_path))
+
+            # reopen using the saved index.
+            reopened_pydf = Pydf.open_csv_mmap(str(csv_file_path))
+            self.assertEqual(reopened_pydf.lol.offsets, my_pydf.lol.offsets)
+            self.assertEqual(reopened_pydf.lol[2499], lol[2499])
+            my_pydf.lol.close()
+            reopened_pydf.lol.close()
+        finally:
+            os.remove(csv_file_path)
+            os.remove(index_path)
+
+    def test_open_csv_mmap_no_trailing_newline(self):
+        current_dir = Path(__file__).resolve().parent
+        csv_file_path = current_dir / "test_data" / "test_open_csv_mmap_2.csv"
+        with open(csv_file_path, 'w', newline='') as fp:
+            fp.write('ID,Name\n1,John\n2,"Alice\nB"')
+
+        try:
+            my_pydf = Pydf.open_csv_mmap(str(csv_file_path))
+            self.assertEqual(my_pydf.lol.materialize(), [['1', 'John'], ['2', 'Alice\nB']])
+            my_pydf.lol.close()
+        finally:
+            os.remove(csv_file_path)
+
+    def test_open_csv_mmap_blank_lines_and_close(self):
+        current_dir = Path(__file__).resolve().parent
+        csv_file_path = current_dir / "test_data" / "test_open_csv_mmap_3.csv"
+        with open(csv_file_path, 'w', newline='') as fp:
+            fp.write('ID,Name\r\n\r\n1,John\r\n\r\n\r\n2,"Al\r\n\r\nice"\n\n3,Bob\r\n\r\n')
+
+        try:
+            with Pydf.open_csv_mmap(str(csv_file_path), dtypes={'ID': int, 'Name': str}) as my_pydf:
+                self.assertEqual(len(my_pydf), 3)
+                self.assertEqual(my_pydf.lol.materialize(), [[1, 'John'], [2, 'Al\r\n\r\nice'], [3, 'Bob']])
+                self.assertEqual(my_pydf.lol[0], [1, 'John'])
+                self.assertEqual(my_pydf.select_irows(slice(1, 3)).lol, [[2, 'Al\r\n\r\nice'], [3, 'Bob']])
+                
+                # rows are parsed again when accessed, so changes would be lost.
+                with self.assertRaises(TypeError):
+                    my_pydf[0, 'Name'] = 'Jack'
+                with self.assertRaises(TypeError):
+                    my_pydf.lol[0].append('x')
+                with self.assertRaises(TypeError):
+                    my_pydf.lol[0] = [1, 'Jack']
+                with self.assertRaises(TypeError):
+                    my_pydf.lol[0:1][0][1] = 'Jack'
+                self.assertEqual(my_pydf.lol[0], [1, 'John'])
+                
+                # selected rows are copies, which can be modified.
+                view_pydf = my_pydf.select_irows([0, 2])
+                view_pydf[0, 'Name'] = 'Jack'
+                self.assertEqual(view_pydf.lol, [[1, 'Jack'], [3, 'Bob']])
+                slice_pydf = my_pydf.select_irows(slice(0, 2))
+                slice_pydf[0, 'Name'] = 'Jill'
+                self.assertEqual(slice_pydf.lol[0], [1, 'Jill'])
+                
+                csv_mmap_lol = my_pydf.lol
+            self.assertTrue(csv_mmap_lol._fp.closed)
+            
+            csv_mmap_lol = Pydf.open_csv_mmap(str(csv_file_path)).lol
+            fp = csv_mmap_lol._fp
+            del csv_mmap_lol
+            self.assertTrue(fp.closed)
+        finally:
+            os.remove(csv_file_path)
+
+
+    # iter_csv_file
+    def test_iter_csv_file_chunks(self):
+        csv_buff = 'ID,Name,Age\r\n1,John,30\r\n2,Alice,25\r\n3,"Bob\nJr.",35\r\n4,Carol,40\r\n5,Dan,45\r\n'
+        dtypes = {'ID': int, 'Name': str, 'Age': int}
+
+        chunks = list(Pydf.iter_csv_file(io.StringIO(csv_buff, newline=''), chunk_size=2, keyfield='ID', dtypes=dtypes))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        for chunk in chunks:
+            self.assertEqual(chunk.columns(), ['ID', 'Name', 'Age'])
+            self.assertEqual(chunk.dtypes, dtypes)
+        self.assertEqual(chunks[1].lol, [[3, 'Bob\nJr.', 35], [4, 'Carol', 40]])
+        self.assertEqual(chunks[1].kd, {3: 0, 4: 1})
+
+    def test_iter_csv_file_binary_fp_left_open(self):
+        import gc
         
+        fp = io.BytesIO(b'ID,Name\r\n1,John\r\n2,Alice\r\n')
+        chunks = list(Pydf.iter_csv_file(fp, chunk_size=1))
+        gc.collect()
         
+        self.assertEqual([chunk.lol for chunk in chunks], [[['1', 'John']], [['2', 'Alice']]])
+        self.assertFalse(fp.closed)
+
+    def test_iter_csv_file_noheader(self):
+        csv_buff = '1,John\r\n2,Alice\r\n3,Bob\r\n'
+
+        chunks = list(Pydf.iter_csv_file(io.StringIO(csv_buff, newline=''), chunk_size=2, noheader=True))
+
+        self.assertEqual([chunk.lol for chunk in chunks], [[['1', 'John'], ['2', 'Alice']], [['3', 'Bob']]])
+        self.assertEqual(chunks[0].columns(), [])
+
+    def test_iter_csv_file_header_only(self):
+        chunks = list(Pydf.iter_csv_file(io.StringIO('ID,Name\r\n', newline=''), chunk_size=2))
+        self.assertEqual(chunks, [])
+
+    def test_iter_csv_file_path(self):
+        current_dir = Path(__file__).resolve().parent
+        csv_file_path = current_dir / "test_data" / "test_iter_output.csv"
+        Pydf(cols=['ID', 'Name'], lol=[[1, 'John'], [2, 'Alice'], [3, 'Bob']]).to_csv_file(file_path=str(csv_file_path))
+
+        result_pydf = Pydf()
+        for chunk in Pydf.iter_csv_file(str(csv_file_path), chunk_size=2, dtypes={'ID': int, 'Name': str}):
+            result_pydf.append(chunk)
+
+        self.assertEqual(result_pydf.lol, [[1, 'John'], [2, 'Alice'], [3, 'Bob']])
+        os.remove(csv_file_path)
+
+
     # from_pandas_df
     def test_from_pandas_df_with_dataframe(self):
         # Mock a Pandas DataFrame with various data types
@@ -1334,6 +2085,165 @@ class TestPydf(unittest.TestCase):
             pydf.remove_key(keyval, silent_error=False)
 
 
+    def test_kd_incremental(self):
+        pydf = Pydf(cols=['ID', 'Name'], lol=[[1, 'a'], [2, 'b'], [3, 'c']], keyfield='ID')
+        
+        pydf.concat(Pydf(cols=['ID', 'Name'], lol=[[4, 'd'], [2, 'e']], keyfield='ID'))
+        self.assertEqual(pydf.kd, {1: 0, 2: 4, 3: 2, 4: 3})
+        
+        pydf = Pydf(cols=['ID', 'Name'], lol=[[1, 'a'], [2, 'b'], [3, 'c']], keyfield='ID')
+        pydf.insert_irow(1, [5, 'e'])
+        self.assertEqual(pydf.kd, {1: 0, 5: 1, 2: 2, 3: 3})
+        
+        new_pydf = pydf.remove_keylist([5, 3])
+        self.assertEqual(new_pydf.lol, [[1, 'a'], [2, 'b']])
+        self.assertEqual(new_pydf.kd, {1: 0, 2: 1})
+        self.assertEqual(pydf.kd, {1: 0, 5: 1, 2: 2, 3: 3})
+        
+        pydf.apply_in_place(lambda row_da: {**row_da, 'ID': row_da['ID'] * 10})
+        self.assertEqual(pydf.kd, {10: 0, 50: 1, 20: 2, 30: 3})
+
+        # the row dict modified in place and returned.
+        pydf.apply_in_place(lambda row_da: (row_da.update(ID=row_da['ID'] + 1), row_da)[1])
+        self.assertEqual(pydf.kd, {11: 0, 51: 1, 21: 2, 31: 3})
+        self.assertEqual(pydf.select_krows(krows=[51]).lol, [[51, 'e']])
+
+    def test_kd_lazy(self):
+        pydf = Pydf(cols=['ID', 'Name'], lol=[[1, 'a'], [2, 'b'], [3, 'c']], keyfield='ID')
+        self.assertIsNone(pydf._kd)
+
+        view_pydf = pydf.select_irows([0, 2]).select_where(lambda row: row['Name'] != 'a')
+        self.assertIsNone(view_pydf._kd)
+        self.assertEqual(view_pydf.row_idx_of(3), 0)
+        self.assertEqual(view_pydf._kd, {3: 0})
+
+        pydf.concat(Pydf(cols=['ID', 'Name'], lol=[[4, 'd']], keyfield='ID'))
+        self.assertIsNone(pydf._kd)
+        self.assertEqual(pydf.select_krows(4).lol, [[4, 'd']])
+        pydf.append({'ID': 5, 'Name': 'e'})
+        self.assertEqual(pydf._kd, {1: 0, 2: 1, 3: 2, 4: 3, 5: 4})
+
+        pydf.sort_by_colname('Name', reverse=True)
+        self.assertIsNone(pydf._kd)
+        self.assertEqual(pydf.kd, {5: 0, 4: 1, 3: 2, 2: 3, 1: 4})
+
+    def test_composite_keyfield(self):
+        cols = ['region', 'account', 'day', 'amount']
+        pydf = Pydf(cols=cols, keyfield=('region', 'account', 'day'),
+                    lol=[['east', 'a1', 1, 10], ['east', 'a1', 2, 20], ['west', 'a1', 1, 30]])
+        self.assertEqual(pydf.kd, {('east', 'a1', 1): 0, ('east', 'a1', 2): 1, ('west', 'a1', 1): 2})
+
+        self.assertEqual(pydf.select_krows(('east', 'a1', 2)).lol, [['east', 'a1', 2, 20]])
+        self.assertEqual(pydf.select_krows([('west', 'a1', 1), ('east', 'a1', 1)]).lol, [['west', 'a1', 1, 30], ['east', 'a1', 1, 10]])
+        self.assertEqual(pydf[('east', 'a1', 2), 'amount'].to_value(), 20)
+        self.assertEqual(pydf.remove_key(('east', 'a1', 1)).kd, {('east', 'a1', 2): 0, ('west', 'a1', 1): 1})
+
+        pydf.record_append({'region': 'east', 'account': 'a1', 'day': 2, 'amount': 25})
+        pydf.record_append({'region': 'west', 'account': 'a2', 'day': 1, 'amount': 40})
+        self.assertEqual(pydf.lol[1], ['east', 'a1', 2, 25])
+        self.assertEqual(pydf.kd[('west', 'a2', 1)], 3)
+
+        pydf[('west', 'a2', 1), 'amount'] = 45
+        self.assertEqual(pydf.lol[3], ['west', 'a2', 1, 45])
+
+        pydf.rename_cols({'day': 'date'})
+        self.assertEqual(pydf.keyfield, ('region', 'account', 'date'))
+        self.assertEqual(pydf.select_kcols(['region', 'account', 'date']).keyfield, ('region', 'account', 'date'))
+        self.assertEqual(pydf.select_kcols(['region', 'amount']).keyfield, '')
+
+        pydf.set_keyfield(['account', 'region'])
+        self.assertEqual(pydf.kd, {('a1', 'east'): 1, ('a1', 'west'): 2, ('a2', 'west'): 3})
+
+    def test_composite_keyfield_of_two_cols(self):
+        pydf = Pydf(cols=['R', 'Acc', 'amount'], keyfield=('R', 'Acc'), lol=[['e', 'a', 1], ['w', 'b', 2]])
+        
+        # a key of two columns is given with a column spec, as pydf[a, b] is always (row, col).
+        self.assertEqual(pydf[('w', 'b'), :].lol, [['w', 'b', 2]])
+        self.assertEqual(pydf[('w', 'b'), 'amount'].to_value(), 2)
+        pydf[('w', 'b'), :] = ['w', 'b', 3]
+        self.assertEqual(pydf.lol, [['e', 'a', 1], ['w', 'b', 3]])
+        self.assertEqual(pydf[1, 'amount'].to_value(), 3)
+        
+        # the meaning does not depend on whether the key is in the pydf.
+        with self.assertRaises(KeyError):
+            pydf[('w', 'b')]
+        with self.assertRaises(KeyError):
+            pydf[('x', 'y')] = ['x', 'y', 4]
+
+    def test_create_index(self):
+        pydf = Pydf(cols=['ID', 'status', 'account'], keyfield='ID',
+                    lol=[[1, 'open', 'x'], [2, 'closed', 'y'], [3, 'open', 'y']])
+        pydf.create_index('status')
+        self.assertEqual(pydf.indexes, {'status': {'open': [0, 2], 'closed': [1]}})
+
+        pydf.append({'ID': 4, 'status': 'open', 'account': 'x'})
+        pydf[1, 'status'] = 'open'
+        pydf.record_append({'ID': 3, 'status': 'hold', 'account': 'y'})
+        self.assertEqual(pydf.indexes, {'status': {'open': [0, 1, 3], 'hold': [2]}})
+
+        self.assertEqual(pydf.select_by_dict({'status': 'open', 'account': 'x'}).lol, [[1, 'open', 'x'], [4, 'open', 'x']])
+        self.assertEqual(pydf.select_by_dict({'status': 'open'}, inverse=True).lol, [[3, 'hold', 'y']])
+        self.assertEqual(pydf.select_by_dict({'status': 'none'}).lol, [])
+        self.assertEqual(pydf.select_first_row_by_dict({'status': 'open', 'account': 'y'}), {'ID': 2, 'status': 'open', 'account': 'y'})
+        self.assertEqual(pydf.valuecounts_for_colname_selectedby_colname('account', 'status', 'open'), {'x': 2, 'y': 1})
+
+        new_pydf = pydf.remove_key(1)
+        self.assertEqual(new_pydf.select_by_dict({'status': 'open'}).lol, [[2, 'open', 'y'], [4, 'open', 'x']])
+        self.assertEqual(new_pydf.indexes, {'status': {'open': [0, 2], 'hold': [1]}})
+
+        pydf.insert_irow(0, [5, 'hold', 'z'])
+        self.assertEqual(pydf.select_by_dict({'status': 'hold'}).lol, [[5, 'hold', 'z'], [3, 'hold', 'y']])
+
+        pydf.drop_index('status')
+        self.assertEqual(pydf.indexes, {})
+
+    def test_select_by_range(self):
+        pydf = Pydf(cols=['ID', 'ts'], keyfield='ID', lol=[[1, 30], [2, 10], [3, 20], [4, 10]])
+        self.assertEqual(pydf.select_by_range('ts', 10, 30).lol, [[2, 10], [3, 20], [4, 10]])
+
+        pydf.create_index('ts', kind='sorted')
+        self.assertEqual(pydf.indexes['ts'].keys, [10, 10, 20, 30])
+        self.assertEqual(pydf.indexes['ts'].irows, [1, 3, 2, 0])
+        self.assertEqual(pydf.select_by_range('ts', 10, 30).lol, [[2, 10], [3, 20], [4, 10]])
+        self.assertEqual(pydf.select_by_range('ts', 20, 30, include_stop=True).lol, [[1, 30], [3, 20]])
+        self.assertEqual(pydf.select_by_range('ts', stop=20).lol, [[2, 10], [4, 10]])
+
+        for i in range(5, 305):
+            pydf.append({'ID': i, 'ts': i})
+        pydf[0, 'ts'] = 15
+        self.assertEqual(pydf.select_by_range('ts', 12, 28).lol, [[1, 15], [3, 20]] + [[i, i] for i in range(12, 28)])
+        self.assertEqual(pydf.select_by_dict({'ts': 10}).lol, [[2, 10], [4, 10], [10, 10]])
+        self.assertEqual(len(pydf.indexes['ts']), 304)
+
+        new_pydf = pydf.remove_key(2)
+        self.assertEqual(new_pydf.select_by_range('ts', 10, 12).lol, [[4, 10], [10, 10], [11, 11]])
+
+        # values which are not comparable, like the default fill '', are not in any range.
+        pydf.append({'ID': 305})
+        pydf[1, 'ts'] = None
+        self.assertEqual(pydf.indexes['ts'].unordered, {1: None, 304: ''})
+        self.assertEqual(pydf.select_by_range('ts', 9, 11).lol, [[4, 10], [9, 9], [10, 10]])
+        self.assertEqual(pydf.select_by_dict({'ts': ''}).lol, [[305, '']])
+        pydf[304, 'ts'] = 5
+        self.assertEqual(pydf.select_by_range('ts', stop=6).lol, [[5, 5], [305, 5]])
+        
+        unindexed_pydf = Pydf(cols=['ID', 'ts'], keyfield='ID', lol=[[1, ''], [2, 10], [3, None], [4, 20]])
+        self.assertEqual(unindexed_pydf.select_by_range('ts', 10).lol, [[2, 10], [4, 20]])
+        unindexed_pydf.create_index('ts', kind='sorted')
+        self.assertEqual(unindexed_pydf.indexes['ts'].keys, [10, 20])
+        self.assertEqual(unindexed_pydf.select_by_range('ts', 10).lol, [[2, 10], [4, 20]])
+        
+        # creating an index does not change the results for a column of mixed types.
+        mixed_pydf = Pydf(cols=['ID', 'V'], keyfield='ID', lol=[[1, 5], [2, 'x'], [3, 7], [4, '']])
+        for create_index in [False, True]:
+            if create_index:
+                mixed_pydf.create_index('V', kind='sorted')
+            self.assertEqual(mixed_pydf.select_by_range('V', 'a', 'z').lol, [[2, 'x']])
+            self.assertEqual(mixed_pydf.select_by_range('V', stop='z').lol, [[2, 'x'], [4, '']])
+            self.assertEqual(mixed_pydf.select_by_range('V', 1, 6).lol, [[1, 5]])
+            self.assertEqual(mixed_pydf.select_by_range('V', 1, 'z').lol, [])
+            self.assertEqual(mixed_pydf.select_by_dict({'V': 'x'}).lol, [[2, 'x']])
+
     # remove_keylist
     def test_remove_keylist_existing_keys(self):
         cols = ['col1', 'col2']
@@ -1383,6 +2293,54 @@ class TestPydf(unittest.TestCase):
         with self.assertRaises(KeyError):
             pydf.remove_keylist(keylist, silent_error=False)
 
+    def test_select_irows_copy_on_write(self):
+        my_pydf = Pydf(lol=[[1, 'a', 10], [2, 'b', 20], [3, 'c', 30]], cols=['ID', 'Tag', 'Amount'], keyfield='ID')
+        
+        view_pydf = my_pydf.select_irows([0, 2])
+        other_view_pydf = my_pydf.select_krows(krows=[1, 3])
+        self.assertIs(view_pydf.lol[1], my_pydf.lol[2])
+        
+        # writing through the view copies the row first.
+        view_pydf[1, 'Amount'] = 99
+        self.assertEqual(view_pydf.lol, [[1, 'a', 10], [3, 'c', 99]])
+        self.assertEqual(my_pydf.lol[2], [3, 'c', 30])
+        self.assertEqual(other_view_pydf.lol[1], [3, 'c', 30])
+        
+        # writing to the original does not change the views.
+        my_pydf.update_record_da_irow(0, {'Tag': 'z'})
+        my_pydf.set_icol(2, 0)
+        self.assertEqual(my_pydf.lol, [[1, 'z', 0], [2, 'b', 0], [3, 'c', 0]])
+        self.assertEqual(view_pydf.lol, [[1, 'a', 10], [3, 'c', 99]])
+        self.assertEqual(other_view_pydf.lol, [[1, 'a', 10], [3, 'c', 30]])
+        
+        other_view_pydf.insert_icol(icol=1, col_la=['x', 'y'], colname='Code')
+        other_view_pydf.apply_in_place(lambda row_da: {**row_da, 'Tag': 'q'})
+        self.assertEqual(other_view_pydf.lol, [[1, 'x', 'q', 10], [3, 'y', 'q', 30]])
+        self.assertEqual(view_pydf.lol, [[1, 'a', 10], [3, 'c', 99]])
+        self.assertEqual(my_pydf.lol, [[1, 'z', 0], [2, 'b', 0], [3, 'c', 0]])
+        
+    def test_select_irows_copy_on_write_released(self):
+        import gc
+        
+        source_pydf = Pydf(lol=[[1, 'a'], [2, 'b'], [3, 'c']], cols=['ID', 'Tag'], keyfield='ID')
+        view_pydf = source_pydf.select_irows([0, 1, 2])
+        cols_view_pydf = source_pydf.select_cols(['Tag'])
+        row_la = source_pydf.lol[0]
+        source_pydf[0, 'Tag'] = 'x'
+        self.assertIsNot(source_pydf.lol[0], row_la)
+        
+        # once the views are gone or materialized, rows are modified in place and the ids are dropped.
+        cols_view_pydf[0, 'Tag'] = 'q'
+        del view_pydf
+        gc.collect()
+        row_la = source_pydf.lol[1]
+        source_pydf[1, 'Tag'] = 'y'
+        self.assertIs(source_pydf.lol[1], row_la)
+        self.assertEqual(source_pydf._shared_row_ids.ids, set())
+        self.assertEqual(cols_view_pydf.lol, [['q'], ['b'], ['c']])
+        self.assertEqual(source_pydf.lol, [[1, 'x'], [2, 'y'], [3, 'c']])
+        
+        
     # select_record_da
     def test_select_record_da_existing_key(self):
         cols = ['col1', 'col2']
@@ -2509,6 +3467,40 @@ class TestPydf(unittest.TestCase):
         new_pydf = pydf.select_cols(cols=['ID', 'Name'])
         self.assertEqual(new_pydf.columns(), [])
 
+    def test_select_cols_view(self):
+        pydf = Pydf(lol=[[1, 'a', 10], [2, 'b', 20], [3, 'c', 30]], cols=['ID', 'Name', 'Amount'], keyfield='ID')
+        view_pydf = pydf.select_cols(cols=['ID', 'Amount'])
+        
+        # the view projects the rows of pydf without copying them.
+        self.assertIs(view_pydf.lol.source_lol[0], pydf.lol[0])
+        self.assertEqual(view_pydf.kd, {1: 0, 2: 1, 3: 2})
+        self.assertEqual(view_pydf.to_numpy().tolist(), [[1, 10], [2, 20], [3, 30]])
+        self.assertEqual(view_pydf.select_icols([1]).lol, [[10], [20], [30]])
+        
+        # writing to either one does not change the other.
+        pydf[0, 'Amount'] = 99
+        view_pydf[1, 'Amount'] = 77
+        self.assertEqual(pydf.lol, [[1, 'a', 99], [2, 'b', 20], [3, 'c', 30]])
+        self.assertEqual(view_pydf.lol, [[1, 10], [2, 77], [3, 30]])
+        
+        self.assertEqual(pydf.select_icols(slice(1, None)).columns(), ['Name', 'Amount'])
+        self.assertEqual(pydf.select_icols(2).columns(), ['Amount'])
+        self.assertEqual(pickle.loads(pickle.dumps(view_pydf)), view_pydf)
+        
+        # a row read before the rows of the view are inserted or removed still writes to its own row.
+        view_pydf = pydf.select_cols(cols=['ID', 'Amount'])
+        row_la = view_pydf.lol[1]
+        view_pydf.lol.insert(0, [0, 0])
+        row_la[1] = 777
+        self.assertEqual(view_pydf.lol, [[0, 0], [1, 99], [2, 777], [3, 30]])
+        
+        view_pydf = pydf.select_cols(cols=['ID', 'Amount'])
+        row_la = view_pydf.lol[1]
+        del view_pydf.lol[0]
+        row_la[1] = 888
+        self.assertEqual(view_pydf.lol, [[2, 888], [3, 30]])
+
+
 
     # unified sum
     def test_sum_all_columns(self):
@@ -491,10 +491,13 @@ def main():
     global kdf
     global pydf
     global kpydf
+    global cpydf
     global hdlol
     global hllol
     global hdnpa
     global datatable1, datatable2
+    global sqlite_conn
+    global big_kpydf, chunk_kpydf, big_kdf, chunk_kdf
     
     md_report = pr("# Evaluate conversion and calculation time tradeoffs between Pandas, Pydf, Numpy, etc.\n\n")
 
@@ -543,6 +546,25 @@ def main():
     md_report += pr(f"kpydf:\n{kpydf}\n\n"
                     f"{sizeof_di['kpydf']=:,} bytes\n\n")
 
+    md_report += md_code_seg("Create cpydf from pydf, stored by columns")
+    cpydf = Pydf(lol=pydf.lol, cols=pydf.columns(), layout='columns')
+    sizeof_di['cpydf'] = asizeof.asizeof(cpydf)
+    md_report += pr(f"{sizeof_di['cpydf']=:,} bytes\n\n")
+
+    md_report += md_code_seg("Create spydf from csv of repeated strings, with and without intern")
+    """ Each value read from a csv file is a separate str object, even if it repeats.
+        With intern=True, equal values share one object, which is much smaller when most values repeat.
+    """
+    state_codes = ['CA', 'OR', 'WA', 'NV', 'AZ', 'UT', 'ID', 'MT', 'NM', 'CO']
+    str_csv_buff = Pydf(lol=[[f"{state_codes[val % 10]}-{val // 10}" for val in row_la[:100]] for row_la in pydf.lol], 
+                        cols=pydf.columns()[:100]).to_csv_buff()
+    spydf = Pydf.from_csv_buff(str_csv_buff)
+    sizeof_di['spydf'] = asizeof.asizeof(spydf)
+    ispydf = Pydf.from_csv_buff(str_csv_buff, intern=True)
+    sizeof_di['ispydf'] = asizeof.asizeof(ispydf)
+    md_report += pr(f"{sizeof_di['spydf']=:,} bytes\n\n"
+                    f"{sizeof_di['ispydf']=:,} bytes\n\n")
+
     ## # create hdlol
     ## md_report += md_code_seg("Create hdlol from lod")
     ## hdlol = lod_to_hdlol(sample_lod)
@@ -641,6 +663,7 @@ from collections import namedtuple
 import sys
 sys.path.append('..')
 from Pydf.Pydf import Pydf
+import pickle
 
 '''
     loops = 10
@@ -657,9 +680,17 @@ from Pydf.Pydf import Pydf
                     'insert_icol',
                     'sum cols',
                     'sum_np',
+                    'sum cols (columns layout)',
+                    'valuecounts (columns layout)',
                     'transpose',
                     #'transpose_keyed',
                     'keyed lookup',
+                    'from_csv_file',
+                    'from_csv_file (workers)',
+                    'pickle round trip',
+                    'to_sqlite',
+                    'concat 1000 rows to 1M keyed rows',
+                    'select_by_dict on indexed col of 1M rows',
                     'Size of 1000x1000 array (MB)',
                     'Size of keyed 1000x1000 array (MB)',
                   ]
@@ -765,6 +796,17 @@ from Pydf.Pydf import Pydf
     report_pydf['sum cols', 'lod']          = secs = timeit.timeit('lod_sum_cols(sample_lod)',  setup=setup_code, globals=globals(), number=loops)
     print(f"lod_sum_cols()              {loops} loops: {secs:.4f} secs")
 
+    report_pydf['sum cols (columns layout)', 'loops'] = loops
+    report_pydf['sum cols (columns layout)', 'pydf']  = secs = timeit.timeit('cpydf.sum()', setup=setup_code, globals=globals(), number=loops)
+    print(f"cpydf.sum()                 {loops} loops: {secs:.4f} secs")
+
+    report_pydf['valuecounts (columns layout)', 'loops'] = loops
+    report_pydf['valuecounts (columns layout)', 'pydf']  = secs = timeit.timeit("cpydf.valuecounts_for_colname('Col500')", setup=setup_code, globals=globals(), number=loops)
+    print(f"cpydf.valuecounts_for_colname() {loops} loops: {secs:.4f} secs")
+
+    report_pydf['valuecounts (columns layout)', 'pandas'] = secs = timeit.timeit("df['Col500'].value_counts().to_dict()", setup=setup_code, globals=globals(), number=loops)
+    print(f"df value_counts()           {loops} loops: {secs:.4f} secs")
+
     report_pydf['transpose', 'loops']       = loops
     report_pydf['transpose', 'pandas']      = secs = timeit.timeit('df.transpose()',            setup=setup_code, globals=globals(), number=loops)
     print(f"df.transpose()              {loops} loops: {secs:.4f} secs")
@@ -801,6 +843,67 @@ from Pydf.Pydf import Pydf
     report_pydf['keyed lookup', 'sqlite']   = secs = timeit.timeit('sqlite_selectrow(table_name=datatable1)', setup=setup_code, globals=globals(), number=keyed_lookup_loops)
     print(f"sqlite_row_lookup()         {keyed_lookup_loops} loops: {secs:.4f} secs")
 
+    # parsing a csv file with one process vs. splitting it across a process pool.
+    csv_file_path = 'tempdata.csv'
+    pydf.to_csv_file(csv_file_path)
+    num_workers = os.cpu_count() or 1
+    
+    report_pydf['from_csv_file', 'loops']   = loops
+    report_pydf['from_csv_file', 'pydf']    = secs = timeit.timeit(f"Pydf.from_csv_file('{csv_file_path}', dtypes=pydf.dtypes)", setup=setup_code, globals=globals(), number=loops)
+    print(f"Pydf.from_csv_file()        {loops} loops: {secs:.4f} secs")
+
+    report_pydf['from_csv_file', 'pandas']  = secs = timeit.timeit(f"pd.read_csv('{csv_file_path}')", setup=setup_code, globals=globals(), number=loops)
+    print(f"pd.read_csv()               {loops} loops: {secs:.4f} secs")
+
+    report_pydf['from_csv_file (workers)', 'loops'] = loops
+    report_pydf['from_csv_file (workers)', 'pydf']  = secs = timeit.timeit(f"Pydf.from_csv_file('{csv_file_path}', dtypes=pydf.dtypes, workers={num_workers})", setup=setup_code, globals=globals(), number=loops)
+    print(f"Pydf.from_csv_file(workers={num_workers}) {loops} loops: {secs:.4f} secs")
+    os.remove(csv_file_path)
+
+    # pickling, as done when sending chunks to multiprocessing workers. Pydf pickles without kd.
+    report_pydf['pickle round trip', 'loops']   = loops
+    report_pydf['pickle round trip', 'pydf']    = secs = timeit.timeit('pickle.loads(pickle.dumps(kpydf, protocol=5))', setup=setup_code, globals=globals(), number=loops)
+    print(f"pickle round trip kpydf     {loops} loops: {secs:.4f} secs")
+
+    report_pydf['pickle round trip', 'pandas']  = secs = timeit.timeit('pickle.loads(pickle.dumps(kdf, protocol=5))', setup=setup_code, globals=globals(), number=loops)
+    print(f"pickle round trip kdf       {loops} loops: {secs:.4f} secs")
+
+    report_pydf['pickle round trip', 'lod']     = secs = timeit.timeit('pickle.loads(pickle.dumps(sample_klod, protocol=5))', setup=setup_code, globals=globals(), number=loops)
+    print(f"pickle round trip klod      {loops} loops: {secs:.4f} secs")
+
+    # writing a keyed table to sqlite in batches, vs. inserting the lod one record at a time.
+    sqlite_conn = sqlite3.connect(datatable2+'.db')
+    report_pydf['to_sqlite', 'loops']   = loops
+    report_pydf['to_sqlite', 'pydf']    = secs = timeit.timeit("kpydf.to_sqlite(sqlite_conn, datatable2, if_exists='replace')", setup=setup_code, globals=globals(), number=loops)
+    print(f"kpydf.to_sqlite()           {loops} loops: {secs:.4f} secs")
+    sqlite_conn.close()
+
+    report_pydf['to_sqlite', 'sqlite']  = secs = timeit.timeit('lod_to_sqlite_table(sample_klod, table_name=datatable2)', setup=setup_code, globals=globals(), number=loops)
+    print(f"lod_to_sqlite_table()       {loops} loops: {secs:.4f} secs")
+
+    # appending a chunk to a large keyed table only adds the new keys to kd.
+    big_kpydf   = Pydf(lol=[[f"key{i}", i, i / 2] for i in range(1000000)], cols=['rowkey', 'Col0', 'Col1'], keyfield='rowkey')
+    chunk_kpydf = Pydf(lol=[[f"new{i}", i, i / 2] for i in range(1000)],    cols=['rowkey', 'Col0', 'Col1'], keyfield='rowkey')
+    big_kdf     = big_kpydf.to_pandas_df().set_index('rowkey')
+    chunk_kdf   = chunk_kpydf.to_pandas_df().set_index('rowkey')
+    
+    report_pydf['concat 1000 rows to 1M keyed rows', 'loops']  = loops
+    report_pydf['concat 1000 rows to 1M keyed rows', 'pydf']   = secs = timeit.timeit('big_kpydf.concat(chunk_kpydf)', setup=setup_code, globals=globals(), number=loops)
+    print(f"big_kpydf.concat()          {loops} loops: {secs:.4f} secs")
+
+    report_pydf['concat 1000 rows to 1M keyed rows', 'pandas'] = secs = timeit.timeit('pd.concat([big_kdf, chunk_kdf])', setup=setup_code, globals=globals(), number=loops)
+    print(f"pd.concat()                 {loops} loops: {secs:.4f} secs")
+
+    # equality selection on a non-key column uses the secondary index instead of scanning all rows.
+    big_kpydf.create_index('Col0')
+    
+    report_pydf['select_by_dict on indexed col of 1M rows', 'loops']  = loops
+    report_pydf['select_by_dict on indexed col of 1M rows', 'pydf']   = secs = timeit.timeit("big_kpydf.select_by_dict({'Col0': 500})", setup=setup_code, globals=globals(), number=loops)
+    print(f"big_kpydf.select_by_dict()  {loops} loops: {secs:.4f} secs")
+
+    report_pydf['select_by_dict on indexed col of 1M rows', 'pandas'] = secs = timeit.timeit("big_kdf[big_kdf['Col0'] == 500]", setup=setup_code, globals=globals(), number=loops)
+    print(f"big_kdf[Col0 == 500]        {loops} loops: {secs:.4f} secs")
+
     MB = 1024 * 1024
 
     report_pydf.append({'Attribute': 'Size of 1000x1000 array (MB)', 
@@ -821,6 +924,24 @@ from Pydf.Pydf import Pydf
                         'loops':    '',
                         })
 
+    report_pydf.append({'Attribute': 'Size of 1000x100 str array (MB)', 
+                        'pydf':     sizeof_di['spydf'] / MB, 
+                        'pandas':   '--', 
+                        'numpy':    '--', 
+                        'sqlite':   '--', 
+                        'lod':      '--',
+                        'loops':    '',
+                        })
+
+    report_pydf.append({'Attribute': 'Size of 1000x100 str array, intern=True (MB)', 
+                        'pydf':     sizeof_di['ispydf'] / MB, 
+                        'pandas':   '--', 
+                        'numpy':    '--', 
+                        'sqlite':   '--', 
+                        'lod':      '--',
+                        'loops':    '',
+                        })
+
     md_report += "\n\n" + report_pydf.to_md(smart_fmt = True, just = '>^^^^^') + "\n\n"
     
     """